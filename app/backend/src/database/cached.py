@@ -0,0 +1,232 @@
+from typing import Awaitable, Callable, Dict, List, Optional
+
+from backend.src.config_data.config import LIKES_PREVIEW_LIMIT
+from backend.src.database import dialects
+from backend.src.database.database import async_session, engine
+from backend.src.database.utils import get_likes_preview, like_queue
+from backend.src.models.models import Tweet, Users
+from backend.src.services.shared_cache import (
+    cache_requests,
+    likes_key,
+    shared_cache,
+    tweet_key,
+    user_key,
+)
+from backend.src.services.storage import attachment, image_url
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.orm.strategy_options import noload
+
+Loader = Callable[[AsyncSession, List[int]], Awaitable[Dict[int, Dict]]]
+
+
+async def _read_through(
+    session: AsyncSession,
+    ids: List[int],
+    make_key: Callable[[int], str],
+    loader: Loader,
+) -> Dict[int, Dict]:
+    """
+    Чтение записей из кэша с догрузкой промахов из бд запросом на
+    каждые QUERY_CHUNK_SIZE промахов.
+    Записи, сброшенные во время чтения, в кэш не пишутся.
+    Промахи читаются с основной бд, даже если запрос читает с реплики:
+    иначе сразу после сброса записи в кэш могли бы вернуться данные,
+    до которых реплика ещё не догнала основную бд
+    :param session: Сессия запроса
+    :param ids: Ids записей
+    :param make_key: Функция построения ключа кэша по id
+    :param loader: Функция загрузки записей из бд
+    :return: Словарь id -> запись. Отсутствующих в бд записей в нём нет
+    """
+    ids = list(dict.fromkeys(ids))
+    keys = {object_id: make_key(object_id) for object_id in ids}
+    cached = await shared_cache.get_many(list(keys.values()))
+    found = {
+        object_id: cached[key]
+        for object_id, key in keys.items()
+        if key in cached
+    }
+    missing = [object_id for object_id in ids if object_id not in found]
+    cache_requests.inc(len(found), result="hit")
+    cache_requests.inc(len(missing), result="miss")
+    if missing:
+        started = shared_cache.begin_fill()
+        try:
+            if session.bind is engine:
+                loaded = await loader(session, missing)
+            else:
+                async with async_session() as primary:
+                    loaded = await loader(primary, missing)
+            await shared_cache.fill_many(
+                {
+                    keys[object_id]: value
+                    for object_id, value in loaded.items()
+                },
+                started,
+            )
+        finally:
+            shared_cache.end_fill()
+        found.update(loaded)
+    return found
+
+
+async def _load_tweets(session: AsyncSession, tweet_ids: List[int]):
+    tweets = {}
+    for chunk in dialects.chunked(tweet_ids):
+        res = await session.scalars(
+            select(Tweet)
+            .where(Tweet.id.in_(chunk))
+            .options(noload(Tweet.likes), noload(Tweet.user))
+        )
+        tweets.update(
+            (
+                tweet.id,
+                {
+                    "id": tweet.id,
+                    "content": tweet.data,
+                    "user_id": tweet.user_id,
+                    "attachments": [
+                        image_url(image) for image in tweet.images
+                    ],
+                    "media": [attachment(image) for image in tweet.images],
+                },
+            )
+            for tweet in res
+        )
+    return tweets
+
+
+async def _load_users(session: AsyncSession, user_ids: List[int]):
+    users = {}
+    for chunk in dialects.chunked(user_ids):
+        res = await session.execute(
+            select(Users.id, Users.nickname).where(Users.id.in_(chunk))
+        )
+        users.update(
+            (user_id, {"id": user_id, "name": nickname})
+            for user_id, nickname in res
+        )
+    return users
+
+
+async def _load_likes(session: AsyncSession, tweet_ids: List[int]):
+    counts = {}
+    for chunk in dialects.chunked(tweet_ids):
+        res = await session.execute(
+            select(Tweet.id, Tweet.like_count).where(Tweet.id.in_(chunk))
+        )
+        counts.update(res.all())
+    preview = await get_likes_preview(
+        session, list(counts), LIKES_PREVIEW_LIMIT
+    )
+    return {
+        tweet_id: {
+            "count": count,
+            "preview": [
+                {"user_id": user_id, "name": nickname}
+                for user_id, nickname in preview[tweet_id]
+            ],
+        }
+        for tweet_id, count in counts.items()
+    }
+
+
+async def get_tweet_cards(
+    session: AsyncSession, tweet_ids: List[int]
+) -> Dict[int, Dict]:
+    """
+    Функция получения содержания твитов с картинками через кэш
+    :param session: Сессия запроса
+    :param tweet_ids: Ids твитов
+    :return: Словарь tweet_id -> твит
+    """
+    return await _read_through(session, tweet_ids, tweet_key, _load_tweets)
+
+
+async def get_user_summaries(
+    session: AsyncSession, user_ids: List[int]
+) -> Dict[int, Dict]:
+    """
+    Функция получения id и имени пользователей через кэш
+    :param session: Сессия запроса
+    :param user_ids: Ids пользователей
+    :return: Словарь user_id -> {"id", "name"}
+    """
+    return await _read_through(session, user_ids, user_key, _load_users)
+
+
+async def get_like_summaries(
+    session: AsyncSession,
+    tweet_ids: List[int],
+    counts: Optional[Dict[int, int]] = None,
+) -> Dict[int, Dict]:
+    """
+    Функция получения числа лайков и первых лайкнувших через кэш
+    :param session: Сессия запроса
+    :param tweet_ids: Ids твитов
+    :param counts: Числа лайков, уже прочитанные из бд: заменяют
+    закэшированные
+    :return: Словарь tweet_id -> {"count", "preview"}
+    """
+    summaries = await _read_through(session, tweet_ids, likes_key, _load_likes)
+    if counts:
+        summaries = {
+            tweet_id: (
+                {**summary, "count": counts[tweet_id]}
+                if tweet_id in counts
+                else summary
+            )
+            for tweet_id, summary in summaries.items()
+        }
+    if like_queue.enabled and len(like_queue):
+        summaries = await _with_queued_likes(session, summaries)
+    return summaries
+
+
+async def _with_queued_likes(
+    session: AsyncSession, summaries: Dict[int, Dict]
+) -> Dict[int, Dict]:
+    """
+    Наложение лайков из очереди отложенной записи на прочитанные из кэша
+    и бд, чтобы пользователь сразу видел свои лайки. Записи кэша не
+    меняются, изменённые твиты копируются
+    :param session: Сессия запроса
+    :param summaries: Словарь tweet_id -> {"count", "preview"}
+    :return: Словарь того же вида
+    """
+    queued: Dict[int, Dict[int, bool]] = {}
+    for (user_id, tweet_id), liked in like_queue.items().items():
+        if tweet_id in summaries:
+            queued.setdefault(tweet_id, {})[user_id] = liked
+    if not queued:
+        return summaries
+    likers = await get_user_summaries(
+        session,
+        [
+            user_id
+            for changes in queued.values()
+            for user_id, liked in changes.items()
+            if liked
+        ],
+    )
+    summaries = dict(summaries)
+    for tweet_id, changes in queued.items():
+        preview = [
+            item
+            for item in summaries[tweet_id]["preview"]
+            if changes.get(item["user_id"], True)
+        ]
+        shown = {item["user_id"] for item in preview}
+        preview += [
+            {"user_id": user_id, "name": likers[user_id]["name"]}
+            for user_id, liked in changes.items()
+            if liked and user_id not in shown and user_id in likers
+        ]
+        preview.sort(key=lambda item: item["user_id"])
+        delta = sum(1 if liked else -1 for liked in changes.values())
+        summaries[tweet_id] = {
+            "count": summaries[tweet_id]["count"] + delta,
+            "preview": preview[:LIKES_PREVIEW_LIMIT],
+        }
+    return summaries
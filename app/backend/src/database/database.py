@@ -1,13 +1,97 @@
-from backend.src.config_data.config import DATABASE_URI
+import uuid
+from typing import Any, Dict
+
+from backend.src.config_data.config import (
+    DATABASE_ECHO,
+    DATABASE_MAX_OVERFLOW,
+    DATABASE_PGBOUNCER,
+    DATABASE_POOL_PRE_PING,
+    DATABASE_POOL_RECYCLE,
+    DATABASE_POOL_SIZE,
+    DATABASE_POOL_TIMEOUT,
+    DATABASE_REPLICA_URI,
+    DATABASE_STATEMENT_CACHE_SIZE,
+    DATABASE_URI,
+)
+from backend.src.services.instrumentation import instrument_engine
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
 from sqlalchemy.ext.asyncio import (
+    AsyncEngine,
     AsyncSession,
     async_sessionmaker,
     create_async_engine,
 )
 from sqlalchemy.orm import declarative_base
 
-engine = create_async_engine(DATABASE_URI, echo=True)
+
+def engine_options(uri: str) -> Dict[str, Any]:
+    """
+    Параметры движка из настроек окружения. Для SQLite настройки пула не
+    применяются, для asyncpg задаются кэш подготовленных выражений и
+    режим совместимости с PgBouncer
+    :param uri: Адрес бд
+    :return: Именованные аргументы create_async_engine
+    """
+    url = make_url(uri)
+    options: Dict[str, Any] = {"echo": DATABASE_ECHO}
+    if url.get_backend_name() == "sqlite":
+        return options
+    options.update(
+        pool_size=DATABASE_POOL_SIZE,
+        max_overflow=DATABASE_MAX_OVERFLOW,
+        pool_timeout=DATABASE_POOL_TIMEOUT,
+        pool_recycle=DATABASE_POOL_RECYCLE,
+        pool_pre_ping=DATABASE_POOL_PRE_PING,
+    )
+    if url.get_driver_name() == "asyncpg":
+        cache_size = 0 if DATABASE_PGBOUNCER else DATABASE_STATEMENT_CACHE_SIZE
+        connect_args: Dict[str, Any] = {
+            "statement_cache_size": cache_size,
+            "prepared_statement_cache_size": cache_size,
+        }
+        if DATABASE_PGBOUNCER:
+            # Уникальные имена, чтобы выражения с разных соединений
+            # PgBouncer'а не конфликтовали на одном соединении с бд
+            connect_args["prepared_statement_name_func"] = (
+                lambda: f"__asyncpg_{uuid.uuid4()}__"
+            )
+        options["connect_args"] = connect_args
+    return options
+
+
+def _enable_sqlite_foreign_keys(dbapi_connection, connection_record):
+    cursor = dbapi_connection.cursor()
+    cursor.execute("PRAGMA foreign_keys=ON")
+    cursor.close()
+
+
+def create_engine(uri: str) -> AsyncEngine:
+    """
+    Создание движка по адресу бд с параметрами из окружения
+    :param uri: Адрес бд
+    :return: Движок
+    """
+    new_engine = create_async_engine(uri, **engine_options(uri))
+    if new_engine.dialect.name == "sqlite":
+        # SQLite по умолчанию не проверяет внешние ключи и не выполняет
+        # ON DELETE CASCADE, на который рассчитаны связи моделей
+        event.listen(
+            new_engine.sync_engine, "connect", _enable_sqlite_foreign_keys
+        )
+    instrument_engine(new_engine.sync_engine)
+    return new_engine
+
+
+engine = create_engine(DATABASE_URI)
 async_session = async_sessionmaker(
     engine, class_=AsyncSession, expire_on_commit=False
 )
+# Запросы только на чтение идут на реплику, если она задана
+read_engine = (
+    create_engine(DATABASE_REPLICA_URI) if DATABASE_REPLICA_URI else engine
+)
+read_session = async_sessionmaker(
+    read_engine, class_=AsyncSession, expire_on_commit=False
+)
 Base = declarative_base()
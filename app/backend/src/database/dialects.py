@@ -0,0 +1,43 @@
+from typing import Iterator, List, Sequence, TypeVar
+
+from backend.src.config_data.config import QUERY_CHUNK_SIZE
+from sqlalchemy import Table
+from sqlalchemy.dialects import postgresql, sqlite
+from sqlalchemy.ext.asyncio import AsyncSession
+
+T = TypeVar("T")
+
+_INSERTS = {
+    "postgresql": postgresql.insert,
+    "sqlite": sqlite.insert,
+}
+
+
+def insert(session: AsyncSession, table: Table):
+    """
+    INSERT с поддержкой ON CONFLICT для диалекта текущей сессии
+    :param session: Открытая сессия
+    :param table: Таблица
+    :return: Объект Insert с методами on_conflict_do_*
+    """
+    dialect = session.bind.dialect.name
+    try:
+        return _INSERTS[dialect](table)
+    except KeyError:
+        raise NotImplementedError(
+            f"ON CONFLICT is not supported for dialect {dialect}"
+        )
+
+
+def chunked(
+    items: Sequence[T], size: int = QUERY_CHUNK_SIZE
+) -> Iterator[List[T]]:
+    """
+    Деление списка ids на части для условий IN: у драйверов бд есть
+    лимит числа параметров в одном запросе
+    :param items: Список
+    :param size: Размер части
+    :return: Итератор частей
+    """
+    for start in range(0, len(items), size):
+        yield list(items[start : start + size])
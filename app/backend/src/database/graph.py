@@ -0,0 +1,69 @@
+from typing import AsyncIterator, Dict, List, Tuple
+
+from backend.src.config_data.config import GRAPH_LOAD_BATCH_SIZE
+from backend.src.database.database import async_session
+from backend.src.models.models import Users, followers
+from backend.src.services.events import event_hub
+from backend.src.services.graph import follow_graph
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+event_hub.add_listener(follow_graph.on_event)
+
+
+async def follow_edges() -> AsyncIterator[Tuple[int, int]]:
+    """
+    Поток всех подписок (подписчик, автор) по возрастанию. Читается с
+    основной бд порциями, чтобы не держать в памяти весь результат
+    :return: Асинхронный итератор рёбер
+    """
+    async with async_session() as session:
+        result = await session.stream(
+            select(followers.c.user_id, followers.c.follower_id)
+            .order_by(followers.c.user_id, followers.c.follower_id)
+            .execution_options(yield_per=GRAPH_LOAD_BATCH_SIZE)
+        )
+        async for partition in result.partitions():
+            for user_id, author_id in partition:
+                yield user_id, author_id
+
+
+async def load_follow_graph() -> None:
+    """
+    Полная загрузка графа подписок из бд
+    :return: None
+    """
+    await follow_graph.load(follow_edges())
+
+
+async def ensure_follow_graph() -> None:
+    await follow_graph.ensure_loaded(follow_edges)
+
+
+def resync_follow_graph() -> None:
+    """
+    Перезагрузка графа после обрыва канала событий: подписки, сделанные
+    за время обрыва, до воркера не дошли
+    :return: None
+    """
+    follow_graph.invalidate(follow_edges)
+
+
+event_hub.add_resync_listener(resync_follow_graph)
+
+
+async def get_user_names(
+    session: AsyncSession, user_ids: List[int]
+) -> Dict[int, str]:
+    """
+    Функция получения никнеймов пользователей одним запросом
+    :param session: Сессия запроса
+    :param user_ids: Ids пользователей
+    :return: Словарь id -> никнейм существующих пользователей
+    """
+    if not user_ids:
+        return {}
+    res = await session.execute(
+        select(Users.id, Users.nickname).where(Users.id.in_(user_ids))
+    )
+    return {user_id: nickname for user_id, nickname in res}
@@ -0,0 +1,140 @@
+import logging
+from typing import Callable, Dict, List, Tuple
+
+from backend.src.database.database import Base
+from backend.src.models.models import Tweet, Users, followers, tweet_like
+from sqlalchemy import Column, Connection, Table, func, inspect, update
+from sqlalchemy.future import select
+from sqlalchemy.schema import CreateColumn
+
+logger = logging.getLogger(__name__)
+
+Backfill = Callable[[Connection], None]
+
+
+def _backfill_followers_count(conn: Connection) -> None:
+    conn.execute(
+        update(Users).values(
+            followers_count=select(func.count())
+            .where(followers.c.follower_id == Users.id)
+            .scalar_subquery()
+        )
+    )
+
+
+def _backfill_like_count(conn: Connection) -> None:
+    conn.execute(
+        update(Tweet).values(
+            like_count=select(func.count())
+            .where(tweet_like.c.tweet_id == Tweet.id)
+            .scalar_subquery()
+        )
+    )
+
+
+# Пересчёт денормализованных колонок, добавленных в существующую таблицу
+BACKFILLS: Dict[Tuple[str, str], Backfill] = {
+    ("users", "followers_count"): _backfill_followers_count,
+    ("tweet", "like_count"): _backfill_like_count,
+}
+
+
+def _add_column(conn: Connection, column: Column) -> None:
+    table = column.table
+    preparer = conn.dialect.identifier_preparer
+    default = column.server_default
+    if (
+        conn.dialect.name == "sqlite"
+        and default is not None
+        and not isinstance(default.arg, str)
+    ):
+        # SQLite не добавляет колонку с невычислимым заранее значением по
+        # умолчанию (now()): колонка добавляется без него и заполняется.
+        # Новым строкам значение задаёт default колонки в модели
+        bare = Column(column.name, column.type)
+        conn.exec_driver_sql(
+            f"ALTER TABLE {preparer.format_table(table)} "
+            f"ADD COLUMN {CreateColumn(bare).compile(dialect=conn.dialect)}"
+        )
+        conn.execute(table.update().values({column.name: default.arg}))
+        return
+    conn.exec_driver_sql(
+        f"ALTER TABLE {preparer.format_table(table)} "
+        f"ADD COLUMN {CreateColumn(column).compile(dialect=conn.dialect)}"
+    )
+
+
+def _add_primary_key(conn: Connection, table: Table) -> None:
+    preparer = conn.dialect.identifier_preparer
+    name = preparer.format_table(table)
+    columns = [preparer.quote(column.name) for column in table.primary_key]
+    conn.exec_driver_sql(
+        f"DELETE FROM {name} WHERE "
+        + " OR ".join(f"{column} IS NULL" for column in columns)
+    )
+    if conn.dialect.name == "postgresql":
+        same_row = " AND ".join(f"a.{c} = b.{c}" for c in columns)
+        conn.exec_driver_sql(
+            f"DELETE FROM {name} a USING {name} b "
+            f"WHERE a.ctid < b.ctid AND {same_row}"
+        )
+        conn.exec_driver_sql(
+            f"ALTER TABLE {name} ADD PRIMARY KEY ({', '.join(columns)})"
+        )
+        return
+    # SQLite не добавляет первичный ключ в существующую таблицу,
+    # уникальный индекс работает для ON CONFLICT так же
+    conn.exec_driver_sql(
+        f"DELETE FROM {name} WHERE rowid NOT IN (SELECT min(rowid) "
+        f"FROM {name} GROUP BY {', '.join(columns)})"
+    )
+    conn.exec_driver_sql(
+        f"CREATE UNIQUE INDEX {preparer.quote('pk_' + table.name)} "
+        f"ON {name} ({', '.join(columns)})"
+    )
+
+
+def upgrade_schema(conn: Connection) -> List[str]:
+    """
+    Функция приведения существующих таблиц к моделям: create_all создаёт
+    только новые таблицы, поэтому недостающие колонки, индексы и
+    первичные ключи добавляются здесь, а денормализованные колонки
+    пересчитываются. Выполняется при старте приложения в его транзакции
+    :param conn: Соединение с бд
+    :return: Добавленные колонки, индексы и ключи
+    """
+    inspector = inspect(conn)
+    existing = set(inspector.get_table_names())
+    changes = []
+    backfills = []
+    for table in Base.metadata.sorted_tables:
+        if table.name not in existing:
+            continue
+        columns = {
+            column["name"] for column in inspector.get_columns(table.name)
+        }
+        for column in table.columns:
+            if column.name in columns:
+                continue
+            _add_column(conn, column)
+            changes.append(f"{table.name}.{column.name}")
+            if (table.name, column.name) in BACKFILLS:
+                backfills.append(BACKFILLS[table.name, column.name])
+        indexes = {
+            index["name"] for index in inspector.get_indexes(table.name)
+        }
+        key = inspector.get_pk_constraint(table.name)["constrained_columns"]
+        if table.primary_key and not key and f"pk_{table.name}" not in indexes:
+            # Таблица из версии без ключа: повторы удаляются, ON CONFLICT
+            # лайков и подписок опирается на этот ключ
+            _add_primary_key(conn, table)
+            changes.append(f"pk_{table.name}")
+        for index in table.indexes:
+            if index.name not in indexes:
+                index.create(conn)
+                changes.append(index.name)
+    for backfill in backfills:
+        backfill(conn)
+    if changes:
+        logger.info("Schema upgraded: %s", ", ".join(changes))
+    return changes
@@ -0,0 +1,160 @@
+import re
+from typing import List, Optional, Tuple
+
+from backend.src.models.models import Tweet, followers
+from sqlalchemy import (
+    Double,
+    and_,
+    cast,
+    column,
+    func,
+    literal_column,
+    or_,
+    table,
+    text,
+)
+from sqlalchemy.dialects.postgresql import TSVECTOR
+from sqlalchemy.ext.asyncio import AsyncConnection, AsyncSession
+from sqlalchemy.future import select
+
+# Конфигурация без стемминга: совпадает с токенизатором FTS5 по умолчанию
+SEARCH_CONFIG = "simple"
+
+_WORD = re.compile(r"\w+", re.UNICODE)
+
+# Индекс для SQLite: внешняя таблица FTS5 поверх tweet, которую
+# поддерживают триггеры
+tweet_search = table("tweet_search", column("rowid"), column("data"))
+
+_SQLITE_DDL = (
+    "CREATE VIRTUAL TABLE tweet_search USING fts5("
+    "data, content='tweet', content_rowid='id')",
+    "CREATE TRIGGER tweet_search_insert AFTER INSERT ON tweet BEGIN "
+    "INSERT INTO tweet_search(rowid, data) VALUES (new.id, new.data); END",
+    "CREATE TRIGGER tweet_search_delete AFTER DELETE ON tweet BEGIN "
+    "INSERT INTO tweet_search(tweet_search, rowid, data) "
+    "VALUES ('delete', old.id, old.data); END",
+    "CREATE TRIGGER tweet_search_update AFTER UPDATE OF data ON tweet BEGIN "
+    "INSERT INTO tweet_search(tweet_search, rowid, data) "
+    "VALUES ('delete', old.id, old.data); "
+    "INSERT INTO tweet_search(rowid, data) VALUES (new.id, new.data); END",
+    "INSERT INTO tweet_search(tweet_search) VALUES ('rebuild')",
+)
+
+# В Postgres вектор - вычисляемая колонка, она заполняется при вставке
+_POSTGRES_DDL = (
+    "ALTER TABLE tweet ADD COLUMN IF NOT EXISTS search_vector tsvector "
+    f"GENERATED ALWAYS AS (to_tsvector('{SEARCH_CONFIG}', data)) STORED",
+    "CREATE INDEX IF NOT EXISTS ix_tweet_search_vector "
+    "ON tweet USING GIN (search_vector)",
+)
+
+
+async def create_search_index(conn: AsyncConnection) -> None:
+    """
+    Создание полнотекстового индекса твитов, если его ещё нет: колонка
+    tsvector с GIN-индексом в Postgres или таблица FTS5 в SQLite.
+    Существующие твиты индексируются при создании
+    :param conn: Соединение с открытой транзакцией
+    :return: None
+    """
+    if conn.dialect.name == "postgresql":
+        for statement in _POSTGRES_DDL:
+            await conn.execute(text(statement))
+        return
+    exists = await conn.scalar(
+        text(
+            "SELECT 1 FROM sqlite_master "
+            "WHERE type = 'table' AND name = 'tweet_search'"
+        )
+    )
+    if not exists:
+        for statement in _SQLITE_DDL:
+            await conn.execute(text(statement))
+
+
+def search_terms(query: str) -> List[str]:
+    """
+    Слова запроса без операторов и знаков препинания
+    :param query: Строка поиска
+    :return: Список слов в нижнем регистре
+    """
+    return [word.lower() for word in _WORD.findall(query)]
+
+
+def encode_search_cursor(score: float, tweet_id: int) -> str:
+    return f"{score!r}:{tweet_id}"
+
+
+def decode_search_cursor(cursor: str) -> Tuple[float, int]:
+    """
+    Разбор курсора страницы поиска
+    :param cursor: Строка вида <оценка>:<id твита>
+    :return: Оценка и id последнего твита предыдущей страницы
+    :raises ValueError: Курсор повреждён
+    """
+    score, _, tweet_id = cursor.rpartition(":")
+    return float(score), int(tweet_id)
+
+
+async def search_tweets(
+    session: AsyncSession,
+    terms: List[str],
+    limit: int,
+    cursor: Optional[Tuple[float, int]] = None,
+    author_id: Optional[int] = None,
+    follower_id: Optional[int] = None,
+) -> List[Tuple[int, float]]:
+    """
+    Функция поиска твитов, содержащих все слова запроса. Результаты
+    упорядочены по релевантности, при равной - от новых к старым
+    :param session: Сессия запроса
+    :param terms: Слова запроса
+    :param limit: Размер страницы
+    :param cursor: Оценка и id последнего твита предыдущей страницы
+    :param author_id: Только твиты этого автора
+    :param follower_id: Только твиты авторов, на которых подписан этот
+    пользователь
+    :return: Список (id твита, оценка)
+    """
+    if not terms:
+        return []
+    if session.bind.dialect.name == "postgresql":
+        vector = literal_column("tweet.search_vector", TSVECTOR)
+        tsquery = func.plainto_tsquery(SEARCH_CONFIG, " ".join(terms))
+        score = cast(func.ts_rank_cd(vector, tsquery), Double)
+        stmt = select(Tweet.id, score.label("score")).where(
+            vector.op("@@")(tsquery)
+        )
+    else:
+        # bm25 в FTS5 тем меньше, чем релевантнее документ
+        score = cast(-func.bm25(literal_column("tweet_search")), Double)
+        match = " ".join('"' + term + '"' for term in terms)
+        stmt = (
+            select(Tweet.id, score.label("score"))
+            .select_from(tweet_search)
+            .join(Tweet, Tweet.id == tweet_search.c.rowid)
+            .where(literal_column("tweet_search").op("MATCH")(match))
+        )
+    if author_id is not None:
+        stmt = stmt.where(Tweet.user_id == author_id)
+    if follower_id is not None:
+        stmt = stmt.where(
+            Tweet.user_id.in_(
+                select(followers.c.follower_id).where(
+                    followers.c.user_id == follower_id
+                )
+            )
+        )
+    if cursor is not None:
+        last_score, last_id = cursor
+        stmt = stmt.where(
+            or_(
+                score < last_score,
+                and_(score == last_score, Tweet.id < last_id),
+            )
+        )
+    res = await session.execute(
+        stmt.order_by(score.desc(), Tweet.id.desc()).limit(limit)
+    )
+    return [(tweet_id, value) for tweet_id, value in res]
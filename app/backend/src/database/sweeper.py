@@ -0,0 +1,263 @@
+import argparse
+import asyncio
+import json
+import logging
+import time
+import uuid
+from dataclasses import asdict, dataclass
+from datetime import datetime, timedelta, timezone
+from typing import Optional
+
+from backend.src.config_data.config import (
+    GC_BATCH_DELAY,
+    GC_BATCH_SIZE,
+    GC_GRACE_PERIOD,
+    GC_INTERVAL,
+)
+from backend.src.database.database import async_session
+from backend.src.models.models import Image
+from backend.src.services.metrics import counter
+from backend.src.services.storage import (
+    iter_legacy_names,
+    iter_stored_hashes,
+    remove_legacy_orphans,
+    remove_orphans,
+    remove_stale_uploads,
+)
+from sqlalchemy import delete
+from sqlalchemy.future import select
+from starlette.concurrency import iterate_in_threadpool, run_in_threadpool
+
+logger = logging.getLogger(__name__)
+
+swept = counter(
+    "attachment_sweeper_removed_total",
+    "Orphaned image rows, files and bytes removed by the sweeper",
+    ("kind",),
+)
+
+
+@dataclass
+class SweepReport:
+    """
+    Итог одного прохода сборщика. В режиме dry_run - что было бы
+    удалено
+    """
+
+    dry_run: bool
+    images: int = 0
+    files: int = 0
+    bytes: int = 0
+    tmp_files: int = 0
+    batches: int = 0
+    seconds: float = 0.0
+
+    def add_files(self, paths, size: int, tmp: bool = False) -> None:
+        if tmp:
+            self.tmp_files += len(paths)
+        else:
+            self.files += len(paths)
+        self.bytes += size
+
+
+async def sweep_images(
+    report: SweepReport, older_than: datetime, batch_size: int, delay: float
+) -> None:
+    """
+    Удаление картинок, так и не прикреплённых к твиту, порциями по id.
+    Картинка, которую успели прикрепить между чтением и удалением,
+    остаётся: условие tweet_id IS NULL проверяется при удалении
+    :param report: Итог прохода
+    :param older_than: Удаляются загруженные раньше этого момента
+    :param batch_size: Размер порции
+    :param delay: Пауза между порциями в секундах
+    :return: None
+    """
+    last_id = 0
+    while True:
+        async with async_session() as session:
+            ids = list(
+                await session.scalars(
+                    select(Image.id)
+                    .where(
+                        Image.tweet_id.is_(None),
+                        Image.created_at < older_than,
+                        Image.id > last_id,
+                    )
+                    .order_by(Image.id)
+                    .limit(batch_size)
+                )
+            )
+            if not ids:
+                return
+            last_id = ids[-1]
+            if report.dry_run:
+                report.images += len(ids)
+            else:
+                res = await session.execute(
+                    delete(Image)
+                    .where(Image.id.in_(ids), Image.tweet_id.is_(None))
+                    .returning(Image.id)
+                )
+                report.images += len(res.all())
+                await session.commit()
+        report.batches += 1
+        await asyncio.sleep(delay)
+
+
+async def sweep_files(
+    report: SweepReport, grace: float, batch_size: int, delay: float
+) -> None:
+    """
+    Удаление файлов, на которые не ссылается ни одна картинка в бд.
+    Каталоги обходятся в пуле потоков, ссылки проверяются одним
+    запросом на порцию
+    :param report: Итог прохода
+    :param grace: Минимальный возраст файла в секундах
+    :param batch_size: Размер порции
+    :param delay: Пауза между порциями в секундах
+    :return: None
+    """
+    async for hashes in iterate_in_threadpool(iter_stored_hashes(batch_size)):
+        async with async_session() as session:
+            referenced = set(
+                await session.scalars(
+                    select(Image.content_hash)
+                    .where(Image.content_hash.in_(hashes))
+                    .distinct()
+                )
+            )
+        orphans = [h for h in hashes if h not in referenced]
+        if orphans:
+            paths, size = await run_in_threadpool(
+                remove_orphans, orphans, grace, report.dry_run
+            )
+            report.add_files(paths, size)
+        report.batches += 1
+        await asyncio.sleep(delay)
+
+
+async def sweep_legacy_files(
+    report: SweepReport, grace: float, batch_size: int, delay: float
+) -> None:
+    """
+    Удаление файлов картинок старого формата (по image_name, без хэша),
+    на которые не ссылается ни одна картинка в бд
+    :param report: Итог прохода
+    :param grace: Минимальный возраст файла в секундах
+    :param batch_size: Размер порции
+    :param delay: Пауза между порциями в секундах
+    :return: None
+    """
+    async for names in iterate_in_threadpool(iter_legacy_names(batch_size)):
+        async with async_session() as session:
+            referenced = {
+                str(image_name)
+                for image_name in await session.scalars(
+                    select(Image.image_name).where(
+                        Image.image_name.in_(
+                            [uuid.UUID(name) for name in names]
+                        ),
+                        Image.content_hash.is_(None),
+                    )
+                )
+            }
+        orphans = [name for name in names if name not in referenced]
+        if orphans:
+            paths, size = await run_in_threadpool(
+                remove_legacy_orphans, orphans, grace, report.dry_run
+            )
+            report.add_files(paths, size)
+        report.batches += 1
+        await asyncio.sleep(delay)
+
+
+async def sweep(
+    dry_run: bool = False,
+    grace: float = GC_GRACE_PERIOD,
+    batch_size: int = GC_BATCH_SIZE,
+    delay: float = GC_BATCH_DELAY,
+) -> SweepReport:
+    """
+    Проход сборщика мусора вложений: неприкреплённые картинки, затем
+    прерванные загрузки, затем файлы без ссылок, в том числе файлы
+    картинок старого формата. Работает порциями с
+    паузами, чтобы не мешать запросам. В режиме dry_run файлы картинок,
+    которые были бы удалены, не считаются: ссылки на них ещё есть
+    :param dry_run: Только посчитать, ничего не удаляя
+    :param grace: Минимальный возраст картинок и файлов в секундах
+    :param batch_size: Размер порции
+    :param delay: Пауза между порциями в секундах
+    :return: Итог прохода
+    """
+    started = time.perf_counter()
+    report = SweepReport(dry_run=dry_run)
+    older_than = datetime.now(timezone.utc) - timedelta(seconds=grace)
+    await sweep_images(report, older_than, batch_size, delay)
+    paths, size = await run_in_threadpool(remove_stale_uploads, grace, dry_run)
+    report.add_files(paths, size, tmp=True)
+    await sweep_files(report, grace, batch_size, delay)
+    await sweep_legacy_files(report, grace, batch_size, delay)
+    report.seconds = round(time.perf_counter() - started, 3)
+    if not dry_run:
+        swept.inc(report.images, kind="images")
+        swept.inc(report.files + report.tmp_files, kind="files")
+        swept.inc(report.bytes, kind="bytes")
+    return report
+
+
+class Sweeper:
+    """
+    Запуск сборщика в фоне раз в interval секунд. Первый проход - через
+    interval после старта, чтобы не нагружать бд при запуске
+    """
+
+    def __init__(self, interval: float):
+        self.interval = interval
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self) -> None:
+        if self.interval > 0 and self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def _run(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                report = await sweep()
+            except Exception:
+                logger.exception("Attachment sweep failed")
+                continue
+            logger.info("Attachment sweep: %s", asdict(report))
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+
+
+sweeper = Sweeper(GC_INTERVAL)
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m backend.src.database.sweeper",
+        description="Remove orphaned image rows and attachment files",
+    )
+    parser.add_argument(
+        "--dry-run",
+        action="store_true",
+        help="report what would be removed without removing it",
+    )
+    parser.add_argument("--grace", type=float, default=GC_GRACE_PERIOD)
+    parser.add_argument("--batch-size", type=int, default=GC_BATCH_SIZE)
+    parser.add_argument("--delay", type=float, default=GC_BATCH_DELAY)
+    args = parser.parse_args()
+    report = asyncio.run(
+        sweep(args.dry_run, args.grace, args.batch_size, args.delay)
+    )
+    print(json.dumps(asdict(report)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+from typing import List, Optional
+
+from backend.src.config_data.config import TIMELINE_FANOUT_LIMIT
+from backend.src.models.models import Tweet, Users, followers, timeline
+from sqlalchemy import exists, literal, union_all
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from sqlalchemy.sql import Select
+
+
+def _fanout_authors():
+    """
+    Условие на автора, твиты которого раскладываются по лентам подписчиков
+    :return: Условие для фильтра по Users
+    """
+    return Users.followers_count < TIMELINE_FANOUT_LIMIT
+
+
+async def fan_out_tweet(
+    session: AsyncSession,
+    tweet_id: int,
+    author_id: int,
+):
+    """
+    Функция раскладки нового твита по лентам подписчиков автора.
+    Твит всегда попадает в ленту самого автора, а подписчикам популярных
+    авторов не раскладывается - он подмешивается к их ленте при чтении
+    :param session: Открытая сессия, в транзакции которой создан твит
+    :param tweet_id: Id твита
+    :param author_id: Id автора
+    :return: None
+    """
+    to_followers = (
+        select(followers.c.user_id, literal(tweet_id))
+        .join(Users, Users.id == followers.c.follower_id)
+        .where(followers.c.follower_id == author_id, _fanout_authors())
+    )
+    to_author = select(literal(author_id), literal(tweet_id))
+    await session.execute(
+        timeline.insert().from_select(
+            ["user_id", "tweet_id"], union_all(to_followers, to_author)
+        )
+    )
+
+
+async def remove_tweet(session: AsyncSession, tweet_id: int):
+    """
+    Функция удаления твита из всех лент
+    :param session: Открытая сессия
+    :param tweet_id: Id твита
+    :return: None
+    """
+    await session.execute(
+        timeline.delete().where(timeline.c.tweet_id == tweet_id)
+    )
+
+
+async def backfill_timeline(
+    session: AsyncSession,
+    user_id: int,
+    author_ids: List[int],
+):
+    """
+    Функция добавления в ленту пользователя твитов авторов,
+    на которых он подписался
+    :param session: Открытая сессия
+    :param user_id: Id подписчика
+    :param author_ids: Ids авторов
+    :return: None
+    """
+    already_in_timeline = exists().where(
+        timeline.c.user_id == user_id, timeline.c.tweet_id == Tweet.id
+    )
+    author_tweets = (
+        select(literal(user_id), Tweet.id)
+        .join(Users, Users.id == Tweet.user_id)
+        .where(
+            Tweet.user_id.in_(author_ids),
+            _fanout_authors(),
+            ~already_in_timeline,
+        )
+    )
+    await session.execute(
+        timeline.insert().from_select(["user_id", "tweet_id"], author_tweets)
+    )
+
+
+async def restore_fan_out(
+    session: AsyncSession,
+    author_id: int,
+    followers_count: int,
+):
+    """
+    Функция раскладки твитов автора по лентам подписчиков, когда после
+    отписки автор перестал быть популярным. Его твиты больше не
+    подмешиваются при чтении, и без раскладки те, что он опубликовал,
+    будучи популярным, пропали бы из лент
+    :param session: Открытая сессия
+    :param author_id: Id автора
+    :param followers_count: Число подписчиков автора после отписки
+    :return: None
+    """
+    if followers_count != TIMELINE_FANOUT_LIMIT - 1:
+        return
+    already_in_timeline = exists().where(
+        timeline.c.user_id == followers.c.user_id,
+        timeline.c.tweet_id == Tweet.id,
+    )
+    author_tweets = (
+        select(followers.c.user_id, Tweet.id)
+        .join(Tweet, Tweet.user_id == followers.c.follower_id)
+        .where(followers.c.follower_id == author_id, ~already_in_timeline)
+    )
+    await session.execute(
+        timeline.insert().from_select(["user_id", "tweet_id"], author_tweets)
+    )
+
+
+async def trim_timeline(
+    session: AsyncSession,
+    user_id: int,
+    author_id: int,
+):
+    """
+    Функция удаления из ленты пользователя твитов автора,
+    от которого он отписался
+    :param session: Открытая сессия
+    :param user_id: Id подписчика
+    :param author_id: Id автора
+    :return: None
+    """
+    await session.execute(
+        timeline.delete().where(
+            timeline.c.user_id == user_id,
+            timeline.c.tweet_id.in_(
+                select(Tweet.id).where(Tweet.user_id == author_id)
+            ),
+        )
+    )
+
+
+async def rebuild_timelines(session: AsyncSession):
+    """
+    Функция первичного заполнения лент по уже существующим твитам и
+    подпискам. Выполняется, только если таблица лент пуста
+    :param session: Открытая сессия
+    :return: None
+    """
+    if await session.scalar(select(timeline.c.user_id).limit(1)) is not None:
+        return
+    to_followers = (
+        select(followers.c.user_id, Tweet.id)
+        .join(Tweet, Tweet.user_id == followers.c.follower_id)
+        .join(Users, Users.id == Tweet.user_id)
+        .where(_fanout_authors())
+    )
+    to_authors = select(Tweet.user_id, Tweet.id)
+    await session.execute(
+        timeline.insert().from_select(
+            ["user_id", "tweet_id"], union_all(to_followers, to_authors)
+        )
+    )
+
+
+def timeline_ids(
+    user_id: int,
+    limit: Optional[int] = None,
+    before_id: Optional[int] = None,
+) -> Select:
+    """
+    Запрос id твитов домашней ленты: материализованная часть плюс
+    твиты популярных авторов, которые не раскладываются при публикации
+    :param user_id: Id владельца ленты
+    :param limit: Размер страницы
+    :param before_id: Курсор: id твитов меньше заданного
+    :return: Запрос, возвращающий колонку tweet_id
+    """
+    materialized = select(timeline.c.tweet_id.label("tweet_id")).where(
+        timeline.c.user_id == user_id
+    )
+    merged = (
+        select(Tweet.id.label("tweet_id"))
+        .join(followers, followers.c.follower_id == Tweet.user_id)
+        .join(Users, Users.id == Tweet.user_id)
+        .where(followers.c.user_id == user_id, ~_fanout_authors())
+    )
+    if before_id is not None:
+        materialized = materialized.where(timeline.c.tweet_id < before_id)
+        merged = merged.where(Tweet.id < before_id)
+    if limit is not None:
+        materialized = materialized.order_by(timeline.c.tweet_id.desc())
+        merged = merged.order_by(Tweet.id.desc())
+        materialized, merged = materialized.limit(limit), merged.limit(limit)
+    materialized = materialized.subquery()
+    merged = merged.subquery()
+    return union_all(
+        select(materialized.c.tweet_id), select(merged.c.tweet_id)
+    )
@@ -0,0 +1,205 @@
+import math
+import re
+import time
+from typing import List, Optional, Tuple
+
+from backend.src.config_data.config import (
+    TRENDING_BUCKET,
+    TRENDING_WINDOW,
+)
+from backend.src.database import dialects
+from backend.src.models.models import (
+    Users,
+    tag_count,
+    tweet_mention,
+    tweet_tag,
+)
+from sqlalchemy import func, literal, tuple_, update
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+
+TAG_MAX_LENGTH = 100
+
+_TAG = re.compile(r"(?<![\w#])#(\w+)", re.UNICODE)
+_MENTION = re.compile(r"(?<![\w@])@(\w+)", re.UNICODE)
+
+# Интервал, старше которого счётчики уже удалены в этом процессе
+_pruned_before: Optional[int] = None
+
+
+def extract_tags(text: str) -> List[str]:
+    """
+    Хэштеги из текста твита без повторов, в нижнем регистре
+    :param text: Текст твита
+    :return: Список тегов без символа #
+    """
+    tags = (tag.lower()[:TAG_MAX_LENGTH] for tag in _TAG.findall(text))
+    return list(dict.fromkeys(tags))
+
+
+def extract_mentions(text: str) -> List[str]:
+    """
+    Упомянутые в тексте твита никнеймы без повторов
+    :param text: Текст твита
+    :return: Список никнеймов без символа @
+    """
+    return list(dict.fromkeys(_MENTION.findall(text)))
+
+
+def normalize_tag(tag: str) -> str:
+    return tag.lstrip("#").lower()[:TAG_MAX_LENGTH]
+
+
+def current_bucket(now: Optional[float] = None) -> int:
+    return int((time.time() if now is None else now) // TRENDING_BUCKET)
+
+
+def _window_start(bucket: int) -> int:
+    return bucket - math.ceil(TRENDING_WINDOW / TRENDING_BUCKET) + 1
+
+
+async def index_topics(
+    session: AsyncSession,
+    tweet_id: int,
+    text: str,
+    now: Optional[float] = None,
+):
+    """
+    Функция записи хэштегов и упоминаний нового твита и увеличения
+    счётчиков трендов. Выполняется в транзакции создания твита
+    :param session: Открытая сессия
+    :param tweet_id: Id твита
+    :param text: Текст твита
+    :param now: Время создания, по умолчанию текущее
+    :return: None
+    """
+    global _pruned_before
+    tags = extract_tags(text)
+    if tags:
+        bucket = current_bucket(now)
+        await session.execute(
+            tweet_tag.insert(),
+            [
+                {"tag": tag, "tweet_id": tweet_id, "bucket": bucket}
+                for tag in tags
+            ],
+        )
+        upsert = dialects.insert(session, tag_count).values(
+            [{"bucket": bucket, "tag": tag, "count": 1} for tag in tags]
+        )
+        await session.execute(
+            upsert.on_conflict_do_update(
+                index_elements=[tag_count.c.bucket, tag_count.c.tag],
+                set_={"count": tag_count.c.count + 1},
+            )
+        )
+        # Интервалы, вышедшие из окна, удаляются один раз за интервал
+        window_start = _window_start(bucket)
+        if _pruned_before != window_start:
+            await session.execute(
+                tag_count.delete().where(tag_count.c.bucket < window_start)
+            )
+            _pruned_before = window_start
+
+    nicknames = extract_mentions(text)
+    if nicknames:
+        await session.execute(
+            tweet_mention.insert().from_select(
+                ["user_id", "tweet_id"],
+                select(Users.id, literal(tweet_id))
+                .where(Users.nickname.in_(nicknames))
+                .distinct(),
+            )
+        )
+
+
+async def unindex_topics(session: AsyncSession, tweet_id: int):
+    """
+    Функция уменьшения счётчиков трендов по тегам удаляемого твита.
+    Строки тегов и упоминаний удаляются вместе с твитом
+    :param session: Открытая сессия
+    :param tweet_id: Id твита
+    :return: None
+    """
+    await session.execute(
+        update(tag_count)
+        .where(
+            tuple_(tag_count.c.bucket, tag_count.c.tag).in_(
+                select(tweet_tag.c.bucket, tweet_tag.c.tag).where(
+                    tweet_tag.c.tweet_id == tweet_id
+                )
+            )
+        )
+        .values(count=tag_count.c.count - 1)
+    )
+
+
+async def get_tag_tweet_ids(
+    session: AsyncSession,
+    tag: str,
+    limit: int,
+    before_id: Optional[int] = None,
+) -> List[int]:
+    """
+    Функция получения страницы твитов с хэштегом, от новых к старым
+    :param session: Сессия запроса
+    :param tag: Тег без символа #
+    :param limit: Размер страницы
+    :param before_id: Курсор: id твитов меньше заданного
+    :return: Список id твитов
+    """
+    stmt = select(tweet_tag.c.tweet_id).where(tweet_tag.c.tag == tag)
+    if before_id is not None:
+        stmt = stmt.where(tweet_tag.c.tweet_id < before_id)
+    res = await session.scalars(
+        stmt.order_by(tweet_tag.c.tweet_id.desc()).limit(limit)
+    )
+    return list(res)
+
+
+async def get_mention_tweet_ids(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
+    before_id: Optional[int] = None,
+) -> List[int]:
+    """
+    Функция получения страницы твитов, в которых упомянут пользователь
+    :param session: Сессия запроса
+    :param user_id: Id пользователя
+    :param limit: Размер страницы
+    :param before_id: Курсор: id твитов меньше заданного
+    :return: Список id твитов
+    """
+    stmt = select(tweet_mention.c.tweet_id).where(
+        tweet_mention.c.user_id == user_id
+    )
+    if before_id is not None:
+        stmt = stmt.where(tweet_mention.c.tweet_id < before_id)
+    res = await session.scalars(
+        stmt.order_by(tweet_mention.c.tweet_id.desc()).limit(limit)
+    )
+    return list(res)
+
+
+async def get_trending(
+    session: AsyncSession, limit: int, now: Optional[float] = None
+) -> List[Tuple[str, int]]:
+    """
+    Функция получения самых частых тегов за окно трендов. Читает только
+    счётчики интервалов окна
+    :param session: Сессия запроса
+    :param limit: Число тегов
+    :param now: Момент, на который считается окно
+    :return: Список (тег, число твитов)
+    """
+    total = func.sum(tag_count.c.count)
+    res = await session.execute(
+        select(tag_count.c.tag, total)
+        .where(tag_count.c.bucket >= _window_start(current_bucket(now)))
+        .group_by(tag_count.c.tag)
+        .having(total > 0)
+        .order_by(total.desc(), tag_count.c.tag)
+        .limit(limit)
+    )
+    return [(tag, int(count)) for tag, count in res]
@@ -1,5 +1,26 @@
-from typing import List, Optional
+import time
+from collections import Counter
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Set, Tuple
 
+from backend.src.config_data.config import (
+    LIKES_FLUSH_INTERVAL,
+    LIKES_FLUSH_SIZE,
+    LIKES_MAX_PENDING,
+    LIKES_WRITE_BEHIND,
+    TOP_FEED_CANDIDATES,
+)
+from backend.src.database import dialects
+from backend.src.database.database import async_session
+from backend.src.database.timeline import (
+    backfill_timeline,
+    fan_out_tweet,
+    remove_tweet,
+    restore_fan_out,
+    timeline_ids,
+    trim_timeline,
+)
+from backend.src.database.topics import index_topics, unindex_topics
 from backend.src.models.models import (
     Image,
     Tweet,
@@ -7,268 +28,1002 @@ from backend.src.models.models import (
     followers,
     tweet_like,
 )
-from sqlalchemy import Column
-from sqlalchemy.exc import NoResultFound
-from sqlalchemy.ext.asyncio import AsyncSession, async_sessionmaker
+from backend.src.services.auth_cache import Principal, auth_cache
+from backend.src.services.events import FeedEvent, event_hub
+from backend.src.services.ranking import (
+    ScoringWeights,
+    score_candidates,
+    top_ids,
+)
+from backend.src.services.shared_cache import (
+    likes_key,
+    shared_cache,
+    tweet_key,
+)
+from backend.src.services.write_behind import WriteBehindQueue
+from sqlalchemy import (
+    Column,
+    case,
+    exists,
+    func,
+    insert,
+    literal,
+    true,
+    tuple_,
+    update,
+)
+from sqlalchemy.engine import Row
+from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy.orm.strategy_options import noload, subqueryload
+from sqlalchemy.orm.strategy_options import noload
+from sqlalchemy.sql import Select
+
+
+async def _bump_content_version(session: AsyncSession, author_ids):
+    """
+    Функция увеличения счётчика изменений вложений твитов авторов
+    :param session: Сессия запроса
+    :param author_ids: Ids авторов или подзапрос, их возвращающий
+    :return: None
+    """
+    await session.execute(
+        update(Users)
+        .where(Users.id.in_(author_ids))
+        .values(content_version=Users.content_version + 1)
+    )
 
 
 async def create_tweet(
-    async_session: async_sessionmaker[AsyncSession],
+    session: AsyncSession,
     tweet_data: str,
     user_id: Column[int],
     media_ids: Optional[List[Column[int]]] = None,
 ):
     """
-    Функция создания твита
-    :param async_session: Асинхронная сессия
+    Функция создания твита. Твит, привязка картинок, хэштеги и упоминания
+    и раскладка по лентам выполняются одной транзакцией
+    :param session: Сессия запроса
     :param tweet_data: Содержание твита
     :param user_id: Id пользователя
     :param media_ids: Ids фотографиий к твиту
     :return: Id нового твита
     """
-    new_tweet: Tweet = Tweet(data=tweet_data, user_id=user_id)
+    tweet_id = await session.scalar(
+        insert(Tweet)
+        .values(data=tweet_data, user_id=user_id)
+        .returning(Tweet.id)
+    )
     if media_ids:
-        async with async_session() as session:
-            res = await session.execute(
-                select(Image).filter(Image.id.in_(media_ids))
-            )
-            images = res.scalars().all()
-            if len(images) != len(media_ids):
-                return
-            new_tweet.images.extend(images)
-    async with async_session() as session:
-        async with session.begin():
-            session.add(new_tweet)
-        await session.commit()
-    return new_tweet.id
+        res = await session.execute(
+            update(Image)
+            .where(Image.id.in_(media_ids))
+            .values(tweet_id=tweet_id)
+            .execution_options(synchronize_session=False)
+        )
+        if res.rowcount != len(media_ids):
+            await session.rollback()
+            return
+    await index_topics(session, tweet_id, tweet_data)
+    await fan_out_tweet(session, tweet_id, user_id)
+    await session.commit()
+    # Id мог принадлежать удалённому твиту, если бд переиспользует ids
+    await shared_cache.delete_many([tweet_key(tweet_id), likes_key(tweet_id)])
+    await event_hub.publish([FeedEvent("tweet", user_id, tweet_id)])
+    return tweet_id
+
+
+async def get_existing_tweet_ids(
+    session: AsyncSession, tweet_ids: List[int]
+) -> Set[int]:
+    """
+    Функция проверки, какие из твитов существуют
+    :param session: Сессия запроса
+    :param tweet_ids: Ids твитов
+    :return: Множество существующих ids
+    """
+    if not tweet_ids:
+        return set()
+    res = await session.scalars(
+        select(Tweet.id).where(Tweet.id.in_(tweet_ids))
+    )
+    return set(res.all())
 
 
 async def get_tweet_without_user_and_likes(
-    async_session: async_sessionmaker[AsyncSession],
+    session: AsyncSession,
     tweet_id: int,
 ):
     """
     Функция получения объекта Tweet без загрузки связей user и likes
-    :param async_session: Асинхронная сессия
+    :param session: Сессия запроса
     :param tweet_id: id твита
     :return: Объект модели Tweet
     """
-    async with async_session() as session:
-        res = await session.execute(
-            select(Tweet)
-            .filter(Tweet.id.in_([tweet_id]))
-            .options(
-                noload(Tweet.likes),
-                noload(Tweet.user),
-            )
+    res = await session.execute(
+        select(Tweet)
+        .filter(Tweet.id.in_([tweet_id]))
+        .options(
+            noload(Tweet.likes),
+            noload(Tweet.user),
         )
-        await session.commit()
-        tweet = res.scalars().one_or_none()
-        return tweet
+    )
+    tweet = res.scalars().one_or_none()
+    return tweet
 
 
 async def delete_tweet_db(
-    async_session: async_sessionmaker[AsyncSession],
+    session: AsyncSession,
     tweet: Tweet,
-):
+) -> List[str]:
     """
     Функция удаления твита
-    :param async_session: Асинхронная сессия
+    :param session: Сессия запроса
     :param tweet: Объект модели Tweet
-    :return: None
+    :return: Хэши файлов, на которые после удаления не осталось ссылок
     """
-    async with async_session() as session:
-        async with session.begin():
-            statement = tweet_like.delete().where(
-                tweet_like.c.tweet_id == tweet.id
-            )
-            await session.execute(statement)
-            await session.delete(tweet)
-            await session.commit()
+    hashes = {image.content_hash for image in tweet.images}
+    hashes.discard(None)
+    statement = tweet_like.delete().where(tweet_like.c.tweet_id == tweet.id)
+    await session.execute(statement)
+    await remove_tweet(session, tweet.id)
+    await unindex_topics(session, tweet.id)
+    await session.delete(tweet)
+    await session.commit()
+    await shared_cache.delete_many([tweet_key(tweet.id), likes_key(tweet.id)])
+    await event_hub.publish([FeedEvent("delete", tweet.user_id, tweet.id)])
+    if not hashes:
+        return []
+    referenced = await session.scalars(
+        select(Image.content_hash)
+        .where(Image.content_hash.in_(hashes))
+        .distinct()
+    )
+    return sorted(hashes - set(referenced.all()))
 
 
-async def get_tweet_without_user(
-    async_session: async_sessionmaker[AsyncSession],
-    tweet_id: int,
+async def apply_like_changes(
+    session: AsyncSession, changes: Dict[Tuple[int, int], bool]
 ):
     """
-    Функция получения объекта Tweet без загрузки связи user
-    :param async_session: Асинхронная сессия
-    :param tweet_id: Id твита
-    :return: Объект модели Tweet
+    Функция записи пачки лайков и анлайков из очереди отложенной записи
+    в одной транзакции. Лайки удалённых твитов и уже записанные лайки
+    пропускаются, счётчики меняются на число реально изменённых строк
+    :param session: Открытая сессия
+    :param changes: Словарь (user_id, tweet_id) -> есть ли лайк
+    :return: None
     """
-    async with async_session() as session:
+    likes = [key for key, liked in changes.items() if liked]
+    unlikes = [key for key, liked in changes.items() if not liked]
+    changed = []
+    if likes:
+        existing = set(
+            await session.scalars(
+                select(Tweet.id).where(
+                    Tweet.id.in_({tweet_id for _, tweet_id in likes})
+                )
+            )
+        )
+        rows = [
+            {"user_id": user_id, "tweet_id": tweet_id}
+            for user_id, tweet_id in likes
+            if tweet_id in existing
+        ]
+        if rows:
+            res = await session.execute(
+                dialects.insert(session, tweet_like)
+                .values(rows)
+                .on_conflict_do_nothing()
+                .returning(tweet_like.c.user_id, tweet_like.c.tweet_id)
+            )
+            changed += [(user_id, tweet_id, 1) for user_id, tweet_id in res]
+    if unlikes:
         res = await session.execute(
-            select(Tweet)
-            .filter(Tweet.id.in_([tweet_id]))
-            .options(
-                subqueryload(Tweet.likes).options(
-                    noload(Users.followers), noload(Users.followed)
-                ),
-                noload(Tweet.user),
+            tweet_like.delete()
+            .where(
+                tuple_(tweet_like.c.user_id, tweet_like.c.tweet_id).in_(
+                    unlikes
+                )
             )
+            .returning(tweet_like.c.user_id, tweet_like.c.tweet_id)
         )
-        tweet = res.scalars().one_or_none()
+        changed += [(user_id, tweet_id, -1) for user_id, tweet_id in res]
+    if not changed:
         await session.commit()
-        return tweet
+        return
+    deltas: Dict[int, int] = Counter()
+    actors: Dict[int, int] = {}
+    for user_id, tweet_id, delta in changed:
+        deltas[tweet_id] += delta
+        actors[tweet_id] = user_id
+    res = await session.execute(
+        update(Tweet)
+        .where(Tweet.id.in_(list(deltas)))
+        .values(
+            like_count=Tweet.like_count
+            + case(dict(deltas), value=Tweet.id, else_=0)
+        )
+        .returning(Tweet.id, Tweet.user_id, Tweet.like_count)
+    )
+    events = [
+        FeedEvent("like", author_id, tweet_id, actors[tweet_id], like_count)
+        for tweet_id, author_id, like_count in res
+    ]
+    await session.commit()
+    await shared_cache.delete_many(likes_key(tweet_id) for tweet_id in deltas)
+    await event_hub.publish(events)
+
+
+async def _flush_like_changes(changes: Dict[Tuple[int, int], bool]):
+    async with async_session() as session:
+        await apply_like_changes(session, changes)
+
+
+like_queue = WriteBehindQueue(
+    _flush_like_changes,
+    max_size=LIKES_FLUSH_SIZE,
+    interval=LIKES_FLUSH_INTERVAL,
+    enabled=LIKES_WRITE_BEHIND,
+    max_pending=LIKES_MAX_PENDING,
+)
+
+
+def queued_like_changes(tweet_ids: List[int]) -> List[Tuple[int, int, bool]]:
+    """
+    Функция получения ещё не записанных в бд лайков и анлайков твитов.
+    Очередь у каждого воркера своя, поэтому они входят в ETag, только
+    когда касаются твитов ответа
+    :param tweet_ids: Ids твитов
+    :return: Отсортированный список (user_id, tweet_id, есть ли лайк)
+    """
+    tweet_ids = set(tweet_ids)
+    return sorted(
+        (user_id, tweet_id, liked)
+        for (user_id, tweet_id), liked in like_queue.items().items()
+        if tweet_id in tweet_ids
+    )
+
+
+async def _queue_likes(
+    session: AsyncSession,
+    user_id: int,
+    tweet_ids: List[int],
+    liked: bool,
+) -> List[int]:
+    """
+    Функция постановки лайков или анлайков в очередь отложенной записи.
+    Состояние, которого нет в очереди, читается из бд одним запросом
+    :param session: Сессия запроса
+    :param user_id: Id пользователя
+    :param tweet_ids: Ids твитов
+    :param liked: True - лайк, False - анлайк
+    :return: Ids твитов, состояние которых изменилось
+    """
+    await like_queue.make_room()
+    unknown = [
+        tweet_id
+        for tweet_id in tweet_ids
+        if like_queue.get((user_id, tweet_id)) is None
+    ]
+    stored = {}
+    if unknown:
+        has_like = exists().where(
+            tweet_like.c.tweet_id == Tweet.id, tweet_like.c.user_id == user_id
+        )
+        res = await session.execute(
+            select(Tweet.id, has_like).where(Tweet.id.in_(unknown))
+        )
+        stored = dict(res.all())
+    changed = []
+    for tweet_id in tweet_ids:
+        # Очередь перечитывается: пока шёл запрос, её могли изменить
+        state = like_queue.get((user_id, tweet_id))
+        if state is None:
+            state = stored.get(tweet_id)
+        if state is None or state == liked:
+            continue
+        like_queue.put((user_id, tweet_id), liked)
+        changed.append(tweet_id)
+    return changed
+
+
+async def add_likes(
+    session: AsyncSession,
+    user_id: Column[int],
+    tweet_ids: List[int],
+) -> List[int]:
+    """
+    Функция добавления лайков к нескольким твитам одним запросом.
+    Повторные лайки и лайки несуществующих твитов пропускаются. В режиме
+    отложенной записи лайки ставятся в очередь
+    :param session: Сессия запроса
+    :param user_id: Id пользователя
+    :param tweet_ids: Ids твитов
+    :return: Ids твитов, к которым лайк добавлен
+    """
+    if not tweet_ids:
+        return []
+    if like_queue.enabled:
+        return await _queue_likes(session, user_id, tweet_ids, True)
+    statement = (
+        dialects.insert(session, tweet_like)
+        .from_select(
+            ["tweet_id", "user_id"],
+            select(Tweet.id, literal(user_id)).where(Tweet.id.in_(tweet_ids)),
+        )
+        .on_conflict_do_nothing()
+        .returning(tweet_like.c.tweet_id)
+    )
+    added = (await session.scalars(statement)).all()
+    events = []
+    if added:
+        res = await session.execute(
+            update(Tweet)
+            .where(Tweet.id.in_(added))
+            .values(like_count=Tweet.like_count + 1)
+            .returning(Tweet.id, Tweet.user_id, Tweet.like_count)
+        )
+        events = [
+            FeedEvent("like", author_id, tweet_id, user_id, like_count)
+            for tweet_id, author_id, like_count in res
+        ]
+    await session.commit()
+    await shared_cache.delete_many(likes_key(tweet_id) for tweet_id in added)
+    await event_hub.publish(events)
+    return added
 
 
 async def add_like(
-    async_session: async_sessionmaker[AsyncSession],
+    session: AsyncSession,
     user_id: Column[int],
     tweet_id: int,
-):
+) -> bool:
     """
-    Функция добавления лайка к твиту в бд
-    :param async_session: Асинхронная сессия
+    Функция добавления лайка к твиту в бд. Повторный лайк и лайк
+    несуществующего твита ничего не меняют
+    :param session: Сессия запроса
     :param user_id: Id пользователя
     :param tweet_id: Id твита
-    :return: None
+    :return: True, если лайк добавлен
     """
-    statement = tweet_like.insert().values(user_id=user_id, tweet_id=tweet_id)
-    async with async_session() as session:
-        async with session.begin():
-            await session.execute(statement)
-        await session.commit()
+    return bool(await add_likes(session, user_id, [tweet_id]))
 
 
 async def delete_like_db(
-    async_session: async_sessionmaker[AsyncSession],
+    session: AsyncSession,
     user_id: Column[int],
     tweet_id: int,
-):
+) -> bool:
     """
-    Функция удаления лайка с твита
-    :param async_session: Асинхронная сессия
+    Функция удаления лайка с твита. В режиме отложенной записи анлайк
+    ставится в очередь
+    :param session: Сессия запроса
     :param user_id: Id пользователя
     :param tweet_id: Id твита
-    :return: None
+    :return: True, если лайк был удалён
     """
-    statement = tweet_like.delete().where(
-        tweet_like.c.tweet_id == tweet_id, tweet_like.c.user_id == user_id
+    if like_queue.enabled:
+        return bool(await _queue_likes(session, user_id, [tweet_id], False))
+    statement = (
+        tweet_like.delete()
+        .where(
+            tweet_like.c.tweet_id == tweet_id,
+            tweet_like.c.user_id == user_id,
+        )
+        .returning(tweet_like.c.tweet_id)
     )
-    async with async_session() as session:
-        async with session.begin():
-            await session.execute(statement)
-        await session.commit()
+    deleted = (await session.execute(statement)).first() is not None
+    if deleted:
+        author_id, like_count = (
+            await session.execute(
+                update(Tweet)
+                .where(Tweet.id == tweet_id)
+                .values(like_count=Tweet.like_count - 1)
+                .returning(Tweet.user_id, Tweet.like_count)
+            )
+        ).one()
+    await session.commit()
+    if deleted:
+        await shared_cache.delete_many([likes_key(tweet_id)])
+        await event_hub.publish(
+            [FeedEvent("like", author_id, tweet_id, user_id, like_count)]
+        )
+    return deleted
 
 
-async def get_tweets(
-    async_session: async_sessionmaker[AsyncSession],
-    user: Users,
+def _likes_preview_query(dialect: str, tweet_ids: List[int], limit: int):
+    if dialect == "postgresql":
+        # LATERAL читает не больше limit строк индекса tweet_like на
+        # твит, так что стоимость не зависит от популярности твитов
+        likers = (
+            select(tweet_like.c.user_id)
+            .where(tweet_like.c.tweet_id == Tweet.id)
+            .order_by(tweet_like.c.user_id)
+            .limit(limit)
+            .lateral()
+        )
+        return (
+            select(Tweet.id, Users.id, Users.nickname)
+            .select_from(Tweet)
+            .join(likers, true())
+            .join(Users, Users.id == likers.c.user_id)
+            .where(Tweet.id.in_(tweet_ids))
+            .order_by(Tweet.id, Users.id)
+        )
+    ranked = (
+        select(
+            tweet_like.c.tweet_id,
+            tweet_like.c.user_id,
+            func.row_number()
+            .over(
+                partition_by=tweet_like.c.tweet_id,
+                order_by=tweet_like.c.user_id,
+            )
+            .label("position"),
+        )
+        .where(tweet_like.c.tweet_id.in_(tweet_ids))
+        .subquery()
+    )
+    return (
+        select(ranked.c.tweet_id, Users.id, Users.nickname)
+        .join(Users, Users.id == ranked.c.user_id)
+        .where(ranked.c.position <= limit)
+        .order_by(ranked.c.tweet_id, ranked.c.user_id)
+    )
+
+
+async def get_likes_preview(
+    session: AsyncSession,
+    tweet_ids: List[int],
+    limit: int,
 ):
     """
-    Функция получения из бд твитов для ленты
-    :param async_session: Асинхронная сессия
-    :param user: Объект модели Users
-    :return: Список объектов Tweet
+    Функция получения первых limit лайкнувших для каждого твита.
+    Длинные списки твитов читаются частями, по запросу на часть
+    :param session: Сессия запроса
+    :param tweet_ids: Ids твитов
+    :param limit: Сколько лайкнувших загружать на твит
+    :return: Словарь tweet_id -> список строк (id, nickname)
     """
-    async with async_session() as session:
-        ids = [u.id for u in user.followed] + [user.id]
-        res_1 = await session.execute(
-            select(Tweet)
-            .filter(Tweet.user_id.in_(ids))
-            .order_by(Tweet.id.desc())
-            .options(
-                subqueryload(Tweet.likes).options(
-                    noload(Users.followers), noload(Users.followed)
-                ),
-                subqueryload(Tweet.user).options(
-                    noload(Users.followers), noload(Users.followed)
-                ),
+    preview: Dict[int, list] = {tweet_id: [] for tweet_id in tweet_ids}
+    if not tweet_ids or limit <= 0:
+        return preview
+    dialect = session.bind.dialect.name
+    for chunk in dialects.chunked(tweet_ids):
+        res = await session.execute(
+            _likes_preview_query(dialect, chunk, limit)
+        )
+        for tweet_id, user_id, nickname in res:
+            preview[tweet_id].append((user_id, nickname))
+    return preview
+
+
+async def get_liked_tweet_ids(
+    session: AsyncSession,
+    user_id: int,
+    tweet_ids: List[int],
+) -> Set[int]:
+    """
+    Функция получения твитов, которые лайкнул пользователь, с учётом
+    лайков из очереди отложенной записи
+    :param session: Сессия запроса
+    :param user_id: Id пользователя
+    :param tweet_ids: Ids твитов
+    :return: Множество ids лайкнутых твитов
+    """
+    if not tweet_ids:
+        return set()
+    liked = set()
+    for chunk in dialects.chunked(tweet_ids):
+        liked.update(
+            await session.scalars(
+                select(tweet_like.c.tweet_id).where(
+                    tweet_like.c.user_id == user_id,
+                    tweet_like.c.tweet_id.in_(chunk),
+                )
             )
         )
-        try:
-            user_tweets = res_1.scalars().all()
-        except NoResultFound:
-            user_tweets = []
-        return user_tweets
+    return with_queued_likes(user_id, tweet_ids, liked)
+
+
+def with_queued_likes(
+    user_id: int, tweet_ids: List[int], liked: Set[int]
+) -> Set[int]:
+    """
+    Функция наложения лайков пользователя из очереди отложенной записи
+    на прочитанные из бд
+    :param user_id: Id пользователя
+    :param tweet_ids: Ids твитов
+    :param liked: Ids твитов, лайкнутых по данным бд
+    :return: Множество ids лайкнутых твитов
+    """
+    if like_queue.enabled and len(like_queue):
+        liked = set(liked)
+        for tweet_id in tweet_ids:
+            queued = like_queue.get((user_id, tweet_id))
+            if queued is True:
+                liked.add(tweet_id)
+            elif queued is False:
+                liked.discard(tweet_id)
+    return liked
+
+
+async def get_tweet_likes(
+    session: AsyncSession,
+    tweet_id: int,
+    limit: int,
+    after_id: Optional[int] = None,
+):
+    """
+    Функция получения страницы лайкнувших твит
+    :param session: Сессия запроса
+    :param tweet_id: Id твита
+    :param limit: Размер страницы
+    :param after_id: Курсор: id пользователей больше заданного
+    :return: Список объектов Users или None, если твита нет
+    """
+    statement = (
+        select(Users)
+        .join(tweet_like, tweet_like.c.user_id == Users.id)
+        .where(tweet_like.c.tweet_id == tweet_id)
+        .order_by(Users.id)
+        .limit(limit)
+    )
+    if after_id is not None:
+        statement = statement.where(Users.id > after_id)
+    if await session.get(Tweet, tweet_id) is None:
+        return None
+    res = await session.scalars(statement)
+    return res.all()
+
+
+def _stamped(statement: Select, viewer_id: int) -> Select:
+    liked = exists().where(
+        tweet_like.c.tweet_id == Tweet.id, tweet_like.c.user_id == viewer_id
+    )
+    return statement.add_columns(
+        Tweet.like_count, Users.content_version, liked
+    ).join(Users, Users.id == Tweet.user_id)
+
+
+async def get_feed_page(
+    session: AsyncSession,
+    user_id: int,
+    limit: Optional[int] = None,
+    before_id: Optional[int] = None,
+) -> List[Row]:
+    """
+    Функция получения твитов ленты пользователя от новых к старым. Кроме
+    id возвращается то, от чего ещё зависит ответ: число лайков, счётчик
+    изменений вложений автора и лайкнул ли твит пользователь. Из этого
+    строится ETag ленты, без общих счётчиков, которые пришлось бы менять
+    при каждом лайке
+    :param session: Сессия запроса
+    :param user_id: Id пользователя
+    :param limit: Размер страницы
+    :param before_id: Курсор: id твитов меньше заданного
+    :return: Список строк (id, like_count, content_version, liked)
+    """
+    statement = _stamped(
+        select(Tweet.id)
+        .where(Tweet.id.in_(timeline_ids(user_id, limit, before_id)))
+        .order_by(Tweet.id.desc()),
+        user_id,
+    )
+    if limit is not None:
+        statement = statement.limit(limit)
+    res = await session.execute(statement)
+    return res.all()
+
+
+async def get_tweet_stamps(
+    session: AsyncSession, user_id: int, tweet_ids: List[int]
+) -> List[Row]:
+    """
+    Функция получения того же, что get_feed_page, для заданных твитов
+    :param session: Сессия запроса
+    :param user_id: Id пользователя
+    :param tweet_ids: Ids твитов
+    :return: Список строк (id, like_count, content_version, liked) в
+    порядке ids
+    """
+    rows = {}
+    for chunk in dialects.chunked(tweet_ids):
+        res = await session.execute(
+            _stamped(select(Tweet.id).where(Tweet.id.in_(chunk)), user_id)
+        )
+        rows.update((row[0], row) for row in res)
+    return [rows[tweet_id] for tweet_id in tweet_ids if tweet_id in rows]
+
+
+async def get_top_feed_tweet_ids(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
+    candidates: int = TOP_FEED_CANDIDATES,
+    weights: ScoringWeights = ScoringWeights(),
+    now: Optional[float] = None,
+) -> List[int]:
+    """
+    Функция получения ids лучших твитов из последних candidates твитов
+    ленты. Кандидаты и лайки читателя к их авторам читаются двумя
+    запросами, оценка считается пакетом по всем кандидатам
+    :param session: Сессия запроса
+    :param user_id: Id пользователя
+    :param limit: Сколько твитов вернуть
+    :param candidates: Сколько последних твитов ленты оценивать
+    :param weights: Веса оценки
+    :param now: Момент, от которого считается возраст твитов
+    :return: Список ids твитов по убыванию оценки
+    """
+    res = await session.execute(
+        select(Tweet.id, Tweet.user_id, Tweet.like_count, Tweet.created_at)
+        .where(Tweet.id.in_(timeline_ids(user_id, candidates)))
+        .order_by(Tweet.id.desc())
+        .limit(candidates)
+    )
+    rows = res.all()
+    if not rows:
+        return []
+    tweet_ids, author_ids, likes, created = zip(*rows)
+    liked = await session.execute(
+        select(Tweet.user_id, func.count())
+        .join(tweet_like, tweet_like.c.tweet_id == Tweet.id)
+        .where(
+            tweet_like.c.user_id == user_id,
+            Tweet.user_id.in_(set(author_ids)),
+        )
+        .group_by(Tweet.user_id)
+    )
+    affinity = dict(liked.all())
+    now = time.time() if now is None else now
+    scores = score_candidates(
+        likes,
+        [now - _timestamp(moment) for moment in created],
+        [affinity.get(author_id, 0) for author_id in author_ids],
+        weights,
+    )
+    return top_ids(tweet_ids, scores, limit)
+
+
+def _timestamp(moment: datetime) -> float:
+    # SQLite возвращает время без зоны, записанное в UTC
+    if moment.tzinfo is None:
+        moment = moment.replace(tzinfo=timezone.utc)
+    return moment.timestamp()
 
 
 async def get_following_user(
-    async_session: async_sessionmaker[AsyncSession],
+    session: AsyncSession,
     following_id: int,
 ):
     """
     Получения пользователя по id
-    :param async_session: Асинхронная сессия
+    :param session: Сессия запроса
     :param following_id: Id пользователя, на которого подписываются
     :return: Объект модели Users
     """
-    async with async_session() as session:
-        following_user: Users | None = await session.get(Users, following_id)
+    following_user: Users | None = await session.get(Users, following_id)
     return following_user
 
 
+async def follow_users_db(
+    session: AsyncSession,
+    user_id: Column[int],
+    following_ids: List[int],
+) -> List[int]:
+    """
+    Функция подписки пользователя на нескольких пользователей одним
+    запросом. Повторные подписки, подписки на несуществующих
+    пользователей и на самого себя пропускаются
+    :param session: Сессия запроса
+    :param user_id: Id пользователя, который подписывается
+    :param following_ids: Ids пользователей, на которых подписываются
+    :return: Ids пользователей, подписка на которых добавлена
+    """
+    if not following_ids:
+        return []
+    statement = (
+        dialects.insert(session, followers)
+        .from_select(
+            ["user_id", "follower_id"],
+            select(literal(user_id), Users.id).where(
+                Users.id.in_(following_ids), Users.id != user_id
+            ),
+        )
+        .on_conflict_do_nothing()
+        .returning(followers.c.follower_id)
+    )
+    added = (await session.scalars(statement)).all()
+    if added:
+        await session.execute(
+            update(Users)
+            .where(Users.id.in_([user_id, *added]))
+            .values(
+                follow_version=Users.follow_version + 1,
+                followers_count=case(
+                    (
+                        Users.id.in_(added),
+                        Users.followers_count + 1,
+                    ),
+                    else_=Users.followers_count,
+                ),
+            )
+        )
+        await backfill_timeline(session, user_id, added)
+    await session.commit()
+    if added:
+        auth_cache.invalidate_user(user_id)
+        await event_hub.publish(
+            FeedEvent("follow", author_id, user_id=user_id)
+            for author_id in added
+        )
+    return added
+
+
 async def follow_user_db(
-    async_session: async_sessionmaker[AsyncSession],
+    session: AsyncSession,
     user_id: Column[int],
     following_id: int,
-):
+) -> bool:
     """
-    Функция добавления в бд записи подписки одного пользователя на другого
-    :param async_session: Асинхронная сессия
+    Функция добавления в бд записи подписки одного пользователя на другого.
+    Повторная подписка и подписка на несуществующего пользователя ничего
+    не меняют
+    :param session: Сессия запроса
     :param user_id: Id пользователя, который подписывается
     :param following_id: Id пользователя, на которого подписываются
-    :return: None
+    :return: True, если подписка добавлена
     """
-    async with async_session() as session:
-        async with session.begin():
-            statement = followers.insert().values(
-                user_id=user_id, follower_id=following_id
-            )
-            await session.execute(statement)
-        await session.commit()
+    return bool(await follow_users_db(session, user_id, [following_id]))
 
 
 async def remove_follow_db(
-    async_session: async_sessionmaker[AsyncSession],
+    session: AsyncSession,
     user_id: Column[int],
     following_id: int,
-):
+) -> bool:
     """
     Функция удаления подписки
-    :param async_session: Асинхронная сессия
+    :param session: Сессия запроса
     :param user_id: Id пользователя, который подписывается
     :param following_id: Id пользователя, на которого подписываются
-    :return: None
+    :return: True, если подписка была удалена
     """
-    async with async_session() as session:
-        async with session.begin():
-            statement = followers.delete().where(
-                followers.c.user_id == user_id,
-                followers.c.follower_id == following_id,
+    statement = (
+        followers.delete()
+        .where(
+            followers.c.user_id == user_id,
+            followers.c.follower_id == following_id,
+        )
+        .returning(followers.c.follower_id)
+    )
+    deleted = (await session.execute(statement)).first() is not None
+    if deleted:
+        counts = await session.execute(
+            update(Users)
+            .where(Users.id.in_([user_id, following_id]))
+            .values(
+                follow_version=Users.follow_version + 1,
+                followers_count=case(
+                    (
+                        Users.id == following_id,
+                        Users.followers_count - 1,
+                    ),
+                    else_=Users.followers_count,
+                ),
             )
-            await session.execute(statement)
-        await session.commit()
+            .returning(Users.id, Users.followers_count)
+        )
+        await trim_timeline(session, user_id, following_id)
+        await restore_fan_out(
+            session, following_id, dict(counts.all())[following_id]
+        )
+    await session.commit()
+    if deleted:
+        auth_cache.invalidate_user(user_id)
+        await event_hub.publish(
+            [FeedEvent("unfollow", following_id, user_id=user_id)]
+        )
+    return deleted
 
 
-async def get_user(
-    async_session: async_sessionmaker[AsyncSession],
+async def get_principal(
+    session: AsyncSession,
+    api_key: str,
+):
+    """
+    Функция получения авторизованного пользователя по api-key
+    без загрузки связей
+    :param session: Сессия запроса
+    :param api_key: api-key пользователя
+    :return: Объект Principal или None
+    """
+    res = await session.execute(
+        select(Users.id, Users.nickname).where(Users.api_key == api_key)
+    )
+    user = res.one_or_none()
+    if user is None:
+        return None
+    following_ids = await session.scalars(
+        select(followers.c.follower_id).where(followers.c.user_id == user.id)
+    )
+    return Principal(
+        id=user.id,
+        nickname=user.nickname,
+        following_ids=frozenset(following_ids),
+    )
+
+
+async def get_existing_user_ids(
+    session: AsyncSession, user_ids: List[int]
+) -> Set[int]:
+    """
+    Функция проверки, какие из пользователей существуют
+    :param session: Сессия запроса
+    :param user_ids: Ids пользователей
+    :return: Множество существующих ids
+    """
+    if not user_ids:
+        return set()
+    res = await session.scalars(select(Users.id).where(Users.id.in_(user_ids)))
+    return set(res.all())
+
+
+def _follow_list_query(
     user_id: int,
+    limit: int,
+    after_id: Optional[int],
+    followers_of: bool,
 ):
     """
-    Функция получения пользователя по id
-    :param async_session: Асинхронная сессия
-    :param user_id: Id искомого пользователя
-    :return: Объект модели Users
+    Запрос страницы подписчиков или подписок пользователя
+    :param user_id: Id пользователя
+    :param limit: Размер страницы
+    :param after_id: Курсор: id пользователей больше заданного
+    :param followers_of: True - подписчики, False - подписки
+    :return: Запрос, возвращающий объекты Users
     """
-    async with async_session() as session:
-        user: Users | None = await session.get(Users, user_id)
-    return user
+    if followers_of:
+        owner, other = followers.c.follower_id, followers.c.user_id
+    else:
+        owner, other = followers.c.user_id, followers.c.follower_id
+    statement = (
+        select(Users)
+        .join(followers, other == Users.id)
+        .where(owner == user_id)
+        .order_by(Users.id)
+        .limit(limit)
+    )
+    if after_id is not None:
+        statement = statement.where(Users.id > after_id)
+    return statement
+
+
+async def get_follow_list(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
+    after_id: Optional[int] = None,
+    followers_of: bool = True,
+):
+    """
+    Функция получения страницы подписчиков или подписок пользователя
+    :param session: Сессия запроса
+    :param user_id: Id пользователя
+    :param limit: Размер страницы
+    :param after_id: Курсор: id пользователей больше заданного
+    :param followers_of: True - подписчики, False - подписки
+    :return: Список объектов Users или None, если пользователя нет
+    """
+    if await session.get(Users, user_id) is None:
+        return None
+    res = await session.scalars(
+        _follow_list_query(user_id, limit, after_id, followers_of)
+    )
+    return res.all()
 
 
-async def add_image(
-    async_session: async_sessionmaker[AsyncSession], image: Image
+async def get_user_profile(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
 ):
+    """
+    Функция получения пользователя с первыми limit подписчиками и
+    подписками
+    :param session: Сессия запроса
+    :param user_id: Id пользователя
+    :param limit: Сколько подписчиков и подписок загружать
+    :return: Кортеж (Users, подписчики, подписки) или None
+    """
+    user: Users | None = await session.get(Users, user_id)
+    if user is None:
+        return None
+    user_followers = await session.scalars(
+        _follow_list_query(user_id, limit, None, followers_of=True)
+    )
+    user_following = await session.scalars(
+        _follow_list_query(user_id, limit, None, followers_of=False)
+    )
+    return user, user_followers.all(), user_following.all()
+
+
+async def get_profile_version(
+    session: AsyncSession, user_id: int
+) -> Optional[str]:
+    """
+    Функция получения версии профиля пользователя
+    :param session: Сессия запроса
+    :param user_id: Id пользователя
+    :return: Строка версии или None, если пользователя нет
+    """
+    version = await session.scalar(
+        select(Users.follow_version).where(Users.id == user_id)
+    )
+    return None if version is None else str(version)
+
+
+async def add_image(session: AsyncSession, image: Image):
     """
     Функция добавления картинки в бд.
-    :param async_session: Асинхронная сессия
+    :param session: Сессия запроса
     :param image: Объект модели Image
     :return: None
     """
-    async with async_session() as session:
-        async with session.begin():
-            session.add(image)
+    session.add(image)
+    await session.commit()
+
+
+async def get_variants_by_hash(
+    session: AsyncSession, content_hash: str
+) -> Optional[List[Dict]]:
+    """
+    Функция поиска уже построенных производных для файла с тем же
+    содержимым
+    :param session: Сессия запроса
+    :param content_hash: sha256 содержимого
+    :return: Список производных или None, если их ещё нет
+    """
+    return await session.scalar(
+        select(Image.variants)
+        .where(Image.content_hash == content_hash, Image.variants.is_not(None))
+        .limit(1)
+    )
+
+
+async def set_image_variants(
+    session: AsyncSession, image_id: int, variants: List[Dict]
+):
+    """
+    Функция сохранения списка построенных производных картинки. Список
+    проставляется и другим записям с тем же содержимым, которые были
+    загружены, пока производные строились
+    :param session: Сессия
+    :param image_id: Id картинки
+    :param variants: Список производных
+    :return: None
+    """
+    same_content = (
+        select(Image.content_hash)
+        .where(Image.id == image_id)
+        .scalar_subquery()
+    )
+    changed = await session.scalars(
+        update(Image)
+        .where(
+            (Image.id == image_id)
+            | (Image.content_hash == same_content) & Image.variants.is_(None)
+        )
+        .values(variants=variants)
+        .returning(Image.tweet_id)
+    )
+    tweet_ids = [tweet_id for tweet_id in changed.all() if tweet_id]
+    if tweet_ids:
+        # Картинка уже в твите: лента его читателей изменилась
+        await _bump_content_version(
+            session, select(Tweet.user_id).where(Tweet.id.in_(tweet_ids))
+        )
+    await session.commit()
+    await shared_cache.delete_many(
+        tweet_key(tweet_id) for tweet_id in tweet_ids
+    )
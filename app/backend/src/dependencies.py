@@ -1,8 +1,47 @@
-from backend.src.models.models import Users
-from fastapi import HTTPException, Request
+from typing import AsyncIterator
 
+from backend.src.database.database import (
+    async_session,
+    engine,
+    read_engine,
+    read_session,
+)
+from backend.src.database.utils import get_principal
+from backend.src.services.auth_cache import auth_cache
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy.ext.asyncio import AsyncSession
 
-async def token_required(request: Request):
+
+async def get_session() -> AsyncIterator[AsyncSession]:
+    """
+    Сессия основной бд на время запроса. FastAPI кэширует зависимость в
+    пределах запроса, поэтому token_required и route, который пишет в бд,
+    получают одну и ту же сессию
+    :return:
+    """
+    async with async_session() as session:
+        yield session
+
+
+async def get_read_session(
+    session: AsyncSession = Depends(get_session),
+) -> AsyncIterator[AsyncSession]:
+    """
+    Сессия бд для route, которые только читают данные. Если задана
+    реплика, запросы идут на неё, иначе используется сессия основной бд,
+    в которой прошла авторизация
+    :return:
+    """
+    if read_engine is engine:
+        yield session
+        return
+    async with read_session() as replica:
+        yield replica
+
+
+async def token_required(
+    request: Request, session: AsyncSession = Depends(get_session)
+):
     api_token = request.headers.get("api-key", None)
     if api_token is None:
         raise HTTPException(
@@ -12,7 +51,17 @@ async def token_required(request: Request):
                 "msg": "Valid api-token token is missing",
             },
         )
-    current_user = await Users.get_by_token(api_token)
+    current_user = auth_cache.get(api_token)
+    if current_user is None:
+        # Пользователь читается с основной бд: после сброса кэша при
+        # подписке реплика может ещё вернуть старые подписки
+        current_user = await get_principal(session, api_token)
+        if read_engine is not engine:
+            # Соединение не держится до конца запроса: route может
+            # читать с реплики
+            await session.close()
+        if current_user is not None:
+            auth_cache.set(api_token, current_user)
     if current_user is None:
         raise HTTPException(
             status_code=400,
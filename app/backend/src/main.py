@@ -1,15 +1,40 @@
+from backend.src.config_data.config import (
+    GRAPH_LOAD_AT_STARTUP,
+    MAX_UPLOAD_SIZE,
+)
 from backend.src.database.database import Base, async_session, engine
+from backend.src.database.graph import load_follow_graph
+from backend.src.database.migrations import upgrade_schema
+from backend.src.database.search import create_search_index
+from backend.src.database.sweeper import sweeper
+from backend.src.database.timeline import rebuild_timelines
+from backend.src.database.utils import like_queue
 from backend.src.models.models import Users
 from backend.src.routers import media, tweets, users
+from backend.src.services.events import event_hub
+from backend.src.services.images import shutdown_pool
+from backend.src.services.instrumentation import MetricsMiddleware
+from backend.src.services.metrics import REGISTRY
+from backend.src.services.shared_cache import shared_cache
+from backend.src.services.uploads import UploadSizeLimitMiddleware
 from fastapi import FastAPI
+from fastapi.responses import PlainTextResponse
 
 app = FastAPI()
+app.add_middleware(
+    UploadSizeLimitMiddleware,
+    max_size=MAX_UPLOAD_SIZE,
+    path_prefix="/api/medias",
+)
+app.add_middleware(MetricsMiddleware)
 
 
 @app.on_event("startup")
 async def startapp():
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+        await conn.run_sync(upgrade_schema)
+        await create_search_index(conn)
 
     async with async_session() as session:
         user = await session.get(Users, 1)
@@ -20,6 +45,28 @@ async def startapp():
                 session.add(new_user)
             session.commit()
 
+    async with async_session() as session:
+        async with session.begin():
+            await rebuild_timelines(session)
+
+    await shared_cache.start()
+    await event_hub.start()
+    # Граф загружается после подписки на события, чтобы не пропустить
+    # подписки, сделанные во время загрузки
+    if GRAPH_LOAD_AT_STARTUP:
+        await load_follow_graph()
+    await sweeper.start()
+
+
+@app.on_event("shutdown")
+async def stopapp():
+    # Лайки из очереди записываются до закрытия соединений
+    await like_queue.close()
+    await sweeper.close()
+    shutdown_pool()
+    await shared_cache.close()
+    await event_hub.close()
+
 
 # Для тестирования без front-end
 
@@ -34,6 +81,15 @@ async def startapp():
 #     return response
 
 
+@app.get("/metrics", response_class=PlainTextResponse)
+async def metrics():
+    """
+    Метрики сервиса в текстовом формате Prometheus
+    :return:
+    """
+    return REGISTRY.render()
+
+
 app.include_router(tweets.router)
 app.include_router(media.router)
 app.include_router(users.router)
@@ -1,16 +1,17 @@
-from typing import Optional
-
-from backend.src.database.database import Base, async_session
+from backend.src.database.database import Base
 from sqlalchemy import (
+    JSON,
     Column,
+    DateTime,
     ForeignKey,
+    Index,
     Integer,
     Sequence,
     String,
     Table,
     Uuid,
+    func,
 )
-from sqlalchemy.future import select
 from sqlalchemy.orm import relationship
 
 
@@ -23,14 +24,26 @@ class Users(Base):
     name = Column(String(50), nullable=False)
     nickname = Column(String(50), nullable=False)
     api_key = Column(String(), nullable=False, unique=True)
+    followers_count = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    # Счётчики изменений для ETag: подписки и подписчики пользователя и
+    # готовность вариантов картинок его твитов. Твиты и лайки в ETag
+    # ленты учитываются по самим строкам страницы
+    follow_version = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
+    content_version = Column(
+        Integer, nullable=False, default=0, server_default="0"
+    )
     followers = relationship(
         "Users",
         secondary="followers",
         primaryjoin="Users.id==followers.c.follower_id",
         secondaryjoin="Users.id==followers.c.user_id==id",
         back_populates="followers",
-        lazy="joined",
-        join_depth=2,
+        lazy="raise",
+        passive_deletes=True,
     )
     followed = relationship(
         "Users",
@@ -38,21 +51,11 @@ class Users(Base):
         primaryjoin="Users.id==followers.c.user_id",
         secondaryjoin="Users.id==followers.c.follower_id",
         back_populates="followed",
-        lazy="joined",
-        join_depth=2,
+        lazy="raise",
+        passive_deletes=True,
         overlaps="followers",
     )
 
-    @classmethod
-    async def get_by_token(cls, token) -> Optional["Users"]:
-        async with async_session() as session:
-            result = await session.execute(
-                select(Users).where(Users.api_key == token)
-            )
-
-            user = result.unique().scalars().one_or_none()
-            return user
-
 
 followers = Table(
     "followers",
@@ -60,15 +63,16 @@ followers = Table(
     Column(
         "user_id",
         Integer,
-        ForeignKey(Users.id),
+        ForeignKey(Users.id, ondelete="CASCADE"),
         primary_key=True,
     ),
     Column(
         "follower_id",
         Integer,
-        ForeignKey(Users.id),
+        ForeignKey(Users.id, ondelete="CASCADE"),
         primary_key=True,
     ),
+    Index("ix_followers_follower_id_user_id", "follower_id", "user_id"),
 )
 
 
@@ -79,12 +83,15 @@ tweet_like = Table(
         "tweet_id",
         Integer,
         ForeignKey("tweet.id", ondelete="CASCADE"),
+        primary_key=True,
     ),
     Column(
         "user_id",
         Integer,
         ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
     ),
+    Index("ix_tweet_like_user_id", "user_id"),
 )
 
 
@@ -96,6 +103,15 @@ class Tweet(Base):
     )
 
     data = Column(String(500), nullable=False)
+    like_count = Column(Integer, nullable=False, default=0, server_default="0")
+    # default дублирует server_default: в SQLite колонка, добавленная
+    # upgrade_schema, остаётся без значения по умолчанию
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=func.now(),
+        server_default=func.now(),
+    )
     images = relationship(
         "Image",
         backref="tweets",
@@ -109,10 +125,86 @@ class Tweet(Base):
         "Users",
         secondary="tweet_like",
         backref="likes",
-        lazy="selectin",
+        lazy="raise",
+        passive_deletes=True,
     )
 
 
+# Материализованная домашняя лента: id твитов, разложенные по подписчикам
+# автора при публикации (fan-out on write)
+timeline = Table(
+    "timeline",
+    Base.metadata,
+    Column(
+        "user_id",
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column(
+        "tweet_id",
+        Integer,
+        ForeignKey("tweet.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Index("ix_timeline_tweet_id", "tweet_id"),
+)
+
+
+# Хэштеги и упоминания, извлечённые из текста при создании твита.
+# Первичный ключ (tag, tweet_id) сразу служит индексом для страниц
+# твитов по тегу
+tweet_tag = Table(
+    "tweet_tag",
+    Base.metadata,
+    Column("tag", String(100), primary_key=True),
+    Column(
+        "tweet_id",
+        Integer,
+        ForeignKey("tweet.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    # Окно трендов, в котором учтён твит
+    Column("bucket", Integer, nullable=False),
+    Index("ix_tweet_tag_tweet_id", "tweet_id"),
+)
+
+
+tweet_mention = Table(
+    "tweet_mention",
+    Base.metadata,
+    Column(
+        "user_id",
+        Integer,
+        ForeignKey("users.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Column(
+        "tweet_id",
+        Integer,
+        ForeignKey("tweet.id", ondelete="CASCADE"),
+        primary_key=True,
+    ),
+    Index("ix_tweet_mention_tweet_id", "tweet_id"),
+)
+
+
+# Число твитов с тегом за интервал времени. Тренды суммируют несколько
+# последних интервалов, а не пересчитывают tweet_tag
+tag_count = Table(
+    "tag_count",
+    Base.metadata,
+    Column("bucket", Integer, primary_key=True),
+    Column("tag", String(100), primary_key=True),
+    Column("count", Integer, nullable=False, default=0),
+)
+
+
+# Лента читается по (user_id, id DESC): страница берётся из индекса,
+# без сортировки всех твитов подписок
+Index("ix_tweet_user_id_id_desc", Tweet.user_id, Tweet.id.desc())
+
+
 class Image(Base):
     __tablename__ = "image"
 
@@ -121,3 +213,17 @@ class Image(Base):
     )
     image_name = Column(Uuid, nullable=False)
     tweet_id = Column(Integer, ForeignKey("tweet.id"))
+    # sha256 содержимого: по нему строится путь к файлу, одинаковые
+    # загрузки ссылаются на один файл. Пусто у картинок старого формата
+    content_hash = Column(String(64), nullable=True, index=True)
+    # Построенные производные: [{"width", "height", "format"}, ...]
+    variants = Column(JSON, nullable=True)
+    # Время загрузки: неприкреплённые картинки старше срока удаляются
+    # default дублирует server_default: в SQLite колонка, добавленная
+    # upgrade_schema, остаётся без значения по умолчанию
+    created_at = Column(
+        DateTime(timezone=True),
+        nullable=False,
+        default=func.now(),
+        server_default=func.now(),
+    )
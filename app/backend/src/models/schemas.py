@@ -1,6 +1,7 @@
 from typing import List, Optional
 
-from pydantic import BaseModel
+from backend.src.config_data.config import BATCH_MAX_SIZE
+from pydantic import BaseModel, Field
 
 
 class ReturnModel(BaseModel):
@@ -41,16 +42,91 @@ class UserModel(BaseModel):
     user: UserFollow
 
 
+class UserListModel(ReturnModel):
+    users: List["UserBase"]
+    next_cursor: Optional[int] = None
+
+
+class SuggestedUser(UserBase):
+    mutual_count: int
+
+
+class SuggestionsModel(ReturnModel):
+    users: List["SuggestedUser"]
+
+
+class MutualModel(ReturnModel):
+    count: int
+    users: List["UserBase"]
+
+
+class ImageVariantOut(BaseModel):
+    width: int
+    height: int
+    url: str
+
+
+class AttachmentOut(BaseModel):
+    url: str
+    variants: List["ImageVariantOut"] = []
+
+
 class TweetOut(BaseModel):
     id: int
     content: str
     attachments: Optional[List[str]]
+    media: List["AttachmentOut"] = []
     author: "UserBase"
+    like_count: int = 0
+    liked_by_me: bool = False
     likes: Optional[List["UserLike"]]
 
 
 class FeedModel(ReturnModel):
     tweets: Optional[List["TweetOut"]]
+    next_cursor: Optional[int] = None
+
+
+class SearchModel(ReturnModel):
+    tweets: List["TweetOut"]
+    next_cursor: Optional[str] = None
+
+
+class TagCount(BaseModel):
+    tag: str
+    count: int
+
+
+class TrendingModel(ReturnModel):
+    tags: List[TagCount]
+
+
+class TweetBatchModel(ReturnModel):
+    tweets: List["TweetOut"]
+    missing: List[int]
+
+
+class LikesBatchModel(BaseModel):
+    tweet_ids: List[int] = Field(min_length=1, max_length=BATCH_MAX_SIZE)
+
+
+class FollowBatchModel(BaseModel):
+    user_ids: List[int] = Field(min_length=1, max_length=BATCH_MAX_SIZE)
+
+
+class BatchItemResult(BaseModel):
+    id: int
+    result: bool
+    msg: Optional[str] = None
+
+
+class BatchResultModel(ReturnModel):
+    items: List["BatchItemResult"]
+
+
+class TweetLikesModel(ReturnModel):
+    likes: List["UserLike"]
+    next_cursor: Optional[int] = None
 
 
 class ErrorModel(ReturnModel):
@@ -1,12 +1,27 @@
-import os
+import time
 import uuid
 
-from backend.src.config_data.config import IMAGE_SAVE_PATH
+from backend.src.config_data.config import MAX_UPLOAD_SIZE, UPLOAD_CHUNK_SIZE
 from backend.src.database.database import async_session
-from backend.src.database.utils import add_image
+from backend.src.database.utils import (
+    add_image,
+    get_variants_by_hash,
+    set_image_variants,
+)
+from backend.src.dependencies import get_session
 from backend.src.models.models import Image
-from backend.src.models.schemas import MediaModel
-from fastapi import APIRouter, UploadFile
+from backend.src.models.schemas import MediaModel, ReturnModelWithMsg
+from backend.src.services.images import pipeline_enabled, process_image
+from backend.src.services.storage import remove_files, store_upload
+from backend.src.services.uploads import (
+    UploadTooLarge,
+    observe_upload,
+    too_large_response,
+    upload_requests,
+)
+from fastapi import APIRouter, BackgroundTasks, Depends, UploadFile
+from fastapi.concurrency import run_in_threadpool
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(
     prefix="/api/medias",
@@ -15,19 +30,71 @@ router = APIRouter(
 )
 
 
-@router.post("/", response_model=MediaModel)
-async def load_media(file: UploadFile):
+def _too_large():
+    return too_large_response(MAX_UPLOAD_SIZE)
+
+
+async def _build_image_variants(image_id: int, path: str):
+    """
+    Построение производных картинки после ответа на загрузку
+    :param image_id: Id картинки
+    :param path: Путь к оригиналу
+    :return: None
+    """
+    variants = await process_image(path)
+    async with async_session() as session:
+        await set_image_variants(session, image_id, variants or [])
+
+
+@router.post("/", response_model=MediaModel | ReturnModelWithMsg)
+async def load_media(
+    file: UploadFile,
+    background_tasks: BackgroundTasks,
+    session: AsyncSession = Depends(get_session),
+):
     """
-    Route сохранения картинки
+    Route сохранения картинки. Файл копируется на диск частями в пуле
+    потоков и сохраняется под именем по хэшу содержимого: повторная
+    загрузка тех же байт ссылается на уже сохранённый файл. Запись в бд
+    создаётся только после того, как файл записан. Производные картинки
+    строятся в пуле процессов после ответа
     :param file: Файл картинки
+    :param background_tasks:
+    :param session: Сессия запроса
     :return:
     """
-    uuid_name = uuid.uuid4()
-    file.filename = f"{uuid_name}.jpg"
-    content = await file.read()
-    new_image: Image = Image(image_name=uuid_name)
-    await add_image(async_session, new_image)
-    with open(os.path.join(IMAGE_SAVE_PATH, file.filename), "wb") as f:
-        f.write(content)
+    started = time.perf_counter()
+    if file.size is not None and file.size > MAX_UPLOAD_SIZE:
+        return _too_large()
+
+    try:
+        stored = await run_in_threadpool(
+            store_upload, file.file, MAX_UPLOAD_SIZE, UPLOAD_CHUNK_SIZE
+        )
+    except UploadTooLarge:
+        return _too_large()
+
+    variants = None
+    if not stored.created:
+        variants = await get_variants_by_hash(session, stored.content_hash)
+    new_image: Image = Image(
+        image_name=uuid.uuid4(),
+        content_hash=stored.content_hash,
+        variants=variants,
+    )
+    try:
+        await add_image(session, new_image)
+    except Exception:
+        upload_requests.inc(result="error")
+        if stored.created:
+            await run_in_threadpool(
+                remove_files, [stored.content_hash], grace=0
+            )
+        raise
+    observe_upload(stored.size, started)
+    if variants is None and pipeline_enabled():
+        background_tasks.add_task(
+            _build_image_variants, new_image.id, stored.path
+        )
 
     return {"result": True, "media_id": new_image.id}
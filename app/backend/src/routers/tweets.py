@@ -1,26 +1,78 @@
-from backend.src.config_data.config import IMAGE_PATH, IMAGE_TYPE
-from backend.src.database.database import async_session
+from typing import Dict, List, Literal, Optional, Set
+
+from backend.src.config_data.config import (
+    BATCH_MAX_SIZE,
+    FEED_MAX_LIMIT,
+    LIKES_MAX_LIMIT,
+    SEARCH_PAGE_SIZE,
+    TOP_FEED_PAGE_SIZE,
+    TRENDING_LIMIT,
+)
+from backend.src.database.cached import (
+    get_like_summaries,
+    get_tweet_cards,
+    get_user_summaries,
+)
+from backend.src.database.search import (
+    decode_search_cursor,
+    encode_search_cursor,
+    search_terms,
+    search_tweets,
+)
+from backend.src.database.topics import (
+    get_mention_tweet_ids,
+    get_tag_tweet_ids,
+    get_trending,
+    normalize_tag,
+)
 from backend.src.database.utils import (
     add_like,
+    add_likes,
     create_tweet,
     delete_like_db,
     delete_tweet_db,
-    get_tweet_without_user,
+    get_existing_tweet_ids,
+    get_feed_page,
+    get_liked_tweet_ids,
+    get_top_feed_tweet_ids,
+    get_tweet_likes,
+    get_tweet_stamps,
     get_tweet_without_user_and_likes,
-    get_tweets,
+    like_queue,
+    queued_like_changes,
+    with_queued_likes,
+)
+from backend.src.dependencies import (
+    get_read_session,
+    get_session,
+    token_required,
 )
-from backend.src.dependencies import token_required
-from backend.src.models.models import Users
 from backend.src.models.schemas import (
+    BatchResultModel,
     ErrorModel,
     FeedModel,
+    LikesBatchModel,
     ReturnModel,
     ReturnModelWithMsg,
+    SearchModel,
+    TrendingModel,
+    TweetBatchModel,
+    TweetLikesModel,
     TweetModel,
     TweetResult,
 )
-from fastapi import APIRouter, Depends, Request
-from fastapi.responses import JSONResponse
+from backend.src.services.auth_cache import Principal
+from backend.src.services.conditional import (
+    conditional_response,
+    make_etag,
+)
+from backend.src.services.events import event_hub, event_stream
+from backend.src.services.serialization import fast_response
+from backend.src.services.storage import remove_files
+from fastapi import APIRouter, Depends, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import JSONResponse, StreamingResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(
     prefix="/api/tweets",
@@ -31,17 +83,22 @@ router = APIRouter(
 
 
 @router.post("/", response_model=ReturnModelWithMsg | TweetResult)
-async def add_tweet(tweet: TweetModel, request: Request):
+async def add_tweet(
+    tweet: TweetModel,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+):
     """
     Route создания твита
     :param tweet: json для создания твита
     :param request:
+    :param session: Сессия запроса
     :return:
     """
-    user: Users = request.state.current_user
+    user: Principal = request.state.current_user
     tweet_data = tweet.model_dump()
     new_tweet_id = await create_tweet(
-        async_session,
+        session,
         tweet_data["tweet_data"],
         user.id,
         tweet_data["tweet_media_ids"],
@@ -59,22 +116,29 @@ async def add_tweet(tweet: TweetModel, request: Request):
 
 
 @router.delete("/{tweet_id}", response_model=ReturnModelWithMsg | ReturnModel)
-async def delete_tweet(tweet_id: int, request: Request):
+async def delete_tweet(
+    tweet_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+):
     """
     Route удаления твита
     :param tweet_id: Id твита
     :param request:
+    :param session: Сессия запроса
     :return:
     """
-    user: Users = request.state.current_user
-    tweet = await get_tweet_without_user_and_likes(async_session, tweet_id)
+    user: Principal = request.state.current_user
+    tweet = await get_tweet_without_user_and_likes(session, tweet_id)
     if tweet:
         if tweet.user_id != user.id:
             return JSONResponse(
                 status_code=403,
                 content={"result": False, "msg": "This user is not author"},
             )
-        await delete_tweet_db(async_session, tweet)
+        unreferenced = await delete_tweet_db(session, tweet)
+        if unreferenced:
+            await run_in_threadpool(remove_files, unreferenced)
         return {"result": True}
     return JSONResponse(
         status_code=404,
@@ -82,30 +146,65 @@ async def delete_tweet(tweet_id: int, request: Request):
     )
 
 
+@router.post("/likes", response_model=BatchResultModel)
+async def like_tweets(
+    batch: LikesBatchModel,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Route добавления лайков к нескольким твитам одним запросом
+    :param batch: json со списком ids твитов
+    :param request:
+    :param session: Сессия запроса
+    :return: Результат для каждого твита
+    """
+    user: Principal = request.state.current_user
+    tweet_ids = list(dict.fromkeys(batch.tweet_ids))
+    added = set(await add_likes(session, user.id, tweet_ids))
+    existing = await get_existing_tweet_ids(
+        session, [tweet_id for tweet_id in tweet_ids if tweet_id not in added]
+    )
+    items = []
+    for tweet_id in tweet_ids:
+        if tweet_id in added:
+            items.append({"id": tweet_id, "result": True})
+            continue
+        if tweet_id in existing:
+            msg = "This tweet is already liked"
+        else:
+            msg = "This tweet doesn't exist"
+        items.append({"id": tweet_id, "result": False, "msg": msg})
+    return {"result": True, "items": items}
+
+
 @router.post(
     "/{tweet_id}/likes", response_model=ReturnModelWithMsg | ReturnModel
 )
-async def to_like_a_tweet(tweet_id: int, request: Request):
+async def to_like_a_tweet(
+    tweet_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+):
     """
     Route добавления лайка
     :param tweet_id: Id твита
     :param request:
+    :param session: Сессия запроса
     :return:
     """
-    user: Users = request.state.current_user
-    tweet = await get_tweet_without_user(async_session, tweet_id)
-
-    if tweet:
-        if user.id in [like.id for like in tweet.likes]:
-            return JSONResponse(
-                status_code=404,
-                content={
-                    "result": False,
-                    "msg": "This tweet is already liked",
-                },
-            )
-        await add_like(async_session, user.id, tweet.id)
+    user: Principal = request.state.current_user
+    if await add_like(session, user.id, tweet_id):
         return {"result": True}
+
+    if await get_tweet_without_user_and_likes(session, tweet_id):
+        return JSONResponse(
+            status_code=404,
+            content={
+                "result": False,
+                "msg": "This tweet is already liked",
+            },
+        )
     return JSONResponse(
         status_code=404,
         content={"result": False, "msg": "This tweet doesn't exist"},
@@ -115,69 +214,348 @@ async def to_like_a_tweet(tweet_id: int, request: Request):
 @router.delete(
     "/{tweet_id}/likes", response_model=ReturnModelWithMsg | ReturnModel
 )
-async def delete_like(tweet_id: int, request: Request):
+async def delete_like(
+    tweet_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+):
     """
     Route удаления лайка
     :param tweet_id: Id твита
     :param request:
+    :param session: Сессия запроса
     :return:
     """
-    user: Users = request.state.current_user
-    tweet = await get_tweet_without_user(async_session, tweet_id)
-
-    if tweet:
-        if user.id not in [user_like.id for user_like in tweet.likes]:
-            return JSONResponse(
-                status_code=404,
-                content={
-                    "result": False,
-                    "msg": "This tweet is not liked",
-                },
-            )
-        await delete_like_db(async_session, user.id, tweet.id)
+    user: Principal = request.state.current_user
+    if await delete_like_db(session, user.id, tweet_id):
         return {"result": True}
+
+    if await get_tweet_without_user_and_likes(session, tweet_id):
+        return JSONResponse(
+            status_code=404,
+            content={
+                "result": False,
+                "msg": "This tweet is not liked",
+            },
+        )
     return JSONResponse(
         status_code=404,
         content={"result": False, "msg": "This tweet doesn't exist"},
     )
 
 
-@router.get("/", response_model=FeedModel | ErrorModel)
-async def get_tweet_feed(request: Request):
+@router.get(
+    "/{tweet_id}/likes", response_model=ReturnModelWithMsg | TweetLikesModel
+)
+async def get_likes(
+    tweet_id: int,
+    limit: int = Query(LIKES_MAX_LIMIT, ge=1, le=LIKES_MAX_LIMIT),
+    after_id: Optional[int] = None,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route получения лайкнувших твит
+    :param tweet_id: Id твита
+    :param limit: Размер страницы
+    :param after_id: Курсор (next_cursor предыдущей страницы)
+    :param session: Сессия запроса
+    :return:
     """
-    Route получения ленты твитов пользователя
+    users = await get_tweet_likes(session, tweet_id, limit, after_id)
+    if users is None:
+        return JSONResponse(
+            status_code=404,
+            content={"result": False, "msg": "This tweet doesn't exist"},
+        )
+    return {
+        "result": True,
+        "likes": [{"user_id": u.id, "name": u.nickname} for u in users],
+        "next_cursor": users[-1].id if len(users) == limit else None,
+    }
+
+
+@router.get("/search", response_model=ReturnModelWithMsg | SearchModel)
+async def search(
+    request: Request,
+    q: str = Query(min_length=1, max_length=500),
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=FEED_MAX_LIMIT),
+    cursor: Optional[str] = None,
+    author_id: Optional[int] = None,
+    following: bool = False,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route полнотекстового поиска твитов. Находятся твиты со всеми словами
+    запроса, самые релевантные первыми
     :param request:
+    :param q: Строка поиска
+    :param limit: Размер страницы
+    :param cursor: Курсор (next_cursor предыдущей страницы)
+    :param author_id: Искать только среди твитов этого автора
+    :param following: Искать только среди твитов тех, на кого подписан
+    пользователь
+    :param session: Сессия запроса
     :return:
     """
-    try:
-        user: Users = request.state.current_user
-        user_tweets = await get_tweets(async_session, user)
+    after = None
+    if cursor is not None:
+        try:
+            after = decode_search_cursor(cursor)
+        except ValueError:
+            return JSONResponse(
+                status_code=400,
+                content={"result": False, "msg": "Invalid cursor"},
+            )
+    user: Principal = request.state.current_user
+    found = await search_tweets(
+        session,
+        search_terms(q),
+        limit,
+        after,
+        author_id=author_id,
+        follower_id=user.id if following else None,
+    )
+    tweets = await _tweet_payloads(session, [i for i, _ in found], user.id)
+    next_cursor = None
+    if len(found) == limit:
+        next_cursor = encode_search_cursor(found[-1][1], found[-1][0])
+    return fast_response(
+        {"result": True, "tweets": tweets, "next_cursor": next_cursor}
+    )
 
-        return {
-            "result": True,
-            "tweets": [
+
+@router.get("/tags/{tag}", response_model=FeedModel)
+async def get_tag_tweets(
+    request: Request,
+    tag: str,
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=FEED_MAX_LIMIT),
+    before_id: Optional[int] = None,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route получения твитов с хэштегом, от новых к старым
+    :param request:
+    :param tag: Тег, с символом # или без
+    :param limit: Размер страницы
+    :param before_id: Курсор (next_cursor предыдущей страницы)
+    :param session: Сессия запроса
+    :return:
+    """
+    user: Principal = request.state.current_user
+    tweet_ids = await get_tag_tweet_ids(
+        session, normalize_tag(tag), limit, before_id
+    )
+    return await _page_response(session, tweet_ids, limit, user.id)
+
+
+@router.get("/mentions", response_model=FeedModel)
+async def get_mentions(
+    request: Request,
+    limit: int = Query(SEARCH_PAGE_SIZE, ge=1, le=FEED_MAX_LIMIT),
+    before_id: Optional[int] = None,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route получения твитов, в которых упомянут пользователь
+    :param request:
+    :param limit: Размер страницы
+    :param before_id: Курсор (next_cursor предыдущей страницы)
+    :param session: Сессия запроса
+    :return:
+    """
+    user: Principal = request.state.current_user
+    tweet_ids = await get_mention_tweet_ids(session, user.id, limit, before_id)
+    return await _page_response(session, tweet_ids, limit, user.id)
+
+
+@router.get("/trending", response_model=TrendingModel)
+async def trending(
+    limit: int = Query(TRENDING_LIMIT, ge=1, le=FEED_MAX_LIMIT),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route получения самых популярных хэштегов за последнее время
+    :param limit: Число тегов
+    :param session: Сессия запроса
+    :return:
+    """
+    tags = await get_trending(session, limit)
+    return {
+        "result": True,
+        "tags": [{"tag": tag, "count": count} for tag, count in tags],
+    }
+
+
+@router.get("/stream", response_class=StreamingResponse)
+async def stream_feed(
+    request: Request,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route потоковой ленты (Server-Sent Events): новые и удалённые твиты и
+    изменения числа лайков у авторов, на которых подписан пользователь.
+    По событию reset клиент должен перечитать ленту целиком
+    :param request:
+    :param session: Сессия запроса
+    :return:
+    """
+    user: Principal = request.state.current_user
+    # Соединение живёт долго: сессия, открытая для авторизации, не должна
+    # держать соединение с бд всё это время
+    await session.close()
+    subscriber = await event_hub.subscribe(user.id, user.following_ids)
+    return StreamingResponse(
+        event_stream(event_hub, subscriber),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _tweet_payloads(
+    session: AsyncSession,
+    tweet_ids: List[int],
+    viewer_id: int,
+    liked: Optional[Set[int]] = None,
+    likes: Optional[Dict[int, Dict]] = None,
+):
+    """
+    Формирование твитов для ответа из кэша в порядке ids.
+    Несуществующие твиты пропускаются. В likes - только первые
+    лайкнувшие, поэтому лайк самого пользователя передаётся отдельно
+    в liked_by_me
+    :param session: Сессия запроса
+    :param tweet_ids: Ids твитов
+    :param viewer_id: Id пользователя, запросившего твиты
+    :param liked: Ids лайкнутых им твитов, если уже прочитаны из бд
+    :param likes: Лайки твитов, если уже получены get_like_summaries
+    :return: Список твитов
+    """
+    cards = await get_tweet_cards(session, tweet_ids)
+    tweet_ids = [tweet_id for tweet_id in tweet_ids if tweet_id in cards]
+    authors = await get_user_summaries(
+        session, [cards[tweet_id]["user_id"] for tweet_id in tweet_ids]
+    )
+    if likes is None:
+        likes = await get_like_summaries(session, tweet_ids)
+    if liked is None:
+        liked = await get_liked_tweet_ids(session, viewer_id, tweet_ids)
+    else:
+        liked = with_queued_likes(viewer_id, tweet_ids, liked)
+    return [
+        {
+            "id": tweet_id,
+            "content": cards[tweet_id]["content"],
+            "attachments": cards[tweet_id]["attachments"],
+            "media": cards[tweet_id]["media"],
+            "author": authors[cards[tweet_id]["user_id"]],
+            "like_count": likes[tweet_id]["count"],
+            "liked_by_me": tweet_id in liked,
+            "likes": likes[tweet_id]["preview"],
+        }
+        for tweet_id in tweet_ids
+    ]
+
+
+async def _page_response(
+    session: AsyncSession, tweet_ids: List[int], limit: int, viewer_id: int
+):
+    """
+    Ответ со страницей твитов и курсором следующей страницы
+    :param session: Сессия запроса
+    :param tweet_ids: Ids твитов страницы
+    :param limit: Размер страницы
+    :param viewer_id: Id пользователя, запросившего твиты
+    :return:
+    """
+    tweets = await _tweet_payloads(session, tweet_ids, viewer_id)
+    next_cursor = tweet_ids[-1] if len(tweet_ids) == limit else None
+    return fast_response(
+        {"result": True, "tweets": tweets, "next_cursor": next_cursor}
+    )
+
+
+@router.get("/", response_model=TweetBatchModel | FeedModel | ErrorModel)
+async def get_tweet_feed(
+    request: Request,
+    response: Response,
+    limit: Optional[int] = Query(None, ge=1, le=FEED_MAX_LIMIT),
+    before_id: Optional[int] = None,
+    ids: Optional[List[int]] = Query(None, max_length=BATCH_MAX_SIZE),
+    mode: Literal["latest", "top"] = "latest",
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route получения ленты твитов пользователя. Если версия ленты не
+    изменилась с указанной в If-None-Match, отдаётся 304 без загрузки
+    твитов. С параметром ids вместо ленты возвращаются твиты с этими ids.
+    В режиме top возвращаются лучшие по оценке твиты из последних,
+    без курсора
+    :param request:
+    :param response:
+    :param limit: Размер страницы. Без него возвращается вся лента
+    :param before_id: Курсор (next_cursor предыдущей страницы)
+    :param ids: Ids твитов (?ids=1&ids=2)
+    :param mode: Порядок ленты: latest (от новых к старым) или top
+    :param session: Сессия запроса
+    :return:
+    """
+    user: Principal = request.state.current_user
+    try:
+        if ids is not None:
+            tweet_ids = list(dict.fromkeys(ids))
+            tweets = await _tweet_payloads(session, tweet_ids, user.id)
+            found = {tweet["id"] for tweet in tweets}
+            return fast_response(
                 {
-                    "id": tweet.id,
-                    "content": tweet.data,
-                    "attachments": [
-                        f"{IMAGE_PATH}{image.image_name}{IMAGE_TYPE}"
-                        for image in tweet.images
-                    ],
-                    "author": {
-                        "id": tweet.user_id,
-                        "name": tweet.user.nickname,
-                    },
-                    "likes": [
-                        {
-                            "user_id": u.id,
-                            "name": u.nickname,
-                        }
-                        for u in tweet.likes
-                    ],
+                    "result": True,
+                    "tweets": tweets,
+                    "missing": [i for i in tweet_ids if i not in found],
                 }
-                for tweet in user_tweets
-            ],
-        }
+            )
+        if mode == "top":
+            page = await get_tweet_stamps(
+                session,
+                user.id,
+                await get_top_feed_tweet_ids(
+                    session, user.id, limit or TOP_FEED_PAGE_SIZE
+                ),
+            )
+        else:
+            page = await get_feed_page(session, user.id, limit, before_id)
+        tweet_ids = [row[0] for row in page]
+        # Число лайков берётся из строк страницы, а первые лайкнувшие из
+        # кэша входят в ETag: ответ не расходится со своим ETag, даже
+        # если кэш воркера отстал
+        likes = await get_like_summaries(
+            session, tweet_ids, {row[0]: row[1] for row in page}
+        )
+        preview = [
+            [item["user_id"] for item in likes[tweet_id]["preview"]]
+            for tweet_id in tweet_ids
+            if tweet_id in likes
+        ]
+        parts = ["feed", user.id, mode, limit, before_id, page, preview]
+        if like_queue.enabled:
+            # Лайки из очереди ещё не изменили число лайков в бд
+            parts.append(queued_like_changes(tweet_ids))
+        etag = make_etag(*parts)
+        not_modified = conditional_response(request, response, etag)
+        if not_modified is not None:
+            return not_modified
+        liked = {row[0] for row in page if row[3]}
+        tweets = await _tweet_payloads(
+            session, tweet_ids, user.id, liked, likes
+        )
+        next_cursor = None
+        # По строкам страницы: твит, удалённый после их чтения, не
+        # обрывает пагинацию
+        if mode == "latest" and limit is not None and len(page) == limit:
+            next_cursor = page[-1][0]
+
+        return fast_response(
+            {"result": True, "tweets": tweets, "next_cursor": next_cursor},
+            response,
+        )
 
     except Exception as error:
         return {
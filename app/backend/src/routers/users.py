@@ -1,19 +1,49 @@
-from backend.src.database.database import async_session
+from typing import Optional
+
+from backend.src.config_data.config import (
+    FOLLOWS_MAX_LIMIT,
+    MUTUAL_SAMPLE_SIZE,
+    PROFILE_FOLLOWS_LIMIT,
+    SUGGESTIONS_LIMIT,
+    SUGGESTIONS_MAX_LIMIT,
+)
+from backend.src.database.graph import ensure_follow_graph, get_user_names
 from backend.src.database.utils import (
     follow_user_db,
+    follow_users_db,
+    get_existing_user_ids,
+    get_follow_list,
     get_following_user,
-    get_user,
+    get_profile_version,
+    get_user_profile,
     remove_follow_db,
 )
-from backend.src.dependencies import token_required
+from backend.src.dependencies import (
+    get_read_session,
+    get_session,
+    token_required,
+)
 from backend.src.models.models import Users
 from backend.src.models.schemas import (
+    BatchResultModel,
+    FollowBatchModel,
+    MutualModel,
     ReturnModel,
     ReturnModelWithMsg,
+    SuggestionsModel,
+    UserListModel,
     UserModel,
 )
-from fastapi import APIRouter, Depends, Request
+from backend.src.services.auth_cache import Principal
+from backend.src.services.conditional import (
+    conditional_response,
+    make_etag,
+)
+from backend.src.services.graph import follow_graph
+from backend.src.services.serialization import fast_response
+from fastapi import APIRouter, Depends, Query, Request, Response
 from fastapi.responses import JSONResponse
+from sqlalchemy.ext.asyncio import AsyncSession
 
 router = APIRouter(
     prefix="/api/users",
@@ -23,38 +53,72 @@ router = APIRouter(
 )
 
 
+@router.post("/follow", response_model=BatchResultModel)
+async def follow_users(
+    batch: FollowBatchModel,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+):
+    """
+    Route подписки на нескольких пользователей одним запросом
+    :param batch: json со списком ids пользователей
+    :param request:
+    :param session: Сессия запроса
+    :return: Результат для каждого пользователя
+    """
+    current_user: Principal = request.state.current_user
+    user_ids = list(dict.fromkeys(batch.user_ids))
+    added = set(await follow_users_db(session, current_user.id, user_ids))
+    existing = await get_existing_user_ids(
+        session, [user_id for user_id in user_ids if user_id not in added]
+    )
+    items = []
+    for user_id in user_ids:
+        if user_id in added:
+            items.append({"id": user_id, "result": True})
+            continue
+        if user_id == current_user.id:
+            msg = "Cannot follow yourself"
+        elif user_id in existing:
+            msg = "This user is already followed"
+        else:
+            msg = "This user doesn't exist"
+        items.append({"id": user_id, "result": False, "msg": msg})
+    return {"result": True, "items": items}
+
+
 @router.post(
     "/{user_id}/follow", response_model=ReturnModelWithMsg | ReturnModel
 )
-async def follow_user(user_id: int, request: Request):
+async def follow_user(
+    user_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+):
     """
     Route добавления подписки к пользователю
     :param user_id: Id твита
     :param request:
+    :param session: Сессия запроса
     :return:
     """
-    current_user: Users = request.state.current_user
-    following_user = await get_following_user(async_session, user_id)
-
-    if following_user:
-        if following_user.id in [
-            follower.id for follower in current_user.followed
-        ]:
-            return JSONResponse(
-                status_code=404,
-                content={
-                    "result": False,
-                    "msg": "This user is already followed",
-                },
-            )
-        elif current_user.id == following_user.id:
-            return JSONResponse(
-                status_code=403,
-                content={"result": False, "msg": "Cannot follow yourself"},
-            )
-        await follow_user_db(async_session, current_user.id, user_id)
+    current_user: Principal = request.state.current_user
+    if current_user.id == user_id:
+        return JSONResponse(
+            status_code=403,
+            content={"result": False, "msg": "Cannot follow yourself"},
+        )
+    if await follow_user_db(session, current_user.id, user_id):
         return {"result": True}
 
+    if await get_following_user(session, user_id):
+        return JSONResponse(
+            status_code=404,
+            content={
+                "result": False,
+                "msg": "This user is already followed",
+            },
+        )
     return JSONResponse(
         status_code=404,
         content={"result": False, "msg": "This user doesn't exist"},
@@ -64,84 +128,303 @@ async def follow_user(user_id: int, request: Request):
 @router.delete(
     "/{user_id}/follow", response_model=ReturnModelWithMsg | ReturnModel
 )
-async def remove_follow(user_id: int, request: Request):
+async def remove_follow(
+    user_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_session),
+):
     """
     Route удаления подписки с пользователя
     :param user_id: Id пользователя
     :param request:
+    :param session: Сессия запроса
     :return:
     """
-    current_user: Users = request.state.current_user
-    following_user = await get_following_user(async_session, user_id)
-
-    if following_user:
-        if following_user.id not in [
-            follower.id for follower in current_user.followed
-        ]:
-            return JSONResponse(
-                status_code=403,
-                content={"result": False, "msg": "This user is not followed"},
-            )
-
-        await remove_follow_db(async_session, current_user.id, user_id)
+    current_user: Principal = request.state.current_user
+    if await remove_follow_db(session, current_user.id, user_id):
         return {"result": True}
 
+    if await get_following_user(session, user_id):
+        return JSONResponse(
+            status_code=403,
+            content={"result": False, "msg": "This user is not followed"},
+        )
     return JSONResponse(
         status_code=404,
         content={"result": False, "msg": "This user doesn't exist"},
     )
 
 
-@router.get("/me", response_model=UserModel)
-async def get_current_user(request: Request):
+def _profile_payload(user: Users, user_followers, user_following):
     """
-    Route получения залогиненного пользователя
-    :param request:
+    Формирование ответа с профилем пользователя
+    :param user: Объект модели Users
+    :param user_followers: Первые подписчики пользователя
+    :param user_following: Первые подписки пользователя
     :return:
     """
-    current_user: Users = request.state.current_user
     return {
         "result": True,
         "user": {
-            "id": current_user.id,
-            "name": current_user.nickname,
+            "id": user.id,
+            "name": user.nickname,
             "followers": [
                 {"id": follower.id, "name": follower.nickname}
-                for follower in current_user.followers
+                for follower in user_followers
             ],
             "following": [
                 {"id": follower.id, "name": follower.nickname}
-                for follower in current_user.followed
+                for follower in user_following
             ],
         },
     }
 
 
+async def _follow_list_response(
+    session: AsyncSession,
+    user_id: int,
+    limit: int,
+    after_id: Optional[int],
+    followers_of: bool,
+):
+    """
+    Формирование страницы подписчиков или подписок пользователя
+    :param session: Сессия запроса
+    :param user_id: Id пользователя
+    :param limit: Размер страницы
+    :param after_id: Курсор (next_cursor предыдущей страницы)
+    :param followers_of: True - подписчики, False - подписки
+    :return:
+    """
+    users = await get_follow_list(
+        session, user_id, limit, after_id, followers_of
+    )
+    if users is None:
+        return JSONResponse(
+            status_code=404,
+            content={"result": False, "msg": "This user doesn't exist"},
+        )
+    return {
+        "result": True,
+        "users": [{"id": user.id, "name": user.nickname} for user in users],
+        "next_cursor": users[-1].id if len(users) == limit else None,
+    }
+
+
+@router.get("/me", response_model=ReturnModelWithMsg | UserModel)
+async def get_current_user(
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route получения залогиненного пользователя. Если версия профиля не
+    изменилась с указанной в If-None-Match, отдаётся 304 без загрузки
+    подписчиков
+    :param request:
+    :param response:
+    :param session: Сессия запроса
+    :return:
+    """
+    principal: Principal = request.state.current_user
+    version = await get_profile_version(session, principal.id)
+    if version is not None:
+        etag = make_etag("profile", principal.id, version)
+        not_modified = conditional_response(request, response, etag)
+        if not_modified is not None:
+            return not_modified
+    profile = await get_user_profile(
+        session, principal.id, PROFILE_FOLLOWS_LIMIT
+    )
+    if profile:
+        return fast_response(_profile_payload(*profile), response)
+    # Пользователь удалён, а ключ ещё в кэше авторизации
+    return JSONResponse(
+        status_code=404,
+        content={"result": False, "msg": "This user doesn't exist"},
+    )
+
+
+@router.get("/me/followers", response_model=UserListModel)
+async def get_current_user_followers(
+    request: Request,
+    limit: int = Query(FOLLOWS_MAX_LIMIT, ge=1, le=FOLLOWS_MAX_LIMIT),
+    after_id: Optional[int] = None,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route получения подписчиков залогиненного пользователя
+    :param request:
+    :param limit: Размер страницы
+    :param after_id: Курсор (next_cursor предыдущей страницы)
+    :param session: Сессия запроса
+    :return:
+    """
+    principal: Principal = request.state.current_user
+    return await _follow_list_response(
+        session, principal.id, limit, after_id, True
+    )
+
+
+@router.get("/me/following", response_model=UserListModel)
+async def get_current_user_following(
+    request: Request,
+    limit: int = Query(FOLLOWS_MAX_LIMIT, ge=1, le=FOLLOWS_MAX_LIMIT),
+    after_id: Optional[int] = None,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route получения подписок залогиненного пользователя
+    :param request:
+    :param limit: Размер страницы
+    :param after_id: Курсор (next_cursor предыдущей страницы)
+    :param session: Сессия запроса
+    :return:
+    """
+    principal: Principal = request.state.current_user
+    return await _follow_list_response(
+        session, principal.id, limit, after_id, False
+    )
+
+
+@router.get("/me/suggestions", response_model=SuggestionsModel)
+async def get_suggestions(
+    request: Request,
+    limit: int = Query(SUGGESTIONS_LIMIT, ge=1, le=SUGGESTIONS_MAX_LIMIT),
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route рекомендаций, на кого подписаться: пользователи, на которых
+    подписаны те, на кого подписан залогиненный пользователь. Считается
+    по графу подписок в памяти, из бд читаются только никнеймы
+    :param request:
+    :param limit: Число пользователей
+    :param session: Сессия запроса
+    :return:
+    """
+    principal: Principal = request.state.current_user
+    await ensure_follow_graph()
+    suggestions = follow_graph.suggestions(principal.id, limit)
+    names = await get_user_names(
+        session, [user_id for user_id, _ in suggestions]
+    )
+    return {
+        "result": True,
+        "users": [
+            {"id": user_id, "name": names[user_id], "mutual_count": count}
+            for user_id, count in suggestions
+            if user_id in names
+        ],
+    }
+
+
 @router.get("/{user_id}", response_model=ReturnModelWithMsg | UserModel)
-async def get_user_by_id(user_id: int):
+async def get_user_by_id(
+    user_id: int,
+    request: Request,
+    response: Response,
+    session: AsyncSession = Depends(get_read_session),
+):
     """
     Route получения пользователя по id
     :param user_id: Id пользователя
+    :param request:
+    :param response:
+    :param session: Сессия запроса
     :return:
     """
-    user = await get_user(async_session, user_id)
-    if user:
-        return {
-            "result": True,
-            "user": {
-                "id": user.id,
-                "name": user.nickname,
-                "followers": [
-                    {"id": follower.id, "name": follower.nickname}
-                    for follower in user.followers
-                ],
-                "following": [
-                    {"id": follower.id, "name": follower.nickname}
-                    for follower in user.followed
-                ],
-            },
-        }
+    version = await get_profile_version(session, user_id)
+    if version is not None:
+        etag = make_etag("profile", user_id, version)
+        not_modified = conditional_response(request, response, etag)
+        if not_modified is not None:
+            return not_modified
+    profile = await get_user_profile(session, user_id, PROFILE_FOLLOWS_LIMIT)
+    if profile:
+        return fast_response(_profile_payload(*profile), response)
     return JSONResponse(
         status_code=404,
         content={"result": False, "msg": "This user doesn't exist"},
     )
+
+
+@router.get(
+    "/{user_id}/mutual",
+    response_model=ReturnModelWithMsg | MutualModel,
+)
+async def get_mutual(
+    user_id: int,
+    request: Request,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route получения общих подписок: кто из тех, на кого подписан
+    залогиненный пользователь, подписан на пользователя user_id
+    :param user_id: Id пользователя
+    :param request:
+    :param session: Сессия запроса
+    :return: Число общих подписок и первые из них
+    """
+    principal: Principal = request.state.current_user
+    await ensure_follow_graph()
+    mutual = follow_graph.mutual(principal.id, user_id)
+    sample = mutual[:MUTUAL_SAMPLE_SIZE]
+    names = await get_user_names(session, [user_id, *sample])
+    if user_id not in names:
+        return JSONResponse(
+            status_code=404,
+            content={"result": False, "msg": "This user doesn't exist"},
+        )
+    return {
+        "result": True,
+        "count": len(mutual),
+        "users": [
+            {"id": friend, "name": names[friend]}
+            for friend in sample
+            if friend in names
+        ],
+    }
+
+
+@router.get(
+    "/{user_id}/followers",
+    response_model=ReturnModelWithMsg | UserListModel,
+)
+async def get_user_followers(
+    user_id: int,
+    limit: int = Query(FOLLOWS_MAX_LIMIT, ge=1, le=FOLLOWS_MAX_LIMIT),
+    after_id: Optional[int] = None,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route получения подписчиков пользователя
+    :param user_id: Id пользователя
+    :param limit: Размер страницы
+    :param after_id: Курсор (next_cursor предыдущей страницы)
+    :param session: Сессия запроса
+    :return:
+    """
+    return await _follow_list_response(session, user_id, limit, after_id, True)
+
+
+@router.get(
+    "/{user_id}/following",
+    response_model=ReturnModelWithMsg | UserListModel,
+)
+async def get_user_following(
+    user_id: int,
+    limit: int = Query(FOLLOWS_MAX_LIMIT, ge=1, le=FOLLOWS_MAX_LIMIT),
+    after_id: Optional[int] = None,
+    session: AsyncSession = Depends(get_read_session),
+):
+    """
+    Route получения подписок пользователя
+    :param user_id: Id пользователя
+    :param limit: Размер страницы
+    :param after_id: Курсор (next_cursor предыдущей страницы)
+    :param session: Сессия запроса
+    :return:
+    """
+    return await _follow_list_response(
+        session, user_id, limit, after_id, False
+    )
@@ -0,0 +1,69 @@
+from dataclasses import dataclass, field
+from typing import Dict, FrozenSet, Optional
+
+from backend.src.config_data.config import AUTH_CACHE_SIZE, AUTH_CACHE_TTL
+from backend.src.services.cache import TTLCache
+from backend.src.services.metrics import counter_func, gauge
+
+
+@dataclass(frozen=True)
+class Principal:
+    """
+    Облегчённое представление авторизованного пользователя
+    """
+
+    id: int
+    nickname: str
+    following_ids: FrozenSet[int] = field(default_factory=frozenset)
+
+
+class PrincipalCache:
+    """
+    Кэш api-key -> Principal. Сбрасывается при изменении подписок
+    пользователя, в остальном записи живут не дольше ttl секунд
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        self._cache = TTLCache(maxsize, ttl)
+        self._keys_by_user: Dict[int, str] = {}
+
+    def get(self, api_key: str) -> Optional[Principal]:
+        return self._cache.get(api_key)
+
+    def set(self, api_key: str, principal: Principal) -> None:
+        self._cache.set(api_key, principal)
+        self._keys_by_user[principal.id] = api_key
+        if len(self._keys_by_user) > 2 * max(self._cache.maxsize, 1):
+            self._keys_by_user = {
+                cached.id: key for key, cached in self._cache.items()
+            }
+
+    def invalidate_user(self, user_id: int) -> None:
+        api_key = self._keys_by_user.pop(user_id, None)
+        if api_key is not None:
+            self._cache.pop(api_key)
+
+    def clear(self) -> None:
+        self._cache.clear()
+        self._keys_by_user.clear()
+
+    def stats(self) -> Dict[str, Optional[int]]:
+        return self._cache.stats()
+
+
+auth_cache = PrincipalCache(AUTH_CACHE_SIZE, AUTH_CACHE_TTL)
+
+gauge(
+    "auth_cache_entries",
+    "Number of api-keys cached by token_required",
+    lambda: {(): auth_cache.stats()["size"]},
+)
+counter_func(
+    "auth_cache_requests_total",
+    "Lookups in the api-key cache by result",
+    lambda: {
+        ("hit",): auth_cache.stats()["hits"],
+        ("miss",): auth_cache.stats()["misses"],
+    },
+    labelnames=("result",),
+)
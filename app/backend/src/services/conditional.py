@@ -0,0 +1,55 @@
+import hashlib
+from typing import Optional
+
+from fastapi import Request, Response
+
+# Клиент хранит ответ, но перед каждым использованием перепроверяет его
+CACHE_CONTROL = "private, no-cache"
+
+
+def make_etag(*parts) -> str:
+    """
+    Слабый ETag из версии данных и параметров запроса
+    :param parts: Составляющие версии
+    :return: Значение заголовка ETag
+    """
+    digest = hashlib.blake2b(
+        ":".join(str(part) for part in parts).encode(), digest_size=8
+    )
+    return f'W/"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """
+    Проверка заголовка If-None-Match со слабым сравнением
+    :param if_none_match: Значение заголовка
+    :param etag: Текущий ETag
+    :return: True, если у клиента актуальная версия
+    """
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    current = etag.removeprefix("W/")
+    return any(
+        candidate.strip().removeprefix("W/") == current
+        for candidate in if_none_match.split(",")
+    )
+
+
+def conditional_response(
+    request: Request, response: Response, etag: str
+) -> Optional[Response]:
+    """
+    Проставляет ETag ответу и, если версия у клиента совпадает, возвращает
+    пустой ответ 304, который route отдаёт вместо данных
+    :param request:
+    :param response: Ответ route, в который FastAPI добавит заголовки
+    :param etag: Текущий ETag
+    :return: Ответ 304 или None
+    """
+    headers = {"ETag": etag, "Cache-Control": CACHE_CONTROL}
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    response.headers.update(headers)
+    return None
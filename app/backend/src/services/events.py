@@ -0,0 +1,372 @@
+import asyncio
+import json
+import logging
+from collections import deque
+from dataclasses import asdict, dataclass
+from typing import (
+    AsyncIterator,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+)
+
+from backend.src.config_data.config import (
+    EVENTS_BROKER,
+    EVENTS_CHANNEL,
+    EVENTS_HEARTBEAT,
+    EVENTS_QUEUE_SIZE,
+    EVENTS_URL,
+    WORKERS,
+)
+from backend.src.services.metrics import counter, gauge
+from backend.src.services.resp import RespClient, RespError
+
+logger = logging.getLogger(__name__)
+
+BROKER_ERRORS = (OSError, EOFError, RespError, asyncio.TimeoutError)
+RESET_MESSAGE = "event: reset\ndata: {}\n\n"
+PING_MESSAGE = ": ping\n\n"
+
+dropped_events = counter(
+    "feed_events_dropped_total",
+    "Events dropped because a stream connection did not keep up",
+)
+
+
+@dataclass(frozen=True)
+class FeedEvent:
+    """
+    Изменение, которое рассылается подписчикам автора
+    """
+
+    kind: str
+    author_id: int
+    tweet_id: Optional[int] = None
+    user_id: Optional[int] = None
+    like_count: Optional[int] = None
+
+    def to_json(self) -> str:
+        return json.dumps(asdict(self), separators=(",", ":"))
+
+    @classmethod
+    def from_json(cls, raw) -> "FeedEvent":
+        return cls(**json.loads(raw))
+
+    def to_sse(self) -> str:
+        data = {
+            "tweet_id": self.tweet_id,
+            "author_id": self.author_id,
+        }
+        if self.kind == "like":
+            data["like_count"] = self.like_count
+        return (
+            f"event: {self.kind}\n"
+            f"data: {json.dumps(data, separators=(',', ':'))}\n\n"
+        )
+
+
+class Subscriber:
+    """
+    Одно потоковое соединение. События копятся в ограниченной очереди;
+    если клиент не успевает их забирать, старые события отбрасываются, а
+    клиенту отправляется reset, по которому он перечитывает ленту
+    """
+
+    __slots__ = ("user_id", "following", "_queue", "_wakeup", "overflowed")
+
+    def __init__(self, user_id: int, following: Iterable[int], size: int):
+        self.user_id = user_id
+        self.following: Set[int] = set(following)
+        self._queue: deque = deque(maxlen=size)
+        self._wakeup = asyncio.Event()
+        self.overflowed = False
+
+    def push(self, message: str) -> None:
+        if len(self._queue) == self._queue.maxlen:
+            self.overflowed = True
+            dropped_events.inc()
+        self._queue.append(message)
+        self._wakeup.set()
+
+    def reset(self) -> None:
+        self.overflowed = True
+        self._wakeup.set()
+
+    async def next_batch(self, timeout: float) -> Optional[List[str]]:
+        """
+        Ожидание событий не дольше timeout секунд
+        :param timeout: Время ожидания
+        :return: Сообщения SSE или None, если событий не было
+        """
+        if not self._queue and not self.overflowed:
+            self._wakeup.clear()
+            try:
+                await asyncio.wait_for(self._wakeup.wait(), timeout)
+            except asyncio.TimeoutError:
+                return None
+        if self.overflowed:
+            self.overflowed = False
+            self._queue.clear()
+            return [RESET_MESSAGE]
+        batch = list(self._queue)
+        self._queue.clear()
+        return batch
+
+
+class LocalBroker:
+    """
+    Доставка событий внутри одного процесса
+    """
+
+    def __init__(self):
+        self.hub: Optional["EventHub"] = None
+
+    async def publish(self, event: FeedEvent) -> None:
+        self.hub.dispatch(event)
+
+    async def start(self) -> None:
+        return None
+
+    async def close(self) -> None:
+        return None
+
+
+class RespBroker(LocalBroker):
+    """
+    Доставка событий между воркерами через pub/sub сервера с протоколом
+    Redis. Каждый воркер получает все события и раздаёт их своим
+    соединениям
+    """
+
+    def __init__(
+        self,
+        client: RespClient,
+        channel: str,
+        reconnect_delay: float = 1.0,
+    ):
+        super().__init__()
+        self.client = client
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.listening = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def publish(self, event: FeedEvent) -> None:
+        try:
+            await self.client.execute("PUBLISH", self.channel, event.to_json())
+        except BROKER_ERRORS as error:
+            logger.warning("Event publish failed: %r", error)
+
+    async def start(self) -> None:
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        lost = False
+        while True:
+            subscription = None
+            try:
+                subscription = await self.client.subscribe(self.channel)
+                self.listening = True
+                if lost:
+                    self.hub.resync()
+                async for message in subscription.messages():
+                    self.hub.dispatch(FeedEvent.from_json(message))
+            except BROKER_ERRORS as error:
+                logger.warning("Event channel lost: %r", error)
+            finally:
+                # Пропущенные события не восстановить: клиенты перечитают
+                # ленту, а состояние из событий перечитается из бд после
+                # переподключения
+                lost = True
+                self.listening = False
+                self.hub.reset_all()
+                if subscription is not None:
+                    await subscription.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def close(self) -> None:
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.client.close()
+
+
+class EventHub:
+    """
+    Раздача событий потоковым соединениям. Хранит обратный индекс
+    автор -> соединения, которые на него подписаны, так что стоимость
+    события зависит только от числа получателей
+    """
+
+    def __init__(self, broker: LocalBroker, queue_size: int):
+        self.broker = broker
+        broker.hub = self
+        self.queue_size = queue_size
+        self._by_author: Dict[int, Set[Subscriber]] = {}
+        self._by_user: Dict[int, Set[Subscriber]] = {}
+        self._listeners: List[Callable[[FeedEvent], None]] = []
+        self._resync_listeners: List[Callable[[], None]] = []
+
+    def __len__(self) -> int:
+        return sum(len(subs) for subs in self._by_user.values())
+
+    def _index(self, subscriber: Subscriber, author_id: int) -> None:
+        self._by_author.setdefault(author_id, set()).add(subscriber)
+
+    def _unindex(self, subscriber: Subscriber, author_id: int) -> None:
+        subscribers = self._by_author.get(author_id)
+        if subscribers is not None:
+            subscribers.discard(subscriber)
+            if not subscribers:
+                del self._by_author[author_id]
+
+    async def subscribe(
+        self, user_id: int, following_ids: Iterable[int]
+    ) -> Subscriber:
+        await self.broker.start()
+        subscriber = Subscriber(user_id, following_ids, self.queue_size)
+        self._by_user.setdefault(user_id, set()).add(subscriber)
+        # Свои твиты тоже попадают в ленту
+        for author_id in subscriber.following | {user_id}:
+            self._index(subscriber, author_id)
+        return subscriber
+
+    def unsubscribe(self, subscriber: Subscriber) -> None:
+        for author_id in subscriber.following | {subscriber.user_id}:
+            self._unindex(subscriber, author_id)
+        connections = self._by_user.get(subscriber.user_id)
+        if connections is not None:
+            connections.discard(subscriber)
+            if not connections:
+                del self._by_user[subscriber.user_id]
+
+    def add_listener(self, listener: Callable[[FeedEvent], None]) -> None:
+        """
+        Подписка на все события, дошедшие до этого воркера, в том числе
+        от других воркеров. Слушатель вызывается синхронно и не должен
+        блокировать цикл событий
+        :param listener: Функция, принимающая событие
+        :return: None
+        """
+        self._listeners.append(listener)
+
+    def add_resync_listener(self, listener: Callable[[], None]) -> None:
+        """
+        Подписка на восстановление канала событий после обрыва. События
+        за время обрыва до воркера не дошли, поэтому слушатель перечитывает
+        состояние, собранное из событий
+        :param listener: Функция без аргументов
+        :return: None
+        """
+        self._resync_listeners.append(listener)
+
+    def resync(self) -> None:
+        for listener in self._resync_listeners:
+            try:
+                listener()
+            except Exception:
+                logger.exception("Event resync listener failed")
+
+    async def publish(self, events: Iterable[FeedEvent]) -> None:
+        for event in events:
+            await self.broker.publish(event)
+
+    def dispatch(self, event: FeedEvent) -> None:
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception:
+                logger.exception("Event listener failed")
+        # follow и unfollow клиентам не отправляются, они меняют список
+        # авторов, на которых подписаны соединения пользователя
+        if event.kind in ("follow", "unfollow"):
+            for subscriber in self._by_user.get(event.user_id, ()):
+                if event.kind == "follow":
+                    subscriber.following.add(event.author_id)
+                    self._index(subscriber, event.author_id)
+                elif event.author_id in subscriber.following:
+                    subscriber.following.discard(event.author_id)
+                    self._unindex(subscriber, event.author_id)
+            return
+        message = event.to_sse()
+        for subscriber in self._by_author.get(event.author_id, ()):
+            subscriber.push(message)
+
+    def reset_all(self) -> None:
+        for connections in self._by_user.values():
+            for subscriber in connections:
+                subscriber.reset()
+
+    async def start(self) -> None:
+        await self.broker.start()
+
+    async def close(self) -> None:
+        await self.broker.close()
+
+
+async def event_stream(
+    hub: EventHub,
+    subscriber: Subscriber,
+    heartbeat: float = EVENTS_HEARTBEAT,
+) -> AsyncIterator[str]:
+    """
+    Поток сообщений SSE для одного соединения. Пока событий нет, раз в
+    heartbeat секунд отправляется комментарий, чтобы прокси не закрыли
+    соединение
+    :param hub: Раздача событий
+    :param subscriber: Соединение
+    :param heartbeat: Период проверки соединения в секундах
+    :return:
+    """
+    try:
+        yield PING_MESSAGE
+        while True:
+            batch = await subscriber.next_batch(heartbeat)
+            yield PING_MESSAGE if batch is None else "".join(batch)
+    finally:
+        hub.unsubscribe(subscriber)
+
+
+def build_hub(
+    kind: str = EVENTS_BROKER,
+    url: str = EVENTS_URL,
+    queue_size: int = EVENTS_QUEUE_SIZE,
+    workers: int = WORKERS,
+) -> EventHub:
+    """
+    Создание раздачи событий по настройкам: local (один процесс) или
+    redis (pub/sub между воркерами)
+    :param kind: Вид брокера
+    :param url: Адрес сервера Redis
+    :param queue_size: Размер очереди соединения
+    :param workers: Число воркеров приложения
+    :return: Раздача событий
+    """
+    if kind == "local":
+        if workers > 1:
+            # События не выходят за воркер: потоковые соединения и граф
+            # подписок других воркеров их не получат
+            logger.warning(
+                "EVENTS_BROKER=local with %d workers: events stay inside "
+                "the worker that produced them, use EVENTS_BROKER=redis",
+                workers,
+            )
+        return EventHub(LocalBroker(), queue_size)
+    if kind == "redis":
+        return EventHub(
+            RespBroker(RespClient.from_url(url), EVENTS_CHANNEL), queue_size
+        )
+    raise ValueError(f"Unknown events broker {kind!r}")
+
+
+event_hub = build_hub()
+
+gauge(
+    "feed_stream_connections",
+    "Open feed stream connections in this worker",
+    lambda: {(): len(event_hub)},
+)
@@ -0,0 +1,430 @@
+import asyncio
+import heapq
+import logging
+from array import array
+from bisect import bisect_left
+from typing import (
+    AsyncIterable,
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Set,
+    Tuple,
+)
+
+from backend.src.config_data.config import (
+    GRAPH_COMPACT_THRESHOLD,
+    GRAPH_SUGGESTION_FANOUT,
+)
+from backend.src.services.events import FeedEvent
+
+logger = logging.getLogger(__name__)
+
+Edge = Tuple[int, int]
+
+
+class Csr:
+    """
+    Неизменяемые списки смежности в формате CSR: соседи вершины u лежат
+    в targets[offsets[u]:offsets[u + 1]] по возрастанию. Вершины - ids
+    пользователей, 4 байта на ребро
+    """
+
+    __slots__ = ("offsets", "targets")
+
+    def __init__(self, offsets: array, targets: array):
+        self.offsets = offsets
+        self.targets = targets
+
+    @classmethod
+    def empty(cls) -> "Csr":
+        return cls(array("q", [0]), array("i"))
+
+    def bounds(self, node: int) -> Tuple[int, int]:
+        if node + 1 >= len(self.offsets):
+            return 0, 0
+        return self.offsets[node], self.offsets[node + 1]
+
+    def row(self, node: int) -> array:
+        start, end = self.bounds(node)
+        return self.targets[start:end]
+
+    def degree(self, node: int) -> int:
+        start, end = self.bounds(node)
+        return end - start
+
+    def has(self, node: int, target: int) -> bool:
+        start, end = self.bounds(node)
+        index = bisect_left(self.targets, target, start, end)
+        return index < end and self.targets[index] == target
+
+    def __len__(self) -> int:
+        return len(self.targets)
+
+    def edges(self) -> Iterable[Edge]:
+        offsets, targets = self.offsets, self.targets
+        for node in range(len(offsets) - 1):
+            for index in range(offsets[node], offsets[node + 1]):
+                yield node, targets[index]
+
+
+class CsrBuilder:
+    """
+    Построение Csr из рёбер, упорядоченных по (source, target)
+    """
+
+    def __init__(self):
+        self.offsets = array("q", [0])
+        self.targets = array("i")
+
+    def add(self, source: int, target: int) -> None:
+        while len(self.offsets) <= source + 1:
+            self.offsets.append(len(self.targets))
+        self.targets.append(target)
+        self.offsets[source + 1] = len(self.targets)
+
+    def build(self) -> Csr:
+        return Csr(self.offsets, self.targets)
+
+
+def transpose(csr: Csr) -> Csr:
+    """
+    Обратный граф подсчётом степеней, без сортировки: строки получаются
+    упорядоченными, потому что исходные рёбра обходятся по возрастанию
+    :param csr: Граф
+    :return: Граф с развёрнутыми рёбрами
+    """
+    size = max(csr.targets, default=-1) + 2
+    offsets = array("q", bytes(8 * size))
+    for target in csr.targets:
+        offsets[target + 1] += 1
+    for node in range(1, size):
+        offsets[node] += offsets[node - 1]
+    fill = array("q", offsets)
+    targets = array("i", bytes(4 * len(csr.targets)))
+    for source, target in csr.edges():
+        targets[fill[target]] = source
+        fill[target] += 1
+    return Csr(offsets, targets)
+
+
+def _copy_rows(
+    base: Csr, first: int, last: int, offsets: array, targets: array
+) -> None:
+    # Строки [first, last) не менялись: копируются срезами, смещения
+    # сдвигаются на одну величину. Строк за концом base нет, они пустые
+    base_last = max(first, min(last, len(base.offsets) - 1))
+    if first < base_last:
+        begin, end = base.offsets[first], base.offsets[base_last]
+        shift = len(targets) - begin
+        offsets.extend(
+            map(shift.__add__, base.offsets[first + 1 : base_last + 1])
+        )
+        targets.extend(base.targets[begin:end])
+    if last > base_last:
+        offsets.extend([len(targets)] * (last - base_last))
+
+
+def _patched_csr(base: Csr, added, removed) -> Csr:
+    """
+    Применение изменений к Csr. Заново собираются только изменённые
+    строки, остальные копируются целиком, поэтому время зависит от
+    числа вершин и изменений, а не от числа рёбер
+    :param base: Граф
+    :param added: Словарь вершина -> добавленные соседи
+    :param removed: Словарь вершина -> удалённые соседи
+    :return: Новый граф
+    """
+    changed = sorted(
+        node
+        for node in set(added) | set(removed)
+        if added.get(node) or removed.get(node)
+    )
+    offsets = array("q", [0])
+    targets = array("i")
+    first = 0
+    for node in changed:
+        _copy_rows(base, first, node, offsets, targets)
+        row = set(base.row(node))
+        row.difference_update(removed.get(node, ()))
+        row.update(added.get(node, ()))
+        targets.extend(sorted(row))
+        offsets.append(len(targets))
+        first = node + 1
+    _copy_rows(base, first, len(base.offsets) - 1, offsets, targets)
+    return Csr(offsets, targets)
+
+
+def _inverted(changes) -> Dict[int, Set[int]]:
+    result: Dict[int, Set[int]] = {}
+    for source, targets in changes.items():
+        for target in targets:
+            result.setdefault(target, set()).add(source)
+    return result
+
+
+def _rebuild(
+    following: Csr, followers: Csr, added, removed
+) -> Tuple[Csr, Csr]:
+    return (
+        _patched_csr(following, added, removed),
+        _patched_csr(followers, _inverted(added), _inverted(removed)),
+    )
+
+
+class FollowGraph:
+    """
+    Граф подписок в памяти процесса: подписки и подписчики каждого
+    пользователя в двух Csr и небольшие наборы изменений поверх них.
+    Когда изменений накапливается много, Csr перестраиваются в потоке.
+    Изменения приходят событиями follow/unfollow, в том числе от других
+    воркеров
+    """
+
+    def __init__(self, compact_threshold: int = GRAPH_COMPACT_THRESHOLD):
+        self.compact_threshold = compact_threshold
+        self.loaded = False
+        self._following = Csr.empty()
+        self._followers = Csr.empty()
+        self._added: Dict[int, Set[int]] = {}
+        self._removed: Dict[int, Set[int]] = {}
+        self._changes = 0
+        self._lock = asyncio.Lock()
+        # События, пришедшие во время загрузки или перестройки
+        self._pending: Optional[List[Tuple[str, int, int]]] = None
+        self._compaction: Optional[asyncio.Task] = None
+        self._reload: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        added = sum(len(row) for row in self._added.values())
+        removed = sum(len(row) for row in self._removed.values())
+        return len(self._following) + added - removed
+
+    async def ensure_loaded(
+        self, edges: Callable[[], AsyncIterable[Edge]]
+    ) -> None:
+        """
+        Загрузка графа при первом обращении, если он не загружен при
+        старте приложения
+        :param edges: Функция, возвращающая поток рёбер
+        :return: None
+        """
+        if self.loaded:
+            return
+        async with self._lock:
+            if not self.loaded:
+                await self._load(edges())
+
+    def invalidate(self, edges: Callable[[], AsyncIterable[Edge]]) -> None:
+        """
+        Перезагрузка графа в фоне, когда часть событий могла быть
+        пропущена. До окончания загрузки запросы ждут её в ensure_loaded
+        :param edges: Функция, возвращающая поток рёбер
+        :return: None
+        """
+        if not self.loaded:
+            return
+        self.loaded = False
+        if self._reload is None or self._reload.done():
+            self._reload = asyncio.get_running_loop().create_task(
+                self._reload_logged(edges)
+            )
+
+    async def _reload_logged(
+        self, edges: Callable[[], AsyncIterable[Edge]]
+    ) -> None:
+        try:
+            await self.ensure_loaded(edges)
+        except Exception:
+            logger.exception("Follow graph reload failed")
+
+    async def load(self, edges: AsyncIterable[Edge]) -> None:
+        """
+        Загрузка графа из рёбер (подписчик, автор), упорядоченных по
+        подписчику и автору. События, пришедшие во время загрузки,
+        применяются после неё
+        :param edges: Асинхронный поток рёбер
+        :return: None
+        """
+        async with self._lock:
+            await self._load(edges)
+
+    async def _load(self, edges: AsyncIterable[Edge]) -> None:
+        self._pending = []
+        try:
+            builder = CsrBuilder()
+            async for follower, author in edges:
+                builder.add(follower, author)
+            following = builder.build()
+            followers = await asyncio.get_running_loop().run_in_executor(
+                None, transpose, following
+            )
+        except BaseException:
+            self._pending = None
+            raise
+        self._following, self._followers = following, followers
+        self._added, self._removed, self._changes = {}, {}, 0
+        pending, self._pending = self._pending, None
+        self.loaded = True
+        for kind, follower, author in pending:
+            self._apply(kind, follower, author)
+
+    def on_event(self, event: FeedEvent) -> None:
+        if event.kind not in ("follow", "unfollow"):
+            return
+        if self._pending is not None:
+            self._pending.append((event.kind, event.user_id, event.author_id))
+        if self.loaded:
+            self._apply(event.kind, event.user_id, event.author_id)
+
+    def _apply(self, kind: str, follower: int, author: int) -> None:
+        in_base = self._following.has(follower, author)
+        added = self._added.setdefault(follower, set())
+        removed = self._removed.setdefault(follower, set())
+        if kind == "follow":
+            removed.discard(author)
+            if not in_base:
+                added.add(author)
+        else:
+            added.discard(author)
+            if in_base:
+                removed.add(author)
+        self._changes += 1
+        if self._changes >= self.compact_threshold:
+            self._schedule_compaction()
+
+    def _schedule_compaction(self) -> None:
+        if self._compaction is not None and not self._compaction.done():
+            return
+        try:
+            self._compaction = asyncio.get_running_loop().create_task(
+                self.compact()
+            )
+        except RuntimeError:
+            pass
+
+    async def compact(self) -> None:
+        """
+        Перестройка Csr с накопленными изменениями: заново собираются
+        только изменённые строки. Пока она идёт в потоке, граф читается
+        по старым Csr и изменениям
+        :return: None
+        """
+        async with self._lock:
+            added = {node: set(row) for node, row in self._added.items()}
+            removed = {node: set(row) for node, row in self._removed.items()}
+            self._pending = []
+            try:
+                (
+                    following,
+                    followers,
+                ) = await asyncio.get_running_loop().run_in_executor(
+                    None,
+                    _rebuild,
+                    self._following,
+                    self._followers,
+                    added,
+                    removed,
+                )
+            except Exception:
+                self._pending = None
+                logger.exception("Follow graph compaction failed")
+                return
+            self._following, self._followers = following, followers
+            self._added, self._removed, self._changes = {}, {}, 0
+            pending, self._pending = self._pending, None
+            for kind, follower, author in pending:
+                self._apply(kind, follower, author)
+
+    def is_following(self, follower: int, author: int) -> bool:
+        if author in self._added.get(follower, ()):
+            return True
+        if author in self._removed.get(follower, ()):
+            return False
+        return self._following.has(follower, author)
+
+    def following(self, user_id: int) -> List[int]:
+        """
+        Ids пользователей, на которых подписан пользователь
+        :param user_id: Id пользователя
+        :return: Список ids
+        """
+        row = self._following.row(user_id)
+        added = self._added.get(user_id)
+        removed = self._removed.get(user_id)
+        if not added and not removed:
+            return list(row)
+        result = [author for author in row if author not in (removed or ())]
+        return result + sorted(added or ())
+
+    def followers(self, user_id: int) -> List[int]:
+        """
+        Ids подписчиков пользователя
+        :param user_id: Id пользователя
+        :return: Список ids
+        """
+        result = [
+            follower
+            for follower in self._followers.row(user_id)
+            if user_id not in self._removed.get(follower, ())
+        ]
+        # Новые подписки хранятся по подписчику, их немного
+        result.extend(
+            follower
+            for follower, authors in self._added.items()
+            if user_id in authors
+        )
+        return result
+
+    def mutual(self, user_id: int, other_id: int) -> List[int]:
+        """
+        Кто из тех, на кого подписан пользователь, подписан на другого
+        пользователя
+        :param user_id: Id пользователя
+        :param other_id: Id другого пользователя
+        :return: Список ids
+        """
+        following = self.following(user_id)
+        followers = self.followers(other_id)
+        if len(following) <= len(followers):
+            return [
+                friend
+                for friend in following
+                if self.is_following(friend, other_id)
+            ]
+        return [
+            follower
+            for follower in followers
+            if self.is_following(user_id, follower)
+        ]
+
+    def suggestions(
+        self,
+        user_id: int,
+        limit: int,
+        fanout: int = GRAPH_SUGGESTION_FANOUT,
+    ) -> List[Tuple[int, int]]:
+        """
+        Рекомендации, на кого подписаться: пользователи, на которых
+        подписано больше всего тех, на кого подписан пользователь
+        :param user_id: Id пользователя
+        :param limit: Сколько пользователей вернуть
+        :param fanout: Сколько подписок пользователя просматривать
+        :return: Список (id, число общих подписок)
+        """
+        following = self.following(user_id)
+        exclude = set(following)
+        exclude.add(user_id)
+        counts: Dict[int, int] = {}
+        for friend in following[:fanout]:
+            for candidate in self.following(friend):
+                if candidate not in exclude:
+                    counts[candidate] = counts.get(candidate, 0) + 1
+        return heapq.nlargest(
+            limit, counts.items(), key=lambda item: (item[1], -item[0])
+        )
+
+
+follow_graph = FollowGraph()
@@ -0,0 +1,124 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Optional, Sequence
+
+from backend.src.config_data.config import (
+    IMAGE_MAX_PIXELS,
+    IMAGE_VARIANT_FORMAT,
+    IMAGE_VARIANT_QUALITY,
+    IMAGE_VARIANT_WIDTHS,
+    IMAGE_WORKERS,
+)
+
+try:
+    from PIL import Image as PILImage
+    from PIL import ImageOps
+except ImportError:  # pragma: no cover - Pillow является опциональной
+    PILImage = None
+
+logger = logging.getLogger(__name__)
+
+_pool: Optional[ProcessPoolExecutor] = None
+
+
+class InvalidImage(Exception):
+    """
+    Файл не удалось декодировать как картинку
+    """
+
+
+def pipeline_enabled() -> bool:
+    return PILImage is not None and bool(IMAGE_VARIANT_WIDTHS)
+
+
+def variant_filename(base_name: str, width: int, image_format: str) -> str:
+    """
+    Имя файла производной картинки
+    :param base_name: Имя оригинала без расширения
+    :param width: Ширина производной
+    :param image_format: Формат производной (например, WEBP)
+    :return: Имя файла
+    """
+    return f"{base_name}_{width}.{image_format.lower()}"
+
+
+def build_variants(
+    path: str,
+    widths: Sequence[int] = IMAGE_VARIANT_WIDTHS,
+    image_format: str = IMAGE_VARIANT_FORMAT,
+    quality: int = IMAGE_VARIANT_QUALITY,
+) -> List[Dict]:
+    """
+    Декодирование картинки и сохранение уменьшенных копий рядом с
+    оригиналом. Выполняется в отдельном процессе
+    :param path: Путь к оригиналу
+    :param widths: Ширины производных, большие ширины оригинала пропускаются
+    :param image_format: Формат производных
+    :param quality: Качество сжатия
+    :return: Список описаний производных (width, height, format)
+    """
+    PILImage.MAX_IMAGE_PIXELS = IMAGE_MAX_PIXELS
+    try:
+        with PILImage.open(path) as image:
+            image.verify()
+        with PILImage.open(path) as image:
+            image = ImageOps.exif_transpose(image)
+            if image.mode not in ("RGB", "RGBA"):
+                image = image.convert("RGBA" if "A" in image.mode else "RGB")
+            image.load()
+    except (OSError, SyntaxError, ValueError, PILImage.DecompressionBombError):
+        raise InvalidImage(path)
+
+    directory, filename = os.path.split(path)
+    base_name = os.path.splitext(filename)[0]
+    variants = []
+    for width in sorted(set(widths)):
+        if width >= image.width:
+            continue
+        height = max(1, round(image.height * width / image.width))
+        resized = image.resize((width, height), PILImage.LANCZOS)
+        resized.save(
+            os.path.join(
+                directory, variant_filename(base_name, width, image_format)
+            ),
+            image_format,
+            quality=quality,
+        )
+        variants.append(
+            {"width": width, "height": height, "format": image_format}
+        )
+    return variants
+
+
+def get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(
+            max_workers=IMAGE_WORKERS,
+            mp_context=multiprocessing.get_context("spawn"),
+        )
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=True, cancel_futures=True)
+        _pool = None
+
+
+async def process_image(path: str) -> Optional[List[Dict]]:
+    """
+    Построение производных картинки в пуле процессов
+    :param path: Путь к оригиналу
+    :return: Список производных или None, если файл не является картинкой
+    """
+    loop = asyncio.get_running_loop()
+    try:
+        return await loop.run_in_executor(get_pool(), build_variants, path)
+    except InvalidImage:
+        logger.warning("Uploaded file %s is not a valid image", path)
+        return None
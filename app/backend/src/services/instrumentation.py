@@ -0,0 +1,175 @@
+import time
+from contextvars import ContextVar
+from dataclasses import dataclass
+from typing import Optional
+
+from backend.src.services.metrics import counter, histogram
+from sqlalchemy import event
+from sqlalchemy.engine import Engine
+
+QUERY_BUCKETS = (1, 2, 3, 5, 10, 20, 50, 100, 200)
+ROW_BUCKETS = (1, 10, 50, 100, 500, 1000, 5000, 10000, 50000)
+
+request_duration = histogram(
+    "http_request_duration_seconds",
+    "Request latency by route template and status",
+    labelnames=("method", "route", "status"),
+)
+request_queries = histogram(
+    "http_request_db_queries",
+    "SQL statements executed per request",
+    labelnames=("route",),
+    buckets=QUERY_BUCKETS,
+)
+request_rows = histogram(
+    "http_request_db_rows",
+    "Rows returned or changed by SQL statements per request",
+    labelnames=("route",),
+    buckets=ROW_BUCKETS,
+)
+request_db_time = histogram(
+    "http_request_db_seconds",
+    "Time spent in SQL statements per request",
+    labelnames=("route",),
+)
+queries_total = counter(
+    "db_queries_total",
+    "SQL statements executed, including those outside requests",
+)
+
+
+@dataclass
+class QueryStats:
+    """
+    Запросы к бд, выполненные в рамках одного http-запроса
+    """
+
+    queries: int = 0
+    rows: int = 0
+    db_time: float = 0.0
+
+
+_current: ContextVar[Optional[QueryStats]] = ContextVar(
+    "query_stats", default=None
+)
+
+
+def start_query_stats() -> QueryStats:
+    """
+    Начало учёта запросов к бд в текущем контексте
+    :return: Объект, в который будут записываться запросы
+    """
+    stats = QueryStats()
+    _current.set(stats)
+    return stats
+
+
+def current_query_stats() -> Optional[QueryStats]:
+    return _current.get()
+
+
+def cursor_rows(cursor) -> int:
+    """
+    Число строк, которые вернуло или изменило выражение
+    :param cursor: Курсор DBAPI после выполнения
+    :return: Число строк
+    """
+    rows = cursor.rowcount
+    if rows is None or rows < 0:
+        # Для SELECT rowcount не определён. Асинхронные адаптеры
+        # SQLAlchemy читают результат целиком ещё до события
+        # after_cursor_execute
+        rows = len(getattr(cursor, "_rows", ()) or ())
+    return rows
+
+
+def _before_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(
+    conn, cursor, statement, parameters, context, executemany
+):
+    queries_total.inc()
+    stats = _current.get()
+    if stats is None:
+        return
+    stats.queries += 1
+    stats.db_time += time.perf_counter() - context._query_started
+    stats.rows += cursor_rows(cursor)
+
+
+def instrument_engine(engine: Engine) -> None:
+    """
+    Подключение учёта запросов к движку: число выражений, строк и время
+    в бд записываются в QueryStats текущего запроса
+    :param engine: Синхронный движок (AsyncEngine.sync_engine)
+    :return: None
+    """
+    if not event.contains(
+        engine, "before_cursor_execute", _before_cursor_execute
+    ):
+        event.listen(engine, "before_cursor_execute", _before_cursor_execute)
+        event.listen(engine, "after_cursor_execute", _after_cursor_execute)
+
+
+def route_label(scope) -> str:
+    """
+    Шаблон маршрута вместо пути запроса, чтобы число значений метки не
+    зависело от ids в адресах
+    :param scope: ASGI scope после обработки роутером
+    :return: Шаблон маршрута или unmatched
+    """
+    route = scope.get("route")
+    path = getattr(route, "path", None)
+    return path if path is not None else "unmatched"
+
+
+class MetricsMiddleware:
+    """
+    ASGI middleware: время ответа по маршруту и статусу, число запросов к
+    бд, строк и время в бд. Те же данные отдаются клиенту в заголовке
+    Server-Timing
+    """
+
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        started = time.perf_counter()
+        stats = start_query_stats()
+        status = 500
+
+        async def send_with_timing(message):
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = message["status"]
+                total = (time.perf_counter() - started) * 1000
+                timing = (
+                    f"db;dur={stats.db_time * 1000:.3f};"
+                    f'desc="{stats.queries} queries, {stats.rows} rows", '
+                    f"app;dur={total:.3f}"
+                )
+                message["headers"] = list(message.get("headers", [])) + [
+                    (b"server-timing", timing.encode())
+                ]
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_with_timing)
+        finally:
+            route = route_label(scope)
+            request_duration.observe(
+                time.perf_counter() - started,
+                method=scope["method"],
+                route=route,
+                status=str(status),
+            )
+            request_queries.observe(stats.queries, route=route)
+            request_rows.observe(stats.rows, route=route)
+            request_db_time.observe(stats.db_time, route=route)
@@ -0,0 +1,91 @@
+import math
+from dataclasses import dataclass
+from typing import List, Sequence
+
+from backend.src.config_data.config import (
+    TOP_FEED_AFFINITY_WEIGHT,
+    TOP_FEED_HALF_LIFE,
+    TOP_FEED_LIKE_WEIGHT,
+)
+
+try:
+    import numpy
+except ImportError:  # pragma: no cover - numpy является опциональной
+    numpy = None
+
+
+@dataclass(frozen=True)
+class ScoringWeights:
+    """
+    Веса оценки твита: лайки и близость читателя к автору увеличивают
+    оценку, возраст уменьшает её вдвое за каждые half_life секунд
+    """
+
+    likes: float = TOP_FEED_LIKE_WEIGHT
+    affinity: float = TOP_FEED_AFFINITY_WEIGHT
+    half_life: float = TOP_FEED_HALF_LIFE
+
+
+def vectorized() -> bool:
+    return numpy is not None
+
+
+def score_candidates(
+    likes: Sequence[int],
+    ages: Sequence[float],
+    affinities: Sequence[int],
+    weights: ScoringWeights = ScoringWeights(),
+) -> Sequence[float]:
+    """
+    Оценка кандидатов: (1 + w_l * ln(1 + лайки) + w_a * ln(1 + близость))
+    * 0.5 ** (возраст / half_life). С numpy считается одним проходом по
+    массивам, без неё - циклом с той же формулой
+    :param likes: Число лайков каждого твита
+    :param ages: Возраст каждого твита в секундах
+    :param affinities: Сколько твитов автора лайкнул читатель
+    :param weights: Веса оценки
+    :return: Оценки в порядке кандидатов
+    """
+    if numpy is not None:
+        likes = numpy.asarray(likes, dtype=numpy.float64)
+        ages = numpy.maximum(numpy.asarray(ages, dtype=numpy.float64), 0.0)
+        affinities = numpy.asarray(affinities, dtype=numpy.float64)
+        base = (
+            1.0
+            + weights.likes * numpy.log1p(likes)
+            + weights.affinity * numpy.log1p(affinities)
+        )
+        return base * numpy.exp2(-ages / weights.half_life)
+    return [
+        (
+            1.0
+            + weights.likes * math.log1p(like_count)
+            + weights.affinity * math.log1p(affinity)
+        )
+        * 2.0 ** (-max(age, 0.0) / weights.half_life)
+        for like_count, age, affinity in zip(likes, ages, affinities)
+    ]
+
+
+def top_ids(
+    tweet_ids: Sequence[int],
+    scores: Sequence[float],
+    limit: int,
+) -> List[int]:
+    """
+    Ids твитов с наибольшей оценкой, при равной - более новые
+    :param tweet_ids: Ids кандидатов
+    :param scores: Оценки кандидатов
+    :param limit: Сколько твитов вернуть
+    :return: Список ids по убыванию оценки
+    """
+    if numpy is not None:
+        ids = numpy.asarray(tweet_ids, dtype=numpy.int64)
+        scores = numpy.asarray(scores, dtype=numpy.float64)
+        # lexsort сортирует по последнему ключу, затем по предыдущим
+        order = numpy.lexsort((-ids, -scores))[:limit]
+        return ids[order].tolist()
+    ranked = sorted(
+        zip(scores, tweet_ids), key=lambda item: (-item[0], -item[1])
+    )
+    return [tweet_id for _, tweet_id in ranked[:limit]]
@@ -0,0 +1,185 @@
+import asyncio
+from typing import Any, AsyncIterator, List, Optional, Sequence
+from urllib.parse import urlparse
+
+
+class RespError(Exception):
+    """
+    Ошибка, которую вернул сервер
+    """
+
+
+def encode_command(*args) -> bytes:
+    """
+    Кодирование команды в формат RESP: массив bulk-строк
+    :param args: Имя команды и аргументы
+    :return: Байты для отправки
+    """
+    parts = [b"*%d\r\n" % len(args)]
+    for arg in args:
+        if isinstance(arg, str):
+            arg = arg.encode()
+        elif not isinstance(arg, bytes):
+            arg = str(arg).encode()
+        parts.append(b"$%d\r\n%s\r\n" % (len(arg), arg))
+    return b"".join(parts)
+
+
+async def read_reply(reader: asyncio.StreamReader) -> Any:
+    """
+    Чтение одного ответа RESP. Ошибка сервера возвращается объектом
+    RespError, чтобы не сбить разбор остальных ответов конвейера
+    :param reader: Поток соединения
+    :return: Разобранный ответ
+    """
+    line = await reader.readline()
+    if not line.endswith(b"\r\n"):
+        raise ConnectionError("Connection closed by server")
+    prefix, rest = line[:1], line[1:-2]
+    if prefix == b"+":
+        return rest.decode()
+    if prefix == b"-":
+        return RespError(rest.decode())
+    if prefix == b":":
+        return int(rest)
+    if prefix == b"$":
+        length = int(rest)
+        if length < 0:
+            return None
+        return (await reader.readexactly(length + 2))[:-2]
+    if prefix == b"*":
+        length = int(rest)
+        if length < 0:
+            return None
+        return [await read_reply(reader) for _ in range(length)]
+    raise ConnectionError(f"Unexpected reply {line!r}")
+
+
+class RespSubscription:
+    """
+    Подписка на канал на отдельном соединении
+    """
+
+    def __init__(self, reader, writer):
+        self._reader = reader
+        self._writer = writer
+
+    async def messages(self) -> AsyncIterator[bytes]:
+        while True:
+            reply = await read_reply(self._reader)
+            if isinstance(reply, list) and reply[0] == b"message":
+                yield reply[2]
+
+    async def close(self) -> None:
+        self._writer.close()
+
+
+class RespClient:
+    """
+    Минимальный клиент протокола Redis поверх asyncio. Одно соединение на
+    процесс, команды одного вызова отправляются конвейером
+    """
+
+    def __init__(
+        self,
+        host: str = "localhost",
+        port: int = 6379,
+        db: int = 0,
+        password: Optional[str] = None,
+        timeout: float = 1.0,
+    ):
+        self.host = host
+        self.port = port
+        self.db = db
+        self.password = password
+        self.timeout = timeout
+        self._lock = asyncio.Lock()
+        self._reader: Optional[asyncio.StreamReader] = None
+        self._writer: Optional[asyncio.StreamWriter] = None
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RespClient":
+        """
+        Клиент по адресу вида redis://[:password@]host:port/db
+        :param url: Адрес сервера
+        :return: Клиент
+        """
+        parsed = urlparse(url)
+        return cls(
+            host=parsed.hostname or "localhost",
+            port=parsed.port or 6379,
+            db=int(parsed.path.lstrip("/") or 0),
+            password=parsed.password,
+            **kwargs,
+        )
+
+    async def _open(self):
+        reader, writer = await asyncio.wait_for(
+            asyncio.open_connection(self.host, self.port), self.timeout
+        )
+        setup = []
+        if self.password:
+            setup.append(("AUTH", self.password))
+        if self.db:
+            setup.append(("SELECT", self.db))
+        for command in setup:
+            writer.write(encode_command(*command))
+            reply = await asyncio.wait_for(read_reply(reader), self.timeout)
+            if isinstance(reply, RespError):
+                writer.close()
+                raise reply
+        return reader, writer
+
+    async def execute_many(self, commands: Sequence[Sequence]) -> List[Any]:
+        """
+        Выполнение нескольких команд одним конвейером
+        :param commands: Список команд с аргументами
+        :return: Список ответов
+        """
+        async with self._lock:
+            if self._writer is None:
+                self._reader, self._writer = await self._open()
+            try:
+                self._writer.write(
+                    b"".join(encode_command(*command) for command in commands)
+                )
+                await self._writer.drain()
+                replies = [
+                    await asyncio.wait_for(
+                        read_reply(self._reader), self.timeout
+                    )
+                    for _ in commands
+                ]
+            except BaseException:
+                # Соединение в неизвестном состоянии: ответы могли остаться
+                # непрочитанными, поэтому следующий вызов откроет новое
+                self._writer.close()
+                self._reader = self._writer = None
+                raise
+        for reply in replies:
+            if isinstance(reply, RespError):
+                raise reply
+        return replies
+
+    async def execute(self, *args) -> Any:
+        return (await self.execute_many([args]))[0]
+
+    async def subscribe(self, channel: str) -> RespSubscription:
+        """
+        Подписка на канал. Возвращается после подтверждения сервером
+        :param channel: Имя канала
+        :return: Объект подписки
+        """
+        reader, writer = await self._open()
+        writer.write(encode_command("SUBSCRIBE", channel))
+        reply = await asyncio.wait_for(read_reply(reader), self.timeout)
+        if not isinstance(reply, list) or reply[0] != b"subscribe":
+            writer.close()
+            raise ConnectionError(f"Unexpected reply {reply!r}")
+        return RespSubscription(reader, writer)
+
+    async def close(self) -> None:
+        async with self._lock:
+            if self._writer is not None:
+                self._writer.close()
+                self._reader = self._writer = None
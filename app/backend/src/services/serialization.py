@@ -0,0 +1,36 @@
+from typing import Any, Dict, Optional
+
+from backend.src.config_data.config import FAST_JSON_RESPONSES
+from fastapi import Response
+from fastapi.responses import ORJSONResponse
+
+try:
+    import orjson
+except ImportError:  # pragma: no cover - orjson является опциональной
+    orjson = None
+
+
+def fast_json_enabled() -> bool:
+    return FAST_JSON_RESPONSES and orjson is not None
+
+
+def fast_response(
+    payload: Dict[str, Any], response: Optional[Response] = None
+) -> Any:
+    """
+    Ответ route в обход повторной проверки через response_model. Если
+    быстрый путь включён, словарь сразу кодируется orjson в байты, иначе
+    возвращается как есть и проходит через pydantic. Словарь должен
+    совпадать со схемой ответа, включая порядок полей
+    :param payload: Ответ, собранный из строк запроса
+    :param response: Ответ route с заголовками, которые нужно сохранить
+    :return:
+    """
+    if fast_json_enabled():
+        fast = ORJSONResponse(payload)
+        if response is not None:
+            for name, value in response.headers.items():
+                if name != "content-length":
+                    fast.headers[name] = value
+        return fast
+    return payload
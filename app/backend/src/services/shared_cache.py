@@ -0,0 +1,320 @@
+import asyncio
+import json
+import logging
+from typing import Any, Dict, Iterable, Optional, Sequence
+
+from backend.src.config_data.config import (
+    CACHE_BACKEND,
+    CACHE_CHANNEL,
+    CACHE_LOCAL_SIZE,
+    CACHE_TTL,
+    CACHE_URL,
+)
+from backend.src.services.cache import TTLCache
+from backend.src.services.metrics import counter
+from backend.src.services.resp import RespClient, RespError
+
+logger = logging.getLogger(__name__)
+
+# Ошибки внешнего кэша не ломают запрос: чтение считается промахом,
+# запись и сброс пропускаются
+CACHE_ERRORS = (OSError, EOFError, RespError, asyncio.TimeoutError)
+
+cache_requests = counter(
+    "shared_cache_requests_total",
+    "Lookups in the shared tweet cache by result",
+    labelnames=("result",),
+)
+
+
+def tweet_key(tweet_id: int) -> str:
+    return f"tweet:{tweet_id}"
+
+
+def likes_key(tweet_id: int) -> str:
+    return f"likes:{tweet_id}"
+
+
+def user_key(user_id: int) -> str:
+    return f"user:{user_id}"
+
+
+class CacheBackend:
+    """
+    Интерфейс кэша: пакетные чтение, запись и сброс по ключам.
+    Значения - объекты, которые можно сериализовать в JSON.
+    Запись прочитанного из бд идёт через begin_fill и fill_many: ключ,
+    сброшенный, пока шло чтение, не записывается, иначе в кэш на весь
+    ttl вернулось бы значение до изменения
+    """
+
+    def __init__(self):
+        self._tick = 0
+        self._fills = 0
+        # Ключ -> момент сброса, пока идёт хотя бы одно чтение из бд
+        self._deleted: Dict[str, int] = {}
+
+    def begin_fill(self) -> int:
+        """
+        Начало чтения из бд для записи в кэш
+        :return: Момент начала для fill_many
+        """
+        self._fills += 1
+        return self._tick
+
+    def end_fill(self) -> None:
+        self._fills -= 1
+        if not self._fills:
+            self._deleted.clear()
+
+    def _mark_deleted(self, keys: Iterable[str]) -> None:
+        self._tick += 1
+        if self._fills:
+            for key in keys:
+                self._deleted[key] = self._tick
+
+    async def fill_many(self, items: Dict[str, Any], started: int) -> None:
+        """
+        Запись прочитанного из бд, кроме ключей, сброшенных после started
+        :param items: Словарь ключ -> значение
+        :param started: Результат begin_fill
+        :return: None
+        """
+        await self.set_many(
+            {
+                key: value
+                for key, value in items.items()
+                if self._deleted.get(key, 0) <= started
+            }
+        )
+
+    async def get_many(self, keys: Sequence[str]) -> Dict[str, Any]:
+        return {}
+
+    async def set_many(self, items: Dict[str, Any]) -> None:
+        return None
+
+    async def delete_many(self, keys: Iterable[str]) -> None:
+        return None
+
+    async def start(self) -> None:
+        return None
+
+    async def close(self) -> None:
+        return None
+
+
+class LocalCacheBackend(CacheBackend):
+    """
+    LRU-кэш в памяти процесса. При нескольких воркерах каждый сбрасывает
+    только свою копию, остальные видят изменения не позже чем через ttl
+    """
+
+    def __init__(self, maxsize: int, ttl: float):
+        super().__init__()
+        self._cache = TTLCache(maxsize, ttl)
+
+    async def get_many(self, keys):
+        found = {}
+        for key in keys:
+            value = self._cache.get(key)
+            if value is not None:
+                found[key] = value
+        return found
+
+    async def set_many(self, items):
+        for key, value in items.items():
+            self._cache.set(key, value)
+
+    async def delete_many(self, keys):
+        keys = list(keys)
+        self._mark_deleted(keys)
+        for key in keys:
+            self._cache.pop(key)
+
+    def clear(self) -> None:
+        self._cache.clear()
+
+    def stats(self):
+        return self._cache.stats()
+
+
+class RedisCacheBackend(CacheBackend):
+    """
+    Общий для всех воркеров кэш на сервере с протоколом Redis
+    """
+
+    def __init__(self, client: RespClient, ttl: float, prefix="microblog:"):
+        super().__init__()
+        self.client = client
+        self.ttl_ms = int(ttl * 1000)
+        self.prefix = prefix
+
+    async def get_many(self, keys):
+        if not keys:
+            return {}
+        try:
+            values = await self.client.execute(
+                "MGET", *(self.prefix + key for key in keys)
+            )
+        except CACHE_ERRORS as error:
+            logger.warning("Cache read failed: %r", error)
+            return {}
+        return {
+            key: json.loads(value)
+            for key, value in zip(keys, values)
+            if value is not None
+        }
+
+    async def set_many(self, items):
+        if not items:
+            return
+        try:
+            await self.client.execute_many(
+                [
+                    (
+                        "SET",
+                        self.prefix + key,
+                        json.dumps(value),
+                        "PX",
+                        self.ttl_ms,
+                    )
+                    for key, value in items.items()
+                ]
+            )
+        except CACHE_ERRORS as error:
+            logger.warning("Cache write failed: %r", error)
+
+    async def delete_many(self, keys):
+        keys = list(keys)
+        if not keys:
+            return
+        self._mark_deleted(keys)
+        try:
+            await self.client.execute(
+                "DEL", *(self.prefix + key for key in keys)
+            )
+        except CACHE_ERRORS as error:
+            logger.warning("Cache invalidation failed: %r", error)
+
+    async def publish(self, channel: str, message: str) -> None:
+        try:
+            await self.client.execute(
+                "PUBLISH", self.prefix + channel, message
+            )
+        except CACHE_ERRORS as error:
+            logger.warning("Cache invalidation publish failed: %r", error)
+
+    async def close(self):
+        await self.client.close()
+
+
+class TieredCacheBackend(CacheBackend):
+    """
+    Локальный кэш перед общим. Сброс ключа публикуется в канал, и каждый
+    воркер удаляет его из своей локальной копии. Пока подписка на канал
+    не установлена, локальная копия не используется
+    """
+
+    def __init__(
+        self,
+        local: LocalCacheBackend,
+        remote: RedisCacheBackend,
+        channel: str,
+        reconnect_delay: float = 1.0,
+    ):
+        super().__init__()
+        self.local = local
+        self.remote = remote
+        self.channel = channel
+        self.reconnect_delay = reconnect_delay
+        self.listening = False
+        self._task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        if self._task is None:
+            self._task = asyncio.create_task(self._listen())
+
+    async def _listen(self):
+        while True:
+            subscription = None
+            try:
+                subscription = await self.remote.client.subscribe(
+                    self.remote.prefix + self.channel
+                )
+                self.listening = True
+                async for message in subscription.messages():
+                    keys = json.loads(message)
+                    # Сбросы других воркеров тоже отменяют запись
+                    # прочитанного до них
+                    self._mark_deleted(keys)
+                    await self.local.delete_many(keys)
+            except CACHE_ERRORS as error:
+                logger.warning("Cache invalidation channel lost: %r", error)
+            finally:
+                # Сбросы, пришедшие без подписки, потеряны
+                self.listening = False
+                self.local.clear()
+                if subscription is not None:
+                    await subscription.close()
+            await asyncio.sleep(self.reconnect_delay)
+
+    async def get_many(self, keys):
+        await self.start()
+        found = await self.local.get_many(keys) if self.listening else {}
+        missing = [key for key in keys if key not in found]
+        if missing:
+            fetched = await self.remote.get_many(missing)
+            if self.listening:
+                await self.local.set_many(fetched)
+            found.update(fetched)
+        return found
+
+    async def set_many(self, items):
+        if self.listening:
+            await self.local.set_many(items)
+        await self.remote.set_many(items)
+
+    async def delete_many(self, keys):
+        keys = list(keys)
+        self._mark_deleted(keys)
+        await self.local.delete_many(keys)
+        await self.remote.delete_many(keys)
+        await self.remote.publish(self.channel, json.dumps(keys))
+
+    async def close(self):
+        if self._task is not None:
+            self._task.cancel()
+            self._task = None
+        await self.remote.close()
+
+
+def build_backend(
+    kind: str = CACHE_BACKEND,
+    url: str = CACHE_URL,
+    ttl: float = CACHE_TTL,
+    local_size: int = CACHE_LOCAL_SIZE,
+) -> CacheBackend:
+    """
+    Создание кэша по настройкам: none, local или redis (локальный кэш
+    перед общим с рассылкой сбросов через pub/sub)
+    :param kind: Вид кэша
+    :param url: Адрес сервера Redis
+    :param ttl: Время жизни записей в секундах
+    :param local_size: Размер локального кэша
+    :return: Кэш
+    """
+    if kind == "none":
+        return CacheBackend()
+    if kind == "local":
+        return LocalCacheBackend(local_size, ttl)
+    if kind == "redis":
+        return TieredCacheBackend(
+            LocalCacheBackend(local_size, ttl),
+            RedisCacheBackend(RespClient.from_url(url), ttl),
+            CACHE_CHANNEL,
+        )
+    raise ValueError(f"Unknown cache backend {kind!r}")
+
+
+shared_cache = build_backend()
@@ -0,0 +1,324 @@
+import glob
+import os
+import re
+import time
+from dataclasses import dataclass
+from typing import BinaryIO, Dict, Iterable, Iterator, List, Tuple
+
+from backend.src.config_data.config import (
+    ATTACHMENT_GRACE_PERIOD,
+    IMAGE_PATH,
+    IMAGE_SAVE_PATH,
+    IMAGE_TYPE,
+)
+from backend.src.models.models import Image
+from backend.src.services.images import variant_filename
+from backend.src.services.uploads import save_upload
+
+TMP_DIR = os.path.join(IMAGE_SAVE_PATH, "tmp")
+
+_HASH = re.compile(r"[0-9a-f]{64}")
+_SHARD = re.compile(r"[0-9a-f]{2}")
+# Имя картинки старого формата - Image.image_name (uuid)
+_LEGACY_NAME = re.compile(
+    r"[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}"
+)
+
+
+@dataclass(frozen=True)
+class StoredFile:
+    content_hash: str
+    size: int
+    path: str
+    created: bool
+
+
+def shard_dir(content_hash: str) -> str:
+    """
+    Двухуровневый каталог файла: ab/cd для хэша abcd...
+    :param content_hash: sha256 содержимого в hex
+    :return: Относительный путь каталога
+    """
+    return os.path.join(content_hash[:2], content_hash[2:4])
+
+
+def file_path(content_hash: str) -> str:
+    """
+    Путь к файлу с содержимым на диске
+    :param content_hash: sha256 содержимого в hex
+    :return: Путь к файлу
+    """
+    return os.path.join(
+        IMAGE_SAVE_PATH, shard_dir(content_hash), content_hash + IMAGE_TYPE
+    )
+
+
+def store_upload(
+    source: BinaryIO, max_size: int, chunk_size: int
+) -> StoredFile:
+    """
+    Сохранение загрузки под именем по хэшу содержимого. Если такой файл
+    уже есть, новая копия не сохраняется, а у существующей обновляется
+    время изменения, чтобы сборщик мусора не удалил её. Блокирующая
+    функция, вызывается в пуле потоков
+    :param source: Файловый объект загрузки
+    :param max_size: Максимальный размер файла в байтах
+    :param chunk_size: Размер читаемой части
+    :return: Объект StoredFile
+    """
+    tmp_path, size, content_hash = save_upload(
+        source, TMP_DIR, max_size, chunk_size
+    )
+    path = file_path(content_hash)
+    if os.path.exists(path):
+        os.remove(tmp_path)
+        os.utime(path)
+        return StoredFile(content_hash, size, path, created=False)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    os.replace(tmp_path, path)
+    return StoredFile(content_hash, size, path, created=True)
+
+
+def remove_files(
+    content_hashes: Iterable[str], grace: float = ATTACHMENT_GRACE_PERIOD
+) -> List[str]:
+    """
+    Удаление файлов, на которые не осталось ссылок в бд, вместе с их
+    производными. Недавно изменённые файлы пропускаются: их могла
+    переиспользовать загрузка, которая ещё не записана в бд. Блокирующая
+    функция, вызывается в пуле потоков
+    :param content_hashes: Хэши файлов без ссылок
+    :param grace: Минимальный возраст файла в секундах
+    :return: Список удалённых путей
+    """
+    return remove_orphans(content_hashes, grace)[0]
+
+
+def remove_orphans(
+    content_hashes: Iterable[str], grace: float, dry_run: bool = False
+) -> Tuple[List[str], int]:
+    """
+    Удаление оригиналов и производных файлов без ссылок. Хэш
+    пропускается целиком, если хоть один его файл изменён позже, чем
+    grace секунд назад. Производные без оригинала тоже удаляются.
+    Блокирующая функция, вызывается в пуле потоков
+    :param content_hashes: Хэши файлов без ссылок
+    :param grace: Минимальный возраст файлов в секундах
+    :param dry_run: Только посчитать, ничего не удаляя
+    :return: Список удалённых (для dry_run - подлежащих удалению) путей
+    и их общий размер в байтах
+    """
+    return _remove_unreferenced(
+        (
+            (file_path(content_hash), content_hash)
+            for content_hash in content_hashes
+        ),
+        grace,
+        dry_run,
+    )
+
+
+def remove_legacy_orphans(
+    names: Iterable[str], grace: float, dry_run: bool = False
+) -> Tuple[List[str], int]:
+    """
+    То же, что remove_orphans, для картинок старого формата: файлов
+    <image_name>.jpg в корне каталога вложений. Блокирующая функция,
+    вызывается в пуле потоков
+    :param names: Имена картинок без ссылок
+    :param grace: Минимальный возраст файлов в секундах
+    :param dry_run: Только посчитать, ничего не удаляя
+    :return: Список удалённых (для dry_run - подлежащих удалению) путей
+    и их общий размер в байтах
+    """
+    return _remove_unreferenced(
+        (
+            (os.path.join(IMAGE_SAVE_PATH, name + IMAGE_TYPE), name)
+            for name in names
+        ),
+        grace,
+        dry_run,
+    )
+
+
+def _remove_unreferenced(
+    originals: Iterable[Tuple[str, str]], grace: float, dry_run: bool
+) -> Tuple[List[str], int]:
+    removed, size = [], 0
+    now = time.time()
+    for path, base_name in originals:
+        directory = os.path.dirname(path)
+        files = {}
+        for name in [path] + glob.glob(
+            os.path.join(directory, glob.escape(base_name) + "_*")
+        ):
+            try:
+                files[name] = os.stat(name)
+            except FileNotFoundError:
+                continue
+        if not files or any(
+            now - stat.st_mtime < grace for stat in files.values()
+        ):
+            continue
+        for name, stat in files.items():
+            if not dry_run:
+                try:
+                    os.remove(name)
+                except FileNotFoundError:
+                    continue
+            removed.append(name)
+            size += stat.st_size
+    return removed, size
+
+
+def iter_stored_hashes(batch_size: int) -> Iterator[List[str]]:
+    """
+    Хэши всех файлов в каталогах по хэшам, порциями не больше
+    batch_size. Каталоги читаются по одному, так что память не зависит
+    от числа файлов. Временные файлы и картинки старого формата не
+    затрагиваются, их обходит iter_legacy_names. Блокирующий генератор
+    :param batch_size: Размер порции
+    :return: Итератор списков хэшей
+    """
+    batch: Dict[str, None] = {}
+    for top in _subdirs(IMAGE_SAVE_PATH):
+        for directory in _subdirs(top):
+            for name in sorted(os.listdir(directory)):
+                content_hash = name[:64]
+                if not _HASH.fullmatch(content_hash):
+                    continue
+                batch[content_hash] = None
+                if len(batch) >= batch_size:
+                    yield list(batch)
+                    batch = {}
+    if batch:
+        yield list(batch)
+
+
+def iter_legacy_names(batch_size: int) -> Iterator[List[str]]:
+    """
+    Имена картинок старого формата (<uuid>.jpg и производные в корне
+    каталога вложений), порциями не больше batch_size. Блокирующий
+    генератор
+    :param batch_size: Размер порции
+    :return: Итератор списков имён
+    """
+    try:
+        entries = os.scandir(IMAGE_SAVE_PATH)
+    except FileNotFoundError:
+        return
+    batch: Dict[str, None] = {}
+    with entries:
+        for entry in entries:
+            base_name = entry.name[:36]
+            if not _LEGACY_NAME.fullmatch(base_name) or not entry.is_file():
+                continue
+            batch[base_name] = None
+            if len(batch) >= batch_size:
+                yield list(batch)
+                batch = {}
+    if batch:
+        yield list(batch)
+
+
+def _subdirs(directory: str) -> List[str]:
+    """
+    Подкаталоги уровня шардирования: две шестнадцатеричные цифры
+    :param directory: Каталог
+    :return: Отсортированный список путей
+    """
+    try:
+        names = sorted(os.listdir(directory))
+    except FileNotFoundError:
+        return []
+    return [
+        os.path.join(directory, name)
+        for name in names
+        if _SHARD.fullmatch(name)
+        and os.path.isdir(os.path.join(directory, name))
+    ]
+
+
+def remove_stale_uploads(
+    grace: float, dry_run: bool = False
+) -> Tuple[List[str], int]:
+    """
+    Удаление временных файлов загрузок, прерванных до переименования.
+    Блокирующая функция, вызывается в пуле потоков
+    :param grace: Минимальный возраст файла в секундах
+    :param dry_run: Только посчитать, ничего не удаляя
+    :return: Список удалённых путей и их общий размер в байтах
+    """
+    removed, size = [], 0
+    now = time.time()
+    try:
+        names = os.listdir(TMP_DIR)
+    except FileNotFoundError:
+        return removed, size
+    for name in names:
+        path = os.path.join(TMP_DIR, name)
+        try:
+            stat = os.stat(path)
+            if now - stat.st_mtime < grace:
+                continue
+            if not dry_run:
+                os.remove(path)
+        except FileNotFoundError:
+            continue
+        removed.append(path)
+        size += stat.st_size
+    return removed, size
+
+
+def _url_base(image: Image) -> str:
+    if image.content_hash:
+        return (
+            IMAGE_PATH
+            + shard_dir(image.content_hash).replace(os.sep, "/")
+            + "/"
+            + image.content_hash
+        )
+    return f"{IMAGE_PATH}{image.image_name}"
+
+
+def image_url(image: Image) -> str:
+    """
+    Ссылка на оригинал картинки. Для картинок, загруженных до перехода
+    на хэши, остаётся старый плоский путь
+    :param image: Объект модели Image
+    :return: Ссылка
+    """
+    return _url_base(image) + IMAGE_TYPE
+
+
+def variant_url(image: Image, variant: Dict) -> str:
+    """
+    Ссылка на производную картинки
+    :param image: Объект модели Image
+    :param variant: Описание производной из Image.variants
+    :return: Ссылка
+    """
+    directory, base_name = _url_base(image).rsplit("/", 1)
+    return (
+        f"{directory}/"
+        f"{variant_filename(base_name, variant['width'], variant['format'])}"
+    )
+
+
+def attachment(image: Image) -> Dict:
+    """
+    Ссылки на оригинал картинки и её производные
+    :param image: Объект модели Image
+    :return:
+    """
+    return {
+        "url": image_url(image),
+        "variants": [
+            {
+                "width": variant["width"],
+                "height": variant["height"],
+                "url": variant_url(image, variant),
+            }
+            for variant in image.variants or []
+        ],
+    }
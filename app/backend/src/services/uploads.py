@@ -0,0 +1,146 @@
+import hashlib
+import os
+import time
+import uuid
+from typing import BinaryIO, Tuple
+
+from backend.src.services.metrics import counter, histogram
+from starlette.datastructures import Headers
+from starlette.responses import JSONResponse
+
+upload_requests = counter(
+    "media_uploads_total", "Media uploads by result", ("result",)
+)
+upload_bytes = counter(
+    "media_upload_bytes_total", "Bytes written to disk by media uploads"
+)
+upload_duration = histogram(
+    "media_upload_duration_seconds",
+    "Time spent writing an upload to disk and registering it",
+)
+upload_throughput = histogram(
+    "media_upload_throughput_bytes_per_second",
+    "Per-upload disk write throughput",
+    buckets=tuple(2**power for power in range(16, 31, 2)),
+)
+
+
+# Запас на заголовки частей multipart/form-data сверх размера файла
+FORM_OVERHEAD = 64 * 1024
+
+
+class UploadTooLarge(Exception):
+    """
+    Загружаемый файл превышает допустимый размер
+    """
+
+
+def too_large_response(max_size: int) -> JSONResponse:
+    upload_requests.inc(result="too_large")
+    return JSONResponse(
+        status_code=413,
+        content={
+            "result": False,
+            "msg": f"File is larger than {max_size} bytes",
+        },
+    )
+
+
+class UploadSizeLimitMiddleware:
+    """
+    ASGI middleware: ограничение размера тела запросов загрузки. Starlette
+    сохраняет всю форму во временный файл до вызова route, поэтому
+    слишком большой запрос отклоняется здесь: сразу по Content-Length
+    или, если его нет, как только прочитано больше допустимого
+    """
+
+    def __init__(self, app, max_size: int, path_prefix: str):
+        self.app = app
+        self.max_body = max_size + FORM_OVERHEAD
+        self.max_size = max_size
+        self.path_prefix = path_prefix
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not scope["path"].startswith(
+            self.path_prefix
+        ):
+            await self.app(scope, receive, send)
+            return
+        length = Headers(scope=scope).get("content-length", "")
+        if length.isdigit() and int(length) > self.max_body:
+            await too_large_response(self.max_size)(scope, receive, send)
+            return
+        received = 0
+        exceeded = False
+
+        async def limited_receive():
+            nonlocal received, exceeded
+            message = await receive()
+            if message["type"] == "http.request":
+                received += len(message.get("body", b""))
+                if received > self.max_body:
+                    exceeded = True
+                    raise UploadTooLarge
+            return message
+
+        async def guarded_send(message):
+            # Ответ приложения на прерванное чтение формы заменяется на 413
+            if not exceeded:
+                await send(message)
+
+        try:
+            await self.app(scope, limited_receive, guarded_send)
+        except UploadTooLarge:
+            pass
+        if exceeded:
+            await too_large_response(self.max_size)(scope, receive, send)
+
+
+def save_upload(
+    source: BinaryIO,
+    directory: str,
+    max_size: int,
+    chunk_size: int,
+) -> Tuple[str, int, str]:
+    """
+    Потоковая запись загруженного файла во временный файл частями по
+    chunk_size с подсчётом sha256 содержимого. Блокирующая функция,
+    вызывается в пуле потоков
+    :param source: Файловый объект загрузки
+    :param directory: Каталог для временного файла
+    :param max_size: Максимальный размер файла в байтах
+    :param chunk_size: Размер читаемой части
+    :return: Путь временного файла, размер в байтах и sha256 в hex
+    """
+    os.makedirs(directory, exist_ok=True)
+    tmp_path = os.path.join(directory, f"{uuid.uuid4().hex}.part")
+    digest = hashlib.sha256()
+    written = 0
+    try:
+        with open(tmp_path, "wb") as f:
+            while chunk := source.read(chunk_size):
+                written += len(chunk)
+                if written > max_size:
+                    raise UploadTooLarge
+                digest.update(chunk)
+                f.write(chunk)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+    return tmp_path, written, digest.hexdigest()
+
+
+def observe_upload(size: int, started: float) -> None:
+    """
+    Учёт успешной загрузки в метриках
+    :param size: Размер файла в байтах
+    :param started: Время начала обработки (time.perf_counter)
+    :return: None
+    """
+    elapsed = time.perf_counter() - started
+    upload_requests.inc(result="ok")
+    upload_bytes.inc(size)
+    upload_duration.observe(elapsed)
+    if elapsed > 0:
+        upload_throughput.observe(size / elapsed)
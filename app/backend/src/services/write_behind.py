@@ -0,0 +1,167 @@
+import asyncio
+import itertools
+import logging
+from typing import Awaitable, Callable, Dict, Hashable, Optional
+
+from backend.src.services.metrics import counter
+
+logger = logging.getLogger(__name__)
+
+Changes = Dict[Hashable, bool]
+
+write_behind_flushes = counter(
+    "write_behind_flushes_total",
+    "Write-behind batches written to the database",
+)
+write_behind_changes = counter(
+    "write_behind_changes_total",
+    "Changes accepted by write-behind queues",
+)
+
+
+class WriteBehindQueue:
+    """
+    Очередь отложенной записи флагов (например, лайк есть / лайка нет).
+    Изменения копятся в памяти воркера: в очереди лежит только то, что
+    отличается от бд, поэтому лайк и следующий за ним анлайк взаимно
+    сокращаются. Изменения пишутся в бд пачками не больше max_size, когда
+    их набирается max_size или раз в interval секунд, и при остановке
+    приложения. Больше max_pending изменений очередь не копит: пока бд
+    не принимает запись, make_room не пускает новые изменения.
+    Незаписанные изменения видны только запросам того же воркера
+    """
+
+    def __init__(
+        self,
+        flush: Callable[[Changes], Awaitable[None]],
+        max_size: int,
+        interval: float,
+        enabled: bool = True,
+        max_pending: Optional[int] = None,
+    ):
+        self._flush = flush
+        self.max_size = max_size
+        self.interval = interval
+        self.enabled = enabled
+        self.max_pending = max_pending or max_size * 10
+        self._pending: Changes = {}
+        # Пачка, которая сейчас пишется в бд
+        self._flushing: Changes = {}
+        self._lock = asyncio.Lock()
+        self._timer: Optional[asyncio.Task] = None
+        self._flush_task: Optional[asyncio.Task] = None
+
+    def __len__(self) -> int:
+        return len(self.items())
+
+    def get(self, key: Hashable) -> Optional[bool]:
+        """
+        Значение, которое будет в бд после записи очереди
+        :param key: Ключ
+        :return: Значение или None, если ключа нет в очереди
+        """
+        if key in self._pending:
+            return self._pending[key]
+        return self._flushing.get(key)
+
+    def items(self) -> Changes:
+        """
+        Все изменения, ещё не записанные в бд
+        :return: Словарь ключ -> значение
+        """
+        if not self._flushing:
+            return self._pending
+        return {**self._flushing, **self._pending}
+
+    def put(self, key: Hashable, value: bool) -> None:
+        """
+        Постановка изменения в очередь. Вызывающий проверяет, что текущее
+        значение (get или бд) отличается от value
+        :param key: Ключ
+        :param value: Новое значение
+        :return: None
+        """
+        if key in self._pending:
+            # Изменение отменяет предыдущее, ещё не записанное
+            del self._pending[key]
+        else:
+            self._pending[key] = value
+        write_behind_changes.inc()
+        self._schedule()
+
+    async def make_room(self) -> None:
+        """
+        Ожидание места в очереди: если она заполнена, изменения пишутся
+        в бд сразу. Если запись не удалась, ошибка передаётся вызывающему,
+        и очередь не растёт, пока бд недоступна
+        :return: None
+        """
+        while len(self._pending) >= self.max_pending:
+            await self.flush()
+
+    def _schedule(self) -> None:
+        loop = asyncio.get_running_loop()
+        if (
+            self._timer is None
+            or self._timer.done()
+            or self._timer.get_loop() is not loop
+        ):
+            self._timer = loop.create_task(self._run_timer())
+        if len(self._pending) >= self.max_size and (
+            self._flush_task is None or self._flush_task.done()
+        ):
+            self._flush_task = loop.create_task(self._flush_logged())
+
+    async def _run_timer(self) -> None:
+        while True:
+            await asyncio.sleep(self.interval)
+            await self._flush_logged()
+
+    async def _flush_logged(self) -> None:
+        try:
+            await self.flush()
+        except Exception:
+            logger.exception("Write-behind flush failed, will retry")
+
+    async def flush(self) -> int:
+        """
+        Запись накопленных изменений пачками не больше max_size. Если
+        запись пачки не удалась, её изменения возвращаются в очередь, а
+        более новые изменения тех же ключей остаются в силе
+        :return: Число записанных изменений
+        """
+        written = 0
+        async with self._lock:
+            while self._pending:
+                written += await self._flush_batch()
+        return written
+
+    async def _flush_batch(self) -> int:
+        keys = list(itertools.islice(self._pending, self.max_size))
+        self._flushing = {key: self._pending.pop(key) for key in keys}
+        try:
+            await self._flush(self._flushing)
+        except BaseException:
+            for key, value in self._flushing.items():
+                if key not in self._pending:
+                    self._pending[key] = value
+                elif self._pending[key] != value:
+                    del self._pending[key]
+            raise
+        finally:
+            batch, self._flushing = self._flushing, {}
+        write_behind_flushes.inc()
+        return len(batch)
+
+    async def close(self) -> None:
+        """
+        Остановка таймера и запись всего, что осталось в очереди
+        :return: None
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._flush_task is not None:
+            await asyncio.gather(self._flush_task, return_exceptions=True)
+            self._flush_task = None
+        await self.flush()
@@ -0,0 +1,185 @@
+import argparse
+import asyncio
+import json
+import os
+import subprocess
+import time
+from dataclasses import asdict
+
+import httpx
+from backend.src.database.database import async_session
+from backend.src.models.models import Tweet, Users
+from sqlalchemy import func, select
+
+from benchmarks.client import DEFAULT_MIX, LoadClient, Target, parse_mix
+from benchmarks.seed import SeedConfig, placeholder_image, seed
+
+# Сколько пользователей и твитов брать целями нагрузки, если бд уже
+# заполнена
+TARGET_SAMPLE = 10000
+
+
+def _parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks",
+        description="Synthetic data generator and load test",
+    )
+    parser.add_argument(
+        "--seed-data",
+        action="store_true",
+        help="fill the database before the run",
+    )
+    parser.add_argument("--users", type=int, default=SeedConfig.users)
+    parser.add_argument("--tweets", type=int, default=SeedConfig.tweets)
+    parser.add_argument("--likes", type=int, default=SeedConfig.likes)
+    parser.add_argument("--follows", type=int, default=SeedConfig.follows)
+    parser.add_argument(
+        "--image-ratio", type=float, default=SeedConfig.image_ratio
+    )
+    parser.add_argument("--skew", type=float, default=SeedConfig.skew)
+    parser.add_argument("--random-seed", type=int, default=SeedConfig.seed)
+    parser.add_argument(
+        "--url",
+        help="base URL of a running server; "
+        "without it the app is served in-process",
+    )
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--duration", type=float, default=30.0)
+    parser.add_argument("--requests", type=int)
+    parser.add_argument(
+        "--mix",
+        default=",".join(f"{k}={v}" for k, v in DEFAULT_MIX.items()),
+        help="operation weights, e.g. feed=80,like=20",
+    )
+    parser.add_argument(
+        "--output",
+        default=os.path.join("benchmarks", "results"),
+        help="directory for the JSON result",
+    )
+    return parser
+
+
+async def _load_target() -> Target:
+    async with async_session() as session:
+        rows = (
+            await session.execute(
+                select(Users.id, Users.api_key)
+                .order_by(func.random())
+                .limit(TARGET_SAMPLE)
+            )
+        ).all()
+        tweet_ids = list(
+            await session.scalars(
+                select(Tweet.id).order_by(func.random()).limit(TARGET_SAMPLE)
+            )
+        )
+    return Target(
+        api_keys=[api_key for _, api_key in rows],
+        user_ids=[user_id for user_id, _ in rows],
+        tweet_ids=tweet_ids or [1],
+        image=placeholder_image(),
+    )
+
+
+def _git_revision():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"],
+            capture_output=True,
+            text=True,
+            check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+async def main(args: argparse.Namespace) -> dict:
+    config = SeedConfig(
+        users=args.users,
+        tweets=args.tweets,
+        likes=args.likes,
+        follows=args.follows,
+        image_ratio=args.image_ratio,
+        skew=args.skew,
+        seed=args.random_seed,
+    )
+    app = None
+    if args.url is None:
+        from backend.src.main import app, startapp, stopapp
+
+        await startapp()
+
+    seeded = None
+    if args.seed_data:
+        started = time.perf_counter()
+        async with async_session() as session:
+            async with session.begin():
+                result = await seed(session, config)
+        seeded = {
+            "seconds": round(time.perf_counter() - started, 3),
+            "users": len(result.user_ids),
+            "tweets": len(result.tweet_ids),
+            "follows": result.follows,
+            "likes": result.likes,
+            "images": result.images,
+        }
+        print(f"Seeded {seeded}")
+
+    target = await _load_target()
+    if app is not None:
+        transport = httpx.ASGITransport(app=app)
+        base_url = "http://benchmark"
+    else:
+        transport = None
+        base_url = args.url
+    async with httpx.AsyncClient(
+        transport=transport, base_url=base_url, timeout=30
+    ) as http:
+        client = LoadClient(
+            http, target, parse_mix(args.mix), args.random_seed
+        )
+        report = await client.run(
+            args.concurrency, args.duration, args.requests
+        )
+    if app is not None:
+        await stopapp()
+    return {
+        "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "revision": _git_revision(),
+        "server": args.url or "in-process",
+        "config": {
+            "concurrency": args.concurrency,
+            "duration": args.duration,
+            "requests": args.requests,
+            "mix": parse_mix(args.mix),
+            "seed": asdict(config) if args.seed_data else None,
+        },
+        "seeded": seeded,
+        **report,
+    }
+
+
+def _print(result: dict) -> None:
+    header = f"{'route':40} {'req':>7} {'err':>5} {'rps':>8} "
+    header += f"{'p50':>8} {'p95':>8} {'p99':>8}"
+    print(header)
+    rows = list(result["routes"].items()) + [("total", result["total"])]
+    for route, stats in rows:
+        print(
+            f"{route:40} {stats['requests']:>7} {stats['errors']:>5} "
+            f"{stats['rps']:>8} {stats['p50_ms']:>8} "
+            f"{stats['p95_ms']:>8} {stats['p99_ms']:>8}"
+        )
+
+
+if __name__ == "__main__":
+    arguments = _parser().parse_args()
+    outcome = asyncio.run(main(arguments))
+    _print(outcome)
+    os.makedirs(arguments.output, exist_ok=True)
+    path = os.path.join(
+        arguments.output, time.strftime("bench-%Y%m%d-%H%M%S.json")
+    )
+    with open(path, "w") as file:
+        json.dump(outcome, file, indent=2)
+    print(f"Saved {path}")
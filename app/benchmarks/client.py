@@ -0,0 +1,244 @@
+import asyncio
+import random
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
+
+# Вес операции в смеси запросов: доля запросов, которые её выполняют
+DEFAULT_MIX = {
+    "feed": 60,
+    "profile": 10,
+    "like": 10,
+    "unlike": 5,
+    "follow": 5,
+    "unfollow": 5,
+    "media": 5,
+}
+
+
+@dataclass
+class Target:
+    """
+    Данные, по которым клиент выбирает пользователя и объект запроса
+    """
+
+    api_keys: Sequence[str]
+    user_ids: Sequence[int]
+    tweet_ids: Sequence[int]
+    image: bytes = b""
+
+
+@dataclass
+class RouteStats:
+    latencies: List[float] = field(default_factory=list)
+    errors: int = 0
+
+    def record(self, elapsed: float, ok: bool) -> None:
+        self.latencies.append(elapsed)
+        if not ok:
+            self.errors += 1
+
+
+def percentile(values: Sequence[float], q: float) -> Optional[float]:
+    """
+    Перцентиль по ближайшему рангу
+    :param values: Отсортированные значения
+    :param q: Уровень от 0 до 100
+    :return: Значение или None для пустого списка
+    """
+    if not values:
+        return None
+    rank = max(0, min(len(values) - 1, int(-(-q * len(values) // 100)) - 1))
+    return values[rank]
+
+
+def parse_mix(spec: str) -> Dict[str, int]:
+    """
+    Разбор смеси запросов вида feed=60,like=20
+    :param spec: Строка настройки
+    :return: Словарь операция -> вес
+    """
+    mix = {}
+    for part in spec.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in DEFAULT_MIX:
+            raise ValueError(f"Unknown operation {name!r}")
+        mix[name] = int(weight)
+    return mix
+
+
+class LoadClient:
+    """
+    Нагрузка на сервис: concurrency корутин выполняют операции из смеси,
+    пока не истечёт время или не будет выполнено заданное число запросов.
+    Задержка измеряется для каждого запроса и группируется по шаблону
+    маршрута
+    """
+
+    def __init__(
+        self,
+        http: httpx.AsyncClient,
+        target: Target,
+        mix: Optional[Dict[str, int]] = None,
+        seed: int = 1,
+    ):
+        self.http = http
+        self.target = target
+        self.mix = mix or DEFAULT_MIX
+        self.rng = random.Random(seed)
+        self.stats: Dict[str, RouteStats] = {}
+        self._operations = [getattr(self, "_" + name) for name in self.mix]
+        self._weights = list(self.mix.values())
+
+    def _user(self) -> Tuple[int, Dict[str, str]]:
+        index = self.rng.randrange(len(self.target.api_keys))
+        return index, {"api-key": self.target.api_keys[index]}
+
+    def _tweet_id(self) -> int:
+        return self.rng.choice(self.target.tweet_ids)
+
+    async def _request(self, route: str, method: str, url: str, **kwargs):
+        started = time.perf_counter()
+        try:
+            response = await self.http.request(method, url, **kwargs)
+            ok = response.status_code < 500
+        except httpx.HTTPError:
+            ok = False
+        elapsed = time.perf_counter() - started
+        self.stats.setdefault(route, RouteStats()).record(elapsed, ok)
+
+    async def _feed(self):
+        _, headers = self._user()
+        await self._request(
+            "GET /api/tweets/",
+            "GET",
+            "/api/tweets/",
+            params={"limit": 20},
+            headers=headers,
+        )
+
+    async def _profile(self):
+        _, headers = self._user()
+        await self._request(
+            "GET /api/users/me", "GET", "/api/users/me", headers=headers
+        )
+
+    async def _like(self):
+        _, headers = self._user()
+        await self._request(
+            "POST /api/tweets/{tweet_id}/likes",
+            "POST",
+            f"/api/tweets/{self._tweet_id()}/likes",
+            headers=headers,
+        )
+
+    async def _unlike(self):
+        _, headers = self._user()
+        await self._request(
+            "DELETE /api/tweets/{tweet_id}/likes",
+            "DELETE",
+            f"/api/tweets/{self._tweet_id()}/likes",
+            headers=headers,
+        )
+
+    async def _follow(self):
+        _, headers = self._user()
+        await self._request(
+            "POST /api/users/{user_id}/follow",
+            "POST",
+            f"/api/users/{self.rng.choice(self.target.user_ids)}/follow",
+            headers=headers,
+        )
+
+    async def _unfollow(self):
+        _, headers = self._user()
+        await self._request(
+            "DELETE /api/users/{user_id}/follow",
+            "DELETE",
+            f"/api/users/{self.rng.choice(self.target.user_ids)}/follow",
+            headers=headers,
+        )
+
+    async def _media(self):
+        _, headers = self._user()
+        await self._request(
+            "POST /api/medias/",
+            "POST",
+            "/api/medias/",
+            files={"file": ("bench.jpg", self.target.image, "image/jpeg")},
+            headers=headers,
+        )
+
+    async def _worker(self, deadline: float, remaining: List[int]):
+        while time.perf_counter() < deadline and remaining[0] != 0:
+            remaining[0] -= 1
+            operation = self.rng.choices(self._operations, self._weights)[0]
+            await operation()
+
+    async def run(
+        self,
+        concurrency: int,
+        duration: float,
+        requests: Optional[int] = None,
+    ) -> Dict:
+        """
+        Запуск нагрузки
+        :param concurrency: Число одновременных запросов
+        :param duration: Максимальная длительность в секундах
+        :param requests: Максимальное число запросов. Без него нагрузка
+        идёт всё время duration
+        :return: Сводка по маршрутам
+        """
+        remaining = [-1 if requests is None else requests]
+        started = time.perf_counter()
+        await asyncio.gather(
+            *(
+                self._worker(started + duration, remaining)
+                for _ in range(concurrency)
+            )
+        )
+        return self.report(time.perf_counter() - started)
+
+    def report(self, elapsed: float) -> Dict:
+        """
+        Сводка: число запросов, ошибок, пропускная способность и задержки
+        в миллисекундах по каждому маршруту и по всем вместе
+        :param elapsed: Длительность нагрузки в секундах
+        :return: Словарь для сохранения в JSON
+        """
+        routes = {
+            route: _summary(stats.latencies, stats.errors, elapsed)
+            for route, stats in sorted(self.stats.items())
+        }
+        everything = [
+            latency
+            for stats in self.stats.values()
+            for latency in stats.latencies
+        ]
+        errors = sum(stats.errors for stats in self.stats.values())
+        return {
+            "elapsed": round(elapsed, 3),
+            "total": _summary(everything, errors, elapsed),
+            "routes": routes,
+        }
+
+
+def _summary(latencies: List[float], errors: int, elapsed: float) -> Dict:
+    latencies = sorted(latencies)
+
+    def ms(value):
+        return None if value is None else round(value * 1000, 3)
+
+    return {
+        "requests": len(latencies),
+        "errors": errors,
+        "rps": round(len(latencies) / elapsed, 2) if elapsed else None,
+        "mean_ms": ms(sum(latencies) / len(latencies) if latencies else None),
+        "p50_ms": ms(percentile(latencies, 50)),
+        "p95_ms": ms(percentile(latencies, 95)),
+        "p99_ms": ms(percentile(latencies, 99)),
+        "max_ms": ms(latencies[-1] if latencies else None),
+    }
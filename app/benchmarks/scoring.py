@@ -0,0 +1,59 @@
+import argparse
+import json
+import random
+import time
+from unittest.mock import patch
+
+from backend.src.services import ranking
+
+CANDIDATES = 10000
+
+
+def _candidates(n: int, rng: random.Random):
+    tweet_ids = list(range(n, 0, -1))
+    likes = [int(rng.paretovariate(1.2)) - 1 for _ in range(n)]
+    ages = [rng.uniform(0, 48 * 3600) for _ in range(n)]
+    affinities = [rng.choice((0, 0, 0, 1, 2, 5)) for _ in range(n)]
+    return tweet_ids, likes, ages, affinities
+
+
+def measure(n: int, repeat: int, limit: int = 20) -> float:
+    """
+    Среднее время оценки и выбора лучших среди n кандидатов
+    :param n: Число кандидатов
+    :param repeat: Число повторов
+    :param limit: Сколько лучших выбирать
+    :return: Время в микросекундах на 10 000 кандидатов
+    """
+    tweet_ids, likes, ages, affinities = _candidates(n, random.Random(1))
+    started = time.perf_counter()
+    for _ in range(repeat):
+        scores = ranking.score_candidates(likes, ages, affinities)
+        ranking.top_ids(tweet_ids, scores, limit)
+    elapsed = (time.perf_counter() - started) / repeat
+    return elapsed * 1e6 * CANDIDATES / n
+
+
+def main():
+    parser = argparse.ArgumentParser(
+        prog="python -m benchmarks.scoring",
+        description="Cost of the top feed scoring per 10k candidates",
+    )
+    parser.add_argument("--candidates", type=int, default=CANDIDATES)
+    parser.add_argument("--repeat", type=int, default=50)
+    args = parser.parse_args()
+
+    result = {"candidates": args.candidates}
+    if ranking.vectorized():
+        result["numpy_us_per_10k"] = round(
+            measure(args.candidates, args.repeat), 1
+        )
+    with patch.object(ranking, "numpy", None):
+        result["python_us_per_10k"] = round(
+            measure(args.candidates, args.repeat), 1
+        )
+    print(json.dumps(result))
+
+
+if __name__ == "__main__":
+    main()
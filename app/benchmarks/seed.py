@@ -0,0 +1,285 @@
+import io
+import random
+from bisect import bisect_left
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from itertools import accumulate
+from typing import Dict, List, Sequence, Set, Tuple
+from uuid import uuid4
+
+from backend.src.config_data.config import MAX_UPLOAD_SIZE, UPLOAD_CHUNK_SIZE
+from backend.src.database.timeline import rebuild_timelines
+from backend.src.models.models import (
+    Image,
+    Tweet,
+    Users,
+    followers,
+    timeline,
+    tweet_like,
+)
+from backend.src.services.storage import store_upload
+from PIL import Image as PILImage
+from sqlalchemy import func, insert, select, update
+from sqlalchemy.ext.asyncio import AsyncSession
+
+# Ограничение на число строк в одном INSERT: у SQLite не больше 32766
+# параметров на запрос
+CHUNK_SIZE = 2000
+
+
+@dataclass
+class SeedConfig:
+    users: int = 1000
+    tweets: int = 10000
+    likes: int = 50000
+    # Среднее число подписок одного пользователя
+    follows: int = 20
+    # Доля твитов с картинкой
+    image_ratio: float = 0.2
+    # Показатель степенного распределения популярности
+    skew: float = 1.1
+    # За сколько часов до запуска опубликованы твиты
+    hours: float = 48
+    seed: int = 1
+
+
+@dataclass
+class SeedResult:
+    user_ids: List[int]
+    api_keys: List[str]
+    tweet_ids: List[int]
+    follows: int
+    likes: int
+    images: int
+
+
+class PowerLaw:
+    """
+    Выбор индекса 0..n-1 с вероятностью, пропорциональной 1 / (i + 1) ** s:
+    несколько элементов очень популярны, большинство почти нет
+    """
+
+    def __init__(self, n: int, skew: float, rng: random.Random):
+        self.rng = rng
+        self.cumulative = list(
+            accumulate(1 / (rank + 1) ** skew for rank in range(n))
+        )
+
+    def sample(self) -> int:
+        point = self.rng.random() * self.cumulative[-1]
+        return min(
+            bisect_left(self.cumulative, point), len(self.cumulative) - 1
+        )
+
+
+def follow_pairs(
+    n_users: int, mean_follows: int, skew: float, rng: random.Random
+) -> Set[Tuple[int, int]]:
+    """
+    Граф подписок: число подписок пользователя распределено по Парето,
+    а выбор, на кого подписаться, смещён к популярным пользователям
+    :param n_users: Число пользователей
+    :param mean_follows: Среднее число подписок
+    :param skew: Показатель степенного распределения популярности
+    :param rng: Генератор случайных чисел
+    :return: Множество пар (подписчик, автор) индексов пользователей
+    """
+    popularity = PowerLaw(n_users, skew, rng)
+    # Порядок популярности не совпадает с порядком id
+    ranks = list(range(n_users))
+    rng.shuffle(ranks)
+    # У распределения Парето с alpha = 2 среднее равно 2
+    alpha = 2.0
+    pairs = set()
+    for follower in range(n_users):
+        wanted = min(
+            n_users - 1,
+            int(rng.paretovariate(alpha) * mean_follows / alpha),
+        )
+        attempts = 0
+        chosen = 0
+        while chosen < wanted and attempts < wanted * 4:
+            attempts += 1
+            author = ranks[popularity.sample()]
+            if author == follower or (follower, author) in pairs:
+                continue
+            pairs.add((follower, author))
+            chosen += 1
+    return pairs
+
+
+def like_pairs(
+    n_users: int,
+    n_tweets: int,
+    n_likes: int,
+    skew: float,
+    rng: random.Random,
+) -> Set[Tuple[int, int]]:
+    """
+    Лайки: большая часть приходится на небольшое число твитов
+    :param n_users: Число пользователей
+    :param n_tweets: Число твитов
+    :param n_likes: Желаемое число лайков
+    :param skew: Показатель степенного распределения популярности
+    :param rng: Генератор случайных чисел
+    :return: Множество пар (индекс пользователя, индекс твита)
+    """
+    n_likes = min(n_likes, n_users * n_tweets)
+    popularity = PowerLaw(n_tweets, skew, rng)
+    ranks = list(range(n_tweets))
+    rng.shuffle(ranks)
+    pairs = set()
+    attempts = 0
+    while len(pairs) < n_likes and attempts < n_likes * 4:
+        attempts += 1
+        pairs.add((rng.randrange(n_users), ranks[popularity.sample()]))
+    return pairs
+
+
+def placeholder_image(size: int = 64) -> bytes:
+    """
+    Небольшая картинка для твитов с вложениями
+    :param size: Сторона в пикселях
+    :return: Содержимое файла JPEG
+    """
+    buffer = io.BytesIO()
+    PILImage.new("RGB", (size, size), (90, 140, 200)).save(buffer, "JPEG")
+    return buffer.getvalue()
+
+
+async def _insert(session: AsyncSession, table, rows: Sequence[Dict]):
+    for start in range(0, len(rows), CHUNK_SIZE):
+        await session.execute(insert(table), rows[start : start + CHUNK_SIZE])
+
+
+async def _insert_returning_ids(
+    session: AsyncSession, model, rows: Sequence[Dict]
+) -> List[int]:
+    ids = []
+    for start in range(0, len(rows), CHUNK_SIZE):
+        res = await session.scalars(
+            insert(model).returning(model.id, sort_by_parameter_order=True),
+            rows[start : start + CHUNK_SIZE],
+        )
+        ids.extend(res)
+    return ids
+
+
+async def seed(session: AsyncSession, config: SeedConfig) -> SeedResult:
+    """
+    Заполнение бд синтетическими данными пакетными вставками. Ключи
+    пользователей имеют вид bench-<номер запуска>-<номер>, так что
+    повторный запуск добавляет новых пользователей к уже существующим
+    :param session: Открытая сессия
+    :param config: Параметры генерации
+    :return: Объект SeedResult с ids и ключами созданных записей
+    """
+    rng = random.Random(config.seed)
+    run = uuid4().hex[:8]
+    api_keys = [f"bench-{run}-{i}" for i in range(config.users)]
+    user_ids = await _insert_returning_ids(
+        session,
+        Users,
+        [
+            {
+                "name": f"user {i}",
+                "nickname": f"user_{run}_{i}",
+                "api_key": key,
+            }
+            for i, key in enumerate(api_keys)
+        ],
+    )
+
+    pairs = follow_pairs(config.users, config.follows, config.skew, rng)
+    await _insert(
+        session,
+        followers,
+        [
+            {"user_id": user_ids[follower], "follower_id": user_ids[author]}
+            for follower, author in pairs
+        ],
+    )
+
+    # Активность авторов тоже неравномерна
+    activity = PowerLaw(config.users, config.skew, rng)
+    started = datetime.now(timezone.utc) - timedelta(hours=config.hours)
+    step = timedelta(hours=config.hours) / max(config.tweets, 1)
+    tweet_ids = await _insert_returning_ids(
+        session,
+        Tweet,
+        [
+            {
+                "data": f"Benchmark tweet {i}",
+                "user_id": user_ids[activity.sample()],
+                "created_at": started + step * i,
+            }
+            for i in range(config.tweets)
+        ],
+    )
+
+    with_images = [
+        tweet_id for tweet_id in tweet_ids if rng.random() < config.image_ratio
+    ]
+    if with_images:
+        # Все картинки ссылаются на один файл, как одинаковые загрузки
+        stored = store_upload(
+            io.BytesIO(placeholder_image()),
+            MAX_UPLOAD_SIZE,
+            UPLOAD_CHUNK_SIZE,
+        )
+        await _insert(
+            session,
+            Image,
+            [
+                {
+                    "image_name": uuid4(),
+                    "tweet_id": tweet_id,
+                    "content_hash": stored.content_hash,
+                }
+                for tweet_id in with_images
+            ],
+        )
+
+    likes = like_pairs(
+        config.users, config.tweets, config.likes, config.skew, rng
+    )
+    await _insert(
+        session,
+        tweet_like,
+        [
+            {"user_id": user_ids[user], "tweet_id": tweet_ids[tweet]}
+            for user, tweet in likes
+        ],
+    )
+
+    # Денормализованные счётчики пересчитываются по вставленным строкам
+    await session.execute(
+        update(Users)
+        .where(Users.id.in_(select(followers.c.follower_id)))
+        .values(
+            followers_count=select(func.count())
+            .where(followers.c.follower_id == Users.id)
+            .scalar_subquery()
+        )
+    )
+    await session.execute(
+        update(Tweet)
+        .where(Tweet.id.in_(select(tweet_like.c.tweet_id)))
+        .values(
+            like_count=select(func.count())
+            .where(tweet_like.c.tweet_id == Tweet.id)
+            .scalar_subquery()
+        )
+    )
+    # Ленты строятся заново по всем твитам и подпискам
+    await session.execute(timeline.delete())
+    await rebuild_timelines(session)
+
+    return SeedResult(
+        user_ids=user_ids,
+        api_keys=api_keys,
+        tweet_ids=tweet_ids,
+        follows=len(pairs),
+        likes=len(likes),
+        images=len(with_images),
+    )
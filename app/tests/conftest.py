@@ -1,6 +1,68 @@
 import os
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import List, Tuple
 from unittest.mock import patch
 
+import pytest
+
 patch.dict(
     os.environ, {"DATABASE_URI": "sqlite+aiosqlite:///./test.db"}
 ).start()
+
+
+@dataclass
+class QueryLog:
+    """
+    Выражения, выполненные внутри capture_queries, с числом строк
+    """
+
+    statements: List[Tuple[str, int]] = field(default_factory=list)
+
+    @property
+    def queries(self) -> int:
+        return len(self.statements)
+
+    @property
+    def rows(self) -> int:
+        return sum(rows for _, rows in self.statements)
+
+    def report(self) -> str:
+        return "\n".join(
+            f"{rows:>6} {' '.join(statement.split())}"
+            for statement, rows in self.statements
+        )
+
+
+@pytest.fixture
+def capture_queries():
+    """
+    Запись всех выражений, выполненных движками приложения. Приложение
+    в TestClient работает в другом потоке, поэтому записывается всё
+    подряд, а не только запросы текущего контекста
+    """
+    from backend.src.database.database import engine, read_engine
+    from backend.src.services.instrumentation import cursor_rows
+    from sqlalchemy import event
+
+    @contextmanager
+    def capture():
+        log = QueryLog()
+
+        def after_cursor_execute(conn, cursor, statement, *args):
+            log.statements.append((statement, cursor_rows(cursor)))
+
+        engines = {engine.sync_engine, read_engine.sync_engine}
+        for sync_engine in engines:
+            event.listen(
+                sync_engine, "after_cursor_execute", after_cursor_execute
+            )
+        try:
+            yield log
+        finally:
+            for sync_engine in engines:
+                event.remove(
+                    sync_engine, "after_cursor_execute", after_cursor_execute
+                )
+
+    return capture